@@ -0,0 +1,258 @@
+"""Times the hot paths of localgit on generated home directories.
+
+    python -m benchmarks.bench --sizes 10 100 1000 --output results.json
+    python -m benchmarks.bench --sizes 10 100 1000 --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import os.path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from src.executor import DEFAULT_JOBS, run_repos
+from src.list import report_list
+from src.log import report_log
+from src.status import report_status
+from src.statuscache import status_cache
+from src.utils import get_all_git_dirs, get_git_dirs, get_valid_git_dirs
+
+from .home import GIT_ENV, generate_home
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+RESULTS_VERSION = 1
+EXCLUDE_DIRS = ["~/.cache"]
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict:
+    """Calls `func` `repeat` times with its output discarded.
+
+    Returns the minimum, median and all the durations in seconds.
+    """
+    runs = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+    return {
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+    }
+
+
+@contextlib.contextmanager
+def fake_home(home_dir: str):
+    """Points HOME and the XDG directories localgit uses to the generated home directory."""
+    env = {
+        **GIT_ENV,
+        "HOME": home_dir,
+        "XDG_CACHE_HOME": os.path.join(home_dir, ".cache"),
+        "XDG_CONFIG_HOME": os.path.join(home_dir, ".config"),
+    }
+    saved = {name: os.environ.get(name) for name in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def bench_size(num_repos: int, args) -> dict:
+    """Times the hot paths on a home directory with `num_repos` repositories."""
+    with tempfile.TemporaryDirectory(prefix="localgit-bench-") as tmp_dir:
+        home_dir = os.path.join(tmp_dir, "home")
+        start = time.perf_counter()
+        generate_home(
+            home_dir,
+            num_repos,
+            max_depth=args.depth,
+            dirty_fraction=args.dirty_fraction,
+            seed=args.seed,
+        )
+        print(
+            f"{num_repos} repos generated in {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+
+        with fake_home(home_dir):
+            results = {}
+            results["get_all_git_dirs_cold"] = measure(
+                lambda: get_all_git_dirs(EXCLUDE_DIRS, rescan=True), args.repeat
+            )
+            results["get_all_git_dirs_warm"] = measure(
+                lambda: get_all_git_dirs(EXCLUDE_DIRS), args.repeat
+            )
+            results["get_valid_git_dirs"] = measure(
+                lambda: get_valid_git_dirs([], EXCLUDE_DIRS), args.repeat
+            )
+
+            gits = get_git_dirs(get_valid_git_dirs([], EXCLUDE_DIRS))
+
+            def status():
+                run_repos(
+                    lambda git_dir, git_name: report_status(
+                        git_dir, git_name, False, False, True, True, True, False
+                    ),
+                    gits,
+                    args.jobs,
+                )
+                status_cache.save()
+
+            # the first status records the clean repositories and the statuses of the dirty
+            # ones, later ones skip git for them
+            results["report_status_cold"] = measure(status, 1)
+            results["report_status_warm"] = measure(status, args.repeat)
+            results["report_log"] = measure(
+                lambda: run_repos(
+                    lambda git_dir, git_name: report_log(git_dir, git_name, 3),
+                    gits,
+                    args.jobs,
+                ),
+                args.repeat,
+            )
+            results["list"] = measure(
+                lambda: run_repos(
+                    lambda git_dir, git_name: report_list(git_dir, git_name, False),
+                    get_git_dirs(get_valid_git_dirs([], EXCLUDE_DIRS)),
+                    args.jobs,
+                ),
+                args.repeat,
+            )
+    return results
+
+
+def get_environment() -> dict:
+    """Gets what the results depend on besides the code: the commit, python, git and machine."""
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"],
+        cwd=package_dir,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    git_version = subprocess.run(
+        ["git", "--version"], capture_output=True, text=True
+    ).stdout.strip()
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "git": git_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> int:
+    """Prints the change of every median compared to a baseline results file.
+
+    Returns exit code 1 if any benchmark is more than `threshold` slower, 0 otherwise.
+    """
+    exit_code = 0
+    for size, benchmarks in results["results"].items():
+        for name, result in benchmarks.items():
+            old = baseline.get("results", {}).get(size, {}).get(name)
+            if old is None or not old["median"]:
+                continue
+            change = result["median"] / old["median"] - 1
+            regressed = change > threshold
+            exit_code |= regressed
+            print(
+                f"{size:>6} {name:<24} {old['median']:>10.4f}s -> "
+                f"{result['median']:>10.4f}s {change:+8.1%}"
+                + ("  REGRESSION" if regressed else "")
+            )
+    return exit_code
+
+
+def setup_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.bench",
+        description="Time the hot paths of localgit on generated home directories.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=list(DEFAULT_SIZES),
+        help="The numbers of repos to generate.",
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=3,
+        help="The maximum number of directories between a top level directory and a repo.",
+    )
+    parser.add_argument(
+        "--dirty-fraction",
+        type=float,
+        default=0.1,
+        help="The fraction of repos with modified or untracked files.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the layout.")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="The number of times each path is timed."
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="The number of repos handled at the same time.",
+    )
+    parser.add_argument("--output", "-o", help="The JSON file to write the results to.")
+    parser.add_argument(
+        "--compare", help="A JSON results file to compare the results against."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="How much slower than --compare a path may be before it is a regression.",
+    )
+    return parser
+
+
+def main() -> int:
+    args = setup_parser().parse_args()
+    results = {
+        "version": RESULTS_VERSION,
+        "environment": get_environment(),
+        "params": {
+            "depth": args.depth,
+            "dirty_fraction": args.dirty_fraction,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "jobs": args.jobs,
+        },
+        "results": {str(size): bench_size(size, args) for size in args.sizes},
+    }
+
+    text = json.dumps(results, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text, end="")
+
+    if args.compare:
+        with open(args.compare) as file:
+            return compare(json.load(file), results, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,156 @@
+import os
+import os.path
+import random
+import shutil
+import subprocess
+
+TEMPLATE_URL = "TEMPLATE_REMOTE_URL"
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "localgit",
+    "GIT_AUTHOR_EMAIL": "localgit@example.com",
+    "GIT_COMMITTER_NAME": "localgit",
+    "GIT_COMMITTER_EMAIL": "localgit@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+    "GIT_CONFIG_GLOBAL": os.devnull,
+}
+
+
+def git(*args: str, cwd: str | None = None) -> str:
+    """Runs a git command with a fixed identity and no user or system config.
+
+    Returns the stdout of the command.
+    """
+    env = {**os.environ, **GIT_ENV}
+    return subprocess.run(
+        ["git", *args], cwd=cwd, env=env, check=True, capture_output=True, text=True
+    ).stdout
+
+
+def make_template(template_dir: str, num_commits: int = 5) -> tuple[str, str]:
+    """Makes the repository and bare remote that every generated repository is copied from.
+
+    Args:
+        template_dir: The directory the template repository and remote are made in.
+        num_commits: The number of commits of the template repository.
+
+    Returns the directories of the template repository and of its bare remote.
+    """
+    repo_dir = os.path.join(template_dir, "repo")
+    remote_dir = os.path.join(template_dir, "remote.git")
+    git("init", "-q", "-b", "main", repo_dir)
+    for idx in range(num_commits):
+        os.makedirs(os.path.join(repo_dir, "src"), exist_ok=True)
+        with open(os.path.join(repo_dir, "src", f"file{idx}.py"), "w") as file:
+            file.write(f"value = {idx}\n")
+        with open(os.path.join(repo_dir, "README.md"), "a") as file:
+            file.write(f"change {idx}\n")
+        git("add", "-A", cwd=repo_dir)
+        git("commit", "-q", "-m", f"commit {idx}", cwd=repo_dir)
+
+    git("clone", "-q", "--bare", repo_dir, remote_dir)
+    git("remote", "add", "origin", TEMPLATE_URL, cwd=repo_dir)
+    git("config", "branch.main.remote", "origin", cwd=repo_dir)
+    git("config", "branch.main.merge", "refs/heads/main", cwd=repo_dir)
+    # the remote-tracking branch a fetch would have made
+    git("update-ref", "refs/remotes/origin/main", "HEAD", cwd=repo_dir)
+    return repo_dir, remote_dir
+
+
+def copy_repo(template_repo: str, repo_dir: str, remote_url: str) -> None:
+    """Copies the template repository and points its origin to `remote_url`."""
+    shutil.copytree(template_repo, repo_dir, symlinks=True)
+    config_path = os.path.join(repo_dir, ".git", "config")
+    with open(config_path) as file:
+        config = file.read()
+    with open(config_path, "w") as file:
+        file.write(config.replace(TEMPLATE_URL, remote_url))
+
+
+def get_repo_path(home_dir: str, idx: int, max_depth: int, rand: random.Random) -> str:
+    """Gets where the `idx`th repository goes, between 1 and `max_depth` directories below
+    one of the top level directories of the home directory."""
+    top = rand.choice(["code", "projects", "work", "src/github.com/user"])
+    parents = [f"group{rand.randrange(20)}" for _ in range(rand.randrange(max_depth))]
+    return os.path.join(home_dir, top, *parents, f"repo{idx}")
+
+
+def make_noise(home_dir: str, num_noise_dirs: int, rand: random.Random) -> None:
+    """Makes directory trees without repositories that the walk still has to list: caches,
+    `node_modules` of projects that are not repositories and data directories."""
+    for idx in range(num_noise_dirs):
+        kind = idx % 3
+        if kind == 0:
+            noise_dir = os.path.join(home_dir, ".cache", f"tool{idx}", "v1", "objects")
+        elif kind == 1:
+            noise_dir = os.path.join(
+                home_dir, "projects", f"webapp{idx}", "node_modules", f"pkg{idx}", "lib"
+            )
+        else:
+            noise_dir = os.path.join(home_dir, "data", f"set{idx}", "raw")
+        os.makedirs(noise_dir, exist_ok=True)
+        for file_idx in range(rand.randrange(1, 8)):
+            with open(os.path.join(noise_dir, f"f{file_idx}"), "w") as file:
+                file.write("noise\n")
+
+
+def make_dirty(repo_dir: str, rand: random.Random) -> None:
+    """Modifies a tracked file and adds an untracked file in a repository."""
+    with open(os.path.join(repo_dir, "README.md"), "a") as file:
+        file.write("local change\n")
+    if rand.random() < 0.5:
+        with open(os.path.join(repo_dir, "notes.txt"), "w") as file:
+            file.write("untracked\n")
+
+
+def generate_home(
+    home_dir: str,
+    num_repos: int,
+    max_depth: int = 3,
+    num_noise_dirs: int | None = None,
+    dirty_fraction: float = 0.1,
+    num_cached_repos: int | None = None,
+    seed: int = 0,
+) -> list[str]:
+    """Generates a fake home directory with `num_repos` git repositories, each with its own
+    local bare remote in `~/.remotes` as `origin`. The bare remotes have no `.git` directory so
+    the walk lists them like any other directory without repositories.
+
+    Args:
+        home_dir: The directory to generate, which must not exist.
+        num_repos: The number of repositories outside of `~/.cache`.
+        max_depth: The maximum number of directories between a top level directory of the
+            home directory and a repository.
+        num_noise_dirs: The number of directory trees without repositories. Defaults to
+            `num_repos`.
+        dirty_fraction: The fraction of repositories with modified or untracked files.
+        num_cached_repos: The number of repositories under `~/.cache`, which are meant to be
+            excluded with `LOCALGIT_EXCLUDE_DIR`. Defaults to 5% of `num_repos`.
+        seed: The seed of the layout.
+
+    Returns the directories of the repositories outside of `~/.cache`.
+    """
+    rand = random.Random(seed)
+    os.makedirs(home_dir)
+    template_repo, template_remote = make_template(os.path.join(home_dir, ".template"))
+    remotes_dir = os.path.join(home_dir, ".remotes")
+    os.makedirs(remotes_dir)
+
+    repo_dirs = []
+    for idx in range(num_repos):
+        repo_dir = get_repo_path(home_dir, idx, max_depth, rand)
+        remote_dir = os.path.join(remotes_dir, f"repo{idx}.git")
+        shutil.copytree(template_remote, remote_dir, symlinks=True)
+        copy_repo(template_repo, repo_dir, remote_dir)
+        if rand.random() < dirty_fraction:
+            make_dirty(repo_dir, rand)
+        repo_dirs.append(repo_dir)
+
+    if num_cached_repos is None:
+        num_cached_repos = num_repos // 20
+    for idx in range(num_cached_repos):
+        repo_dir = os.path.join(home_dir, ".cache", "plugins", f"plugin{idx}")
+        copy_repo(template_repo, repo_dir, os.path.join(remotes_dir, "repo0.git"))
+
+    make_noise(home_dir, num_repos if num_noise_dirs is None else num_noise_dirs, rand)
+    shutil.rmtree(os.path.join(home_dir, ".template"))
+    return sorted(repo_dirs)
@@ -0,0 +1,295 @@
+"""Times `pull` and `push` against local bare remotes with injected network latency.
+
+python -m benchmarks.network --sizes 10 100 --delays 0 0.1 --output network.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import os.path
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from src.executor import DEFAULT_JOBS, map_repos, run_repos
+from src.pull import report_pull
+from src.push import plan_push, report_push
+from src.utils import get_git_dirs
+
+from .bench import compare, fake_home, get_environment
+from .home import generate_home, git
+
+DEFAULT_SIZES = (10, 100)
+DEFAULT_DELAYS = (0, 0.1)
+RESULTS_VERSION = 1
+GIT_WRAPPER = """#!/bin/sh
+echo git >> "{log_path}"
+exec "{git_path}" "$@"
+"""
+TRANSPORT_WRAPPER = """#!/bin/sh
+echo network >> "{log_path}"
+sleep {delay}
+exec "{git_path}" {command} "$@"
+"""
+
+
+def make_wrappers(bin_dir: str, log_path: str, delay: float) -> dict[str, str]:
+    """Writes a `git` that logs every process localgit starts and `upload-pack` and
+    `receive-pack` commands (the remote side of fetches and pushes) that also sleep `delay`
+    seconds before serving each network operation.
+
+    Args:
+        bin_dir: The directory the wrappers are written to, meant to go first in PATH.
+        log_path: The file every wrapped process appends a line to.
+        delay: The latency injected in every fetch and push.
+
+    Returns the paths of the `upload-pack` and `receive-pack` wrappers.
+    """
+    git_path = shutil.which("git")
+    os.makedirs(bin_dir)
+    wrappers = {
+        "git": GIT_WRAPPER.format(log_path=log_path, git_path=git_path),
+        "upload-pack": TRANSPORT_WRAPPER.format(
+            log_path=log_path,
+            delay=delay,
+            git_path=git_path,
+            command="upload-pack",
+        ),
+        "receive-pack": TRANSPORT_WRAPPER.format(
+            log_path=log_path,
+            delay=delay,
+            git_path=git_path,
+            command="receive-pack",
+        ),
+    }
+    for name, script in wrappers.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as file:
+            file.write(script)
+        os.chmod(path, 0o755)
+    return {
+        "upload-pack": os.path.join(bin_dir, "upload-pack"),
+        "receive-pack": os.path.join(bin_dir, "receive-pack"),
+    }
+
+
+def commit_file(repo_dir: str, name: str, message: str) -> None:
+    """Adds a file to a repository and commits it."""
+    with open(os.path.join(repo_dir, name), "w") as file:
+        file.write(f"{message}\n")
+    git("add", name, cwd=repo_dir)
+    git("commit", "-q", "-m", message, cwd=repo_dir)
+
+
+def make_histories(
+    home_dir: str, repo_dirs: list[str], transports: dict[str, str], seed: int
+) -> dict[str, int]:
+    """Makes the repositories behind, ahead of or diverged from their remotes (with changes to
+    different files so merging never conflicts), points them to their remotes with `file://`
+    urls and the latency injecting transports.
+
+    Args:
+        home_dir: The generated home directory.
+        repo_dirs: The repositories of the home directory.
+        transports: The paths of the `upload-pack` and `receive-pack` wrappers.
+        seed: The seed of the choice of history of each repository.
+
+    Returns the number of repositories with each kind of history.
+    """
+    rand = random.Random(seed)
+    upstream_dir = os.path.join(home_dir, ".upstream")
+    git("clone", "-q", os.path.join(home_dir, ".remotes", "repo0.git"), upstream_dir)
+    git("reset", "-q", "--hard", "HEAD~1", cwd=upstream_dir)  # the template's history
+    commit_file(upstream_dir, "upstream.txt", "upstream change")
+    advanced_remote = os.path.join(home_dir, ".advanced.git")
+    git("clone", "-q", "--bare", upstream_dir, advanced_remote)
+    shutil.rmtree(upstream_dir)
+
+    counts = {"behind": 0, "ahead": 0, "diverged": 0, "up_to_date": 0}
+    for idx, repo_dir in enumerate(repo_dirs):
+        remote_dir = git("remote", "get-url", "origin", cwd=repo_dir).strip()
+        kind = rand.choice(["behind", "behind", "ahead", "diverged", "up_to_date"])
+        counts[kind] += 1
+        if kind in ("behind", "diverged"):
+            shutil.rmtree(remote_dir)
+            shutil.copytree(advanced_remote, remote_dir, symlinks=True)
+        if kind in ("ahead", "diverged"):
+            commit_file(repo_dir, "local.txt", f"local change {idx}")
+
+        git("remote", "set-url", "origin", f"file://{remote_dir}", cwd=repo_dir)
+        git(
+            "config",
+            "remote.origin.uploadpack",
+            transports["upload-pack"],
+            cwd=repo_dir,
+        )
+        git(
+            "config",
+            "remote.origin.receivepack",
+            transports["receive-pack"],
+            cwd=repo_dir,
+        )
+
+    shutil.rmtree(advanced_remote)
+    return counts
+
+
+def run_pull(gits: list[tuple[str, str]], jobs: int) -> None:
+    run_repos(
+        lambda git_dir, git_name: report_pull(git_dir, git_name, False, False),
+        gits,
+        jobs,
+    )
+
+
+def run_push(gits: list[tuple[str, str]], jobs: int) -> None:
+    plans = dict(zip(gits, map_repos(plan_push, gits, jobs)))
+    run_repos(
+        lambda git_dir, git_name: report_push(
+            git_dir, git_name, False, False, False, "", plans[git_name, git_dir]
+        ),
+        gits,
+        jobs,
+    )
+
+
+def bench_command(command: str, num_repos: int, delay: float, args) -> dict:
+    """Times `command` ("pull" or "push") on freshly generated home directories.
+
+    Returns the minimum, median and all the durations in seconds, and the median numbers of
+    git processes localgit started and of network operations.
+    """
+    runs = []
+    processes = []
+    network_operations = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory(prefix="localgit-bench-") as tmp_dir:
+            home_dir = os.path.join(tmp_dir, "home")
+            log_path = os.path.join(tmp_dir, "git.log")
+            repo_dirs = generate_home(
+                home_dir, num_repos, dirty_fraction=args.dirty_fraction, seed=args.seed
+            )
+            transports = make_wrappers(os.path.join(tmp_dir, "bin"), log_path, delay)
+            counts = make_histories(home_dir, repo_dirs, transports, args.seed)
+            gits = get_git_dirs(repo_dirs)
+
+            path = os.environ["PATH"]
+            os.environ["PATH"] = os.path.join(tmp_dir, "bin") + os.pathsep + path
+            try:
+                with fake_home(home_dir), contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    (run_pull if command == "pull" else run_push)(gits, args.jobs)
+                    runs.append(time.perf_counter() - start)
+            finally:
+                os.environ["PATH"] = path
+
+            with open(log_path) as file:
+                lines = file.read().split()
+            processes.append(lines.count("git"))
+            network_operations.append(lines.count("network"))
+
+    return {
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+        "git_processes": statistics.median(processes),
+        "network_operations": statistics.median(network_operations),
+        "histories": counts,
+    }
+
+
+def setup_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.network",
+        description="Time pull and push against local bare remotes with injected latency.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=list(DEFAULT_SIZES),
+        help="The numbers of repos to generate.",
+    )
+    parser.add_argument(
+        "--delays",
+        type=float,
+        nargs="*",
+        default=list(DEFAULT_DELAYS),
+        help="The seconds of latency injected in every fetch and push.",
+    )
+    parser.add_argument(
+        "--dirty-fraction",
+        type=float,
+        default=0.1,
+        help="The fraction of repos with modified or untracked files.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The seed of the layout.")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="The number of times each command is timed, on a new home directory each time.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help="The number of repos handled at the same time.",
+    )
+    parser.add_argument("--output", "-o", help="The JSON file to write the results to.")
+    parser.add_argument(
+        "--compare", help="A JSON results file to compare the results against."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="How much slower than --compare a command may be before it is a regression.",
+    )
+    return parser
+
+
+def main() -> int:
+    args = setup_parser().parse_args()
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = {}
+        for delay in args.delays:
+            for command in ("pull", "push"):
+                print(f"{command} {size} repos, {delay}s delay", file=sys.stderr)
+                results[str(size)][f"{command}_delay_{delay:g}s"] = bench_command(
+                    command, size, delay, args
+                )
+
+    output = {
+        "version": RESULTS_VERSION,
+        "environment": get_environment(),
+        "params": {
+            "dirty_fraction": args.dirty_fraction,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "jobs": args.jobs,
+        },
+        "results": results,
+    }
+    text = json.dumps(output, indent=2, sort_keys=True) + "\n"
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text, end="")
+
+    if args.compare:
+        with open(args.compare) as file:
+            return compare(json.load(file), output, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
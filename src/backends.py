@@ -0,0 +1,180 @@
+import os
+import subprocess
+
+from .commitgraph import get_commit_diffs_from_graph
+from .dirty import is_clean, parse_ignored_dirs, record_clean
+from .refs import read_head_branch
+
+# the operations and the `GitBackend` methods implementing them. Only reads that can be
+# answered without git have backends: pulling, pushing, committing, `git log` and the full
+# `git status --porcelain=v2` (see `utils`) always run git.
+OPERATIONS = {
+    "cur_branch": "get_cur_branch",
+    "commit_diffs": "count_commit_diffs",
+    "unpushed_files": "get_unpushed_files",
+}
+DEFAULT_BACKENDS = {
+    "cur_branch": ("python", "subprocess"),
+    "commit_diffs": ("batched", "subprocess"),
+    "unpushed_files": ("python", "subprocess"),
+}
+
+
+class Repo:
+    """Handle of a repository passed to the backends."""
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+
+
+class GitBackend:
+    """Interface of a way of reading repositories. Every operation returns None when the
+    backend can not answer for a repository, in which case the next backend configured for the
+    operation is tried (see `get_operation_backends`)."""
+
+    name = ""
+
+    def get_cur_branch(self, repo: Repo) -> str | None:
+        """Gets the current branch ("" when HEAD is detached)."""
+        return None
+
+    def count_commit_diffs(self, repo: Repo, cur_branch: str) -> tuple[int, int] | None:
+        """Counts the commits `cur_branch` is ahead and behind `origin/cur_branch`, (-1, -1)
+        if either does not exist."""
+        return None
+
+    def get_unpushed_files(self, repo: Repo) -> list[str] | None:
+        """Gets the modified and untracked files like `git status --porcelain` shows them."""
+        return None
+
+
+class SubprocessBackend(GitBackend):
+    """Runs a git command for every operation. Always answers so it is the last backend tried."""
+
+    name = "subprocess"
+
+    def get_cur_branch(self, repo: Repo) -> str | None:
+        fetch = subprocess.Popen(
+            ["git", "branch", "--show-current"],
+            cwd=repo.work_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output, error = fetch.communicate()
+        if error.decode("utf-8"):
+            return None
+
+        return output.decode()[:-1]
+
+    def count_commit_diffs(self, repo: Repo, cur_branch: str) -> tuple[int, int] | None:
+        commits_count = subprocess.Popen(
+            f"git rev-list --left-right --count {cur_branch}...origin/{cur_branch}".split(
+                " "
+            ),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=repo.work_dir,
+        )
+        output, error = commits_count.communicate()
+
+        if "unknown revision or path not in the working tree" in error.decode("utf-8"):
+            return -1, -1
+
+        return tuple(int(diff) for diff in output.decode("utf-8")[:-1].split("\t"))
+
+    def get_unpushed_files(self, repo: Repo) -> list[str] | None:
+        output = subprocess.check_output(
+            # the ignored directories are skipped by the clean record
+            ["git", "status", "--porcelain", "--ignored=matching"],
+            text=True,
+            cwd=repo.work_dir,
+        )
+
+        files = [
+            file.strip()
+            for file in output.split("\n")
+            if file and not file.startswith("!! ")
+        ]
+        if not files:
+            record_clean(repo.work_dir, parse_ignored_dirs(output))
+        return files
+
+
+class PythonBackend(GitBackend):
+    """Reads the files in the `.git` directory without running git: HEAD and the refs (see
+    `refs`), the commit-graph and loose objects (see `commitgraph`) and the index and the
+    records of clean repositories (see `dirty`)."""
+
+    name = "python"
+
+    def get_cur_branch(self, repo: Repo) -> str | None:
+        return read_head_branch(repo.work_dir)
+
+    def count_commit_diffs(self, repo: Repo, cur_branch: str) -> tuple[int, int] | None:
+        return get_commit_diffs_from_graph(repo.work_dir, cur_branch, batched=False)
+
+    def get_unpushed_files(self, repo: Repo) -> list[str] | None:
+        return [] if is_clean(repo.work_dir) else None
+
+
+class BatchedBackend(PythonBackend):
+    """Like `PythonBackend` but reads the objects it can not find in the `.git` directory
+    (e.g. commits in packs) through a `git cat-file --batch` process of the repository that
+    runs for the walk (see `catfile`)."""
+
+    name = "batched"
+
+    def count_commit_diffs(self, repo: Repo, cur_branch: str) -> tuple[int, int] | None:
+        return get_commit_diffs_from_graph(repo.work_dir, cur_branch, batched=True)
+
+
+BACKENDS: dict[str, GitBackend] = {}
+
+
+def register_backend(backend: GitBackend) -> None:
+    """Makes a backend available to be configured for operations by its name."""
+    BACKENDS[backend.name] = backend
+
+
+for backend in (SubprocessBackend(), PythonBackend(), BatchedBackend()):
+    register_backend(backend)
+
+
+def get_operation_backends(operation: str) -> list[GitBackend]:
+    """Gets the backends tried in order for an operation. They can be configured with the
+    environment variable `LOCALGIT_BACKENDS`, a `;` separated list of `<operation>=<backends>`
+    with `,` separated backend names, e.g. `commit_diffs=python,subprocess;cur_branch=subprocess`.
+    The subprocess backend is always tried last.
+
+    Args:
+        operation: One of `OPERATIONS`.
+    """
+    names = DEFAULT_BACKENDS[operation]
+    for config in os.environ.get("LOCALGIT_BACKENDS", "").split(";"):
+        config_operation, _, config_names = config.partition("=")
+        if config_operation.strip() == operation:
+            names = [name.strip() for name in config_names.split(",")]
+
+    backends = [BACKENDS[name] for name in names if name in BACKENDS]
+    if BACKENDS["subprocess"] not in backends:
+        backends.append(BACKENDS["subprocess"])
+    return backends
+
+
+def call_backends(operation: str, work_dir: str, *args):
+    """Runs an operation on a repository with the first backend that can answer.
+
+    Args:
+        operation: One of `OPERATIONS`.
+        work_dir: The directory where the local repo is.
+        args: The other arguments of the operation.
+
+    Returns the result of the operation or None if no backend could answer.
+    """
+    repo = Repo(work_dir)
+    for backend in get_operation_backends(operation):
+        method = getattr(backend, OPERATIONS[operation])
+        result = method(repo, *args)
+        if result is not None:
+            return result
+    return None
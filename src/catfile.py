@@ -0,0 +1,118 @@
+import atexit
+import subprocess
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+SHUTDOWN_TIMEOUT = 5
+
+
+class CatFile:
+    """A `git cat-file --batch` process of a repository. Objects are read by writing their
+    object id to its stdin instead of starting git for every query. The process is started on
+    the first query and queries from different threads are serialized."""
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self.lock = threading.Lock()
+        self.process = None
+        self.failed = False
+
+    def read_object(self, oid: str) -> tuple[str, bytes] | None:
+        """Reads an object of the repository.
+
+        Args:
+            oid: The object id of the object.
+
+        Returns the type and content of the object or None if it is missing or git failed.
+        """
+        with self.lock:
+            if self.failed:
+                return None
+            if self.process is None:
+                try:
+                    self.process = subprocess.Popen(
+                        ["git", "cat-file", "--batch"],
+                        cwd=self.work_dir,
+                        stdin=subprocess.PIPE,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                    )
+                except OSError:
+                    self.failed = True
+                    return None
+
+            try:
+                self.process.stdin.write(oid.encode("ascii") + b"\n")
+                self.process.stdin.flush()
+                # `<oid> <type> <size>` followed by the content and a newline, or `<oid> missing`
+                header = self.process.stdout.readline().split()
+                if len(header) != 3:
+                    if not header:  # git exited
+                        self.failed = True
+                    return None
+                size = int(header[2])
+                content = self.process.stdout.read(size + 1)[:size]
+            except (OSError, ValueError):
+                self.failed = True
+                return None
+            return header[1].decode("ascii"), content
+
+    def close(self) -> None:
+        """Stops the git process by closing its stdin."""
+        with self.lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(SHUTDOWN_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
+
+
+cat_files: dict[str, CatFile] = {}
+cat_file_users: dict[str, int] = {}
+cat_files_lock = threading.Lock()
+
+
+@contextmanager
+def borrow_cat_file(work_dir: str) -> Iterator[CatFile]:
+    """Gets the `CatFile` of a repository for the length of a `with` block. Blocks of the same
+    repository running at the same time share it, and its git process is stopped when the last
+    one ends, so only the repositories being read have a process (and open files) at a time.
+
+    Only the ahead/behind counts read objects this way, for the commits missing from the
+    commit-graph (see `commitgraph.get_commit_diffs_from_graph`). `log` and the full status of
+    `localgit status` still run their own git commands.
+
+    Args:
+        work_dir: The directory where the local repo is.
+    """
+    with cat_files_lock:
+        if work_dir not in cat_files:
+            cat_files[work_dir] = CatFile(work_dir)
+        cat_file_users[work_dir] = cat_file_users.get(work_dir, 0) + 1
+        cat_file = cat_files[work_dir]
+    try:
+        yield cat_file
+    finally:
+        with cat_files_lock:
+            cat_file_users[work_dir] -= 1
+            last = cat_file_users[work_dir] == 0
+            if last:
+                del cat_files[work_dir], cat_file_users[work_dir]
+        if last:
+            cat_file.close()
+
+
+@atexit.register
+def close_cat_files() -> None:
+    """Stops the git processes of all the `CatFile`s."""
+    with cat_files_lock:
+        for cat_file in cat_files.values():
+            cat_file.close()
+        cat_files.clear()
+        cat_file_users.clear()
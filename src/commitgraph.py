@@ -0,0 +1,355 @@
+import bisect
+import heapq
+import mmap
+import os
+import os.path
+import struct
+import zlib
+
+from .catfile import CatFile, borrow_cat_file
+from .refs import get_common_dir, read_packed_refs, read_ref_oid, resolve_git_dir
+
+GRAPH_SIGNATURE = b"CGPH"
+PARENT_NONE = 0x70000000
+PARENT_EXTRA_EDGES = 0x80000000
+LEFT = 1
+RIGHT = 2
+STALE = LEFT | RIGHT
+
+
+class CommitGraphLayer:
+    """One memory mapped commit-graph file."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data = self.data
+        if data[:4] != GRAPH_SIGNATURE or data[4] != 1:
+            raise ValueError(f"{path} is not a version 1 commit-graph file.")
+        self.oid_size = 32 if data[5] == 2 else 20
+
+        chunks = {}
+        for idx in range(data[6] + 1):
+            chunk_id, offset = struct.unpack_from(">4sQ", data, 8 + 12 * idx)
+            chunks[chunk_id] = offset
+        if not all(chunk in chunks for chunk in (b"OIDF", b"OIDL", b"CDAT")):
+            raise ValueError(f"{path} is missing required chunks.")
+
+        self.fanout = struct.unpack_from(">256I", data, chunks[b"OIDF"])
+        self.num_commits = self.fanout[255]
+        self.oid_lookup = chunks[b"OIDL"]
+        self.commit_data = chunks[b"CDAT"]
+        self.extra_edges = chunks.get(b"EDGE")
+
+    def find(self, oid: bytes) -> int | None:
+        """Gets the position of a commit in this file with a binary search in its fanout range."""
+        lo = self.fanout[oid[0] - 1] if oid[0] else 0
+        hi = self.fanout[oid[0]]
+        pos = bisect.bisect_left(range(lo, hi), oid, key=self.oid_at) + lo
+        return pos if pos < hi and self.oid_at(pos) == oid else None
+
+    def oid_at(self, pos: int) -> bytes:
+        """Gets the object id of the commit at a position in this file."""
+        start = self.oid_lookup + pos * self.oid_size
+        return self.data[start : start + self.oid_size]
+
+
+class CommitGraph:
+    """The commit-graph of a repository: a single `objects/info/commit-graph` file or a chain
+    of them in `objects/info/commit-graphs`. Positions are global across the chain."""
+
+    def __init__(self, layers: list[CommitGraphLayer]):
+        self.layers = layers
+        self.offsets = []
+        offset = 0
+        for layer in layers:
+            self.offsets.append(offset)
+            offset += layer.num_commits
+
+    def find(self, oid: bytes) -> int | None:
+        """Gets the global position of a commit or None if it is not in the graph."""
+        for offset, layer in zip(self.offsets, self.layers):
+            pos = layer.find(oid)
+            if pos is not None:
+                return offset + pos
+        return None
+
+    def layer_at(self, pos: int) -> tuple[CommitGraphLayer, int]:
+        idx = bisect.bisect_right(self.offsets, pos) - 1
+        return self.layers[idx], pos - self.offsets[idx]
+
+    def oid_at(self, pos: int) -> bytes:
+        layer, local_pos = self.layer_at(pos)
+        return layer.oid_at(local_pos)
+
+    def commit_at(self, pos: int) -> tuple[int, list[int]]:
+        """Gets the generation number (topological level) and parent positions of a commit."""
+        layer, local_pos = self.layer_at(pos)
+        start = layer.commit_data + local_pos * (layer.oid_size + 16)
+        parent1, parent2, generation, _ = struct.unpack_from(
+            ">IIII", layer.data, start + layer.oid_size
+        )
+        generation >>= 2  # the lower 2 bits are the top of the commit time
+
+        parents = []
+        if parent1 != PARENT_NONE:
+            parents.append(parent1)
+        if parent2 & PARENT_EXTRA_EDGES:
+            edge = layer.extra_edges + (parent2 & ~PARENT_EXTRA_EDGES) * 4
+            while True:
+                (parent,) = struct.unpack_from(">I", layer.data, edge)
+                parents.append(parent & ~PARENT_EXTRA_EDGES)
+                if parent & PARENT_EXTRA_EDGES:
+                    break
+                edge += 4
+        elif parent2 != PARENT_NONE:
+            parents.append(parent2)
+        return generation, parents
+
+
+def load_commit_graph(objects_dir: str) -> CommitGraph | None:
+    """Memory maps the commit-graph of a repository.
+
+    Args:
+        objects_dir: The objects directory of the repository.
+
+    Returns the commit-graph or None if there is none or it can not be read.
+    """
+    info_dir = os.path.join(objects_dir, "info")
+    try:
+        with open(
+            os.path.join(info_dir, "commit-graphs", "commit-graph-chain"),
+            encoding="utf-8",
+        ) as file:
+            paths = [
+                os.path.join(info_dir, "commit-graphs", f"graph-{line.strip()}.graph")
+                for line in file
+                if line.strip()
+            ]
+    except (OSError, UnicodeDecodeError):
+        paths = [os.path.join(info_dir, "commit-graph")]
+
+    try:
+        return CommitGraph([CommitGraphLayer(path) for path in paths])
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def parse_commit_parents(data: bytes) -> list[str]:
+    """Gets the object ids of the parents from the content of a commit object."""
+    parents = []
+    for line in data.split(b"\n"):
+        if line.startswith(b"parent "):
+            parents.append(line[len(b"parent ") :].decode("ascii"))
+        elif not line.startswith(b"tree "):
+            break  # the parents come right after the tree
+    return parents
+
+
+def read_loose_commit(objects_dir: str, oid: str) -> list[str] | None:
+    """Reads the parents of a commit stored as a loose object.
+
+    Args:
+        objects_dir: The objects directory of the repository.
+        oid: The object id of the commit.
+
+    Returns the object ids of the parents or None if it is not a loose commit.
+    """
+    try:
+        with open(os.path.join(objects_dir, oid[:2], oid[2:]), "rb") as file:
+            data = zlib.decompress(file.read())
+    except (OSError, zlib.error):
+        return None
+
+    header, _, body = data.partition(b"\0")
+    if not header.startswith(b"commit "):
+        return None
+    return parse_commit_parents(body)
+
+
+def read_packed_commit(cat_file: CatFile, oid: str) -> list[str] | None:
+    """Reads the parents of a commit, e.g. one stored in a pack, through the `git cat-file
+    --batch` process of the repository (see `catfile.borrow_cat_file`).
+
+    Args:
+        cat_file: The `CatFile` of the repository.
+        oid: The object id of the commit.
+
+    Returns the object ids of the parents or None if it is not a commit.
+    """
+    obj = cat_file.read_object(oid)
+    if obj is None or obj[0] != "commit":
+        return None
+    return parse_commit_parents(obj[1])
+
+
+class CommitWalker:
+    """Looks up the generation numbers and parents of commits in the commit-graph, and of the
+    commits written since the commit-graph was by reading their loose objects (or the packs
+    fetches write them to through `git cat-file --batch`) and deriving their generation numbers
+    from their parents."""
+
+    def __init__(
+        self, objects_dir: str, graph: CommitGraph, cat_file: CatFile | None = None
+    ):
+        self.objects_dir = objects_dir
+        self.graph = graph
+        self.cat_file = cat_file  # None to only read loose objects
+        self.loose = {}
+
+    def lookup(self, oid: str) -> tuple[int, list[str]] | None:
+        """Gets the generation number and the parents of a commit.
+
+        Returns None if the commit is neither in the commit-graph nor a loose object.
+        """
+        if oid in self.loose:
+            return self.loose[oid]
+
+        pos = self.graph.find(bytes.fromhex(oid))
+        if pos is not None:
+            generation, parents = self.graph.commit_at(pos)
+            if generation == 0:
+                return None  # written without generation numbers
+            return generation, [self.graph.oid_at(parent).hex() for parent in parents]
+
+        # iterative so long chains of loose commits do not hit the recursion limit
+        stack = [oid]
+        while stack:
+            commit = stack[-1]
+            if commit in self.loose:
+                stack.pop()
+                continue
+            parents = read_loose_commit(self.objects_dir, commit)
+            if parents is None and self.cat_file is not None:
+                parents = read_packed_commit(self.cat_file, commit)
+            if parents is None:
+                return None
+
+            missing = []
+            generation = 0
+            for parent in parents:
+                if parent in self.loose:
+                    generation = max(generation, self.loose[parent][0])
+                    continue
+                pos = self.graph.find(bytes.fromhex(parent))
+                if pos is None:
+                    missing.append(parent)
+                    continue
+                parent_generation = self.graph.commit_at(pos)[0]
+                if parent_generation == 0:
+                    return None
+                generation = max(generation, parent_generation)
+
+            if missing:
+                stack.extend(missing)
+                continue
+            self.loose[commit] = (generation + 1, parents)
+            stack.pop()
+
+        return self.loose[oid]
+
+
+def count_ahead_behind(
+    walker: CommitWalker, left: str, right: str
+) -> tuple[int, int] | None:
+    """Counts the commits reachable from `left` but not `right` and the other way around, like
+    `git rev-list --left-right --count left...right`. Commits are visited in decreasing
+    generation so a commit's color (which sides reach it) is final once it is popped, and the
+    walk stops once every queued commit is reachable from both sides.
+
+    Args:
+        walker: The lookup of commits of the repository.
+        left: The object id of the left commit.
+        right: The object id of the right commit.
+
+    Returns the ahead and behind counts or None if a commit could not be looked up.
+    """
+    colors = {}
+    queue = []
+    num_unstale = 0
+
+    for oid, color in ((left, LEFT), (right, RIGHT)):
+        if oid in colors:
+            colors[oid] |= color
+            num_unstale -= 1
+            continue
+        commit = walker.lookup(oid)
+        if commit is None:
+            return None
+        colors[oid] = color
+        heapq.heappush(queue, (-commit[0], oid))
+        num_unstale += 1
+
+    counts = {LEFT: 0, RIGHT: 0, STALE: 0}
+    while queue and num_unstale > 0:
+        _, oid = heapq.heappop(queue)
+        color = colors[oid]
+        counts[color] += 1
+        if color != STALE:
+            num_unstale -= 1
+
+        for parent in walker.lookup(oid)[1]:
+            parent_color = colors.get(parent)
+            if parent_color is None:
+                commit = walker.lookup(parent)
+                if commit is None:
+                    return None
+                colors[parent] = color
+                heapq.heappush(queue, (-commit[0], parent))
+                if color != STALE:
+                    num_unstale += 1
+            elif parent_color | color != parent_color:
+                colors[parent] = parent_color | color
+                if colors[parent] == STALE:
+                    num_unstale -= 1
+    return counts[LEFT], counts[RIGHT]
+
+
+def get_commit_diffs_from_graph(
+    work_dir: str, cur_branch: str, batched: bool = True
+) -> tuple[int, int] | None:
+    """Gets the commit difference between `cur_branch` and `origin/cur_branch` in-process from
+    the commit-graph and loose objects instead of `git rev-list --left-right --count`.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        cur_branch: The branch that the user has checkout.
+        batched: Whether to read the commits that are neither in the commit-graph nor loose
+            through `git cat-file --batch`.
+
+    Returns the number of commits the local repo is ahead and behind the origin, (-1, -1) if
+    either branch does not exist, or None if git has to be used instead (e.g. there is no
+    commit-graph, a commit can not be read, the repository is shallow or has replace refs or
+    grafts).
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return None
+    common_dir = get_common_dir(git_dir)
+    objects_dir = os.path.join(common_dir, "objects")
+
+    if (
+        os.path.exists(os.path.join(common_dir, "shallow"))
+        or os.path.exists(os.path.join(common_dir, "info", "grafts"))
+        or os.path.isdir(os.path.join(common_dir, "refs", "replace"))
+        or any(ref.startswith("refs/replace/") for ref in read_packed_refs(common_dir))
+    ):
+        return None
+
+    graph = load_commit_graph(objects_dir)
+    if graph is None:
+        return None
+
+    left = read_ref_oid(work_dir, f"refs/heads/{cur_branch}")
+    right = read_ref_oid(work_dir, f"refs/remotes/origin/{cur_branch}")
+    if left is None or right is None:
+        return -1, -1
+
+    if not batched:
+        return count_ahead_behind(CommitWalker(objects_dir, graph), left, right)
+    # the git process only lives for the walk
+    with borrow_cat_file(work_dir) as cat_file:
+        return count_ahead_behind(
+            CommitWalker(objects_dir, graph, cat_file), left, right
+        )
@@ -0,0 +1,117 @@
+import os
+import os.path
+import sys
+import tomllib
+from typing import NamedTuple
+
+from .pretty_print import warning
+
+
+class SearchRoot(NamedTuple):
+    """A directory searched for local repositories."""
+
+    path: str
+    # how many levels of subdirectories are searched, None for all
+    max_depth: int | None
+    # whether to skip the directories on other filesystems
+    one_file_system: bool
+    # how many directories of its filesystem are listed at the same time, None for the default
+    concurrency: int | None = None
+
+
+def get_config_path() -> str:
+    """Gets the path of the config file of localgit (`$XDG_CONFIG_HOME/localgit/config.toml`,
+    `~/.config/localgit/config.toml` by default)."""
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_dir, "localgit", "config.toml")
+
+
+def load_config() -> dict:
+    """Loads the config file. An invalid config file is reported and ignored.
+
+    Returns the config or an empty dict if there is none.
+    """
+    path = get_config_path()
+    try:
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, tomllib.TOMLDecodeError) as error:
+        print(warning(f"Ignoring the config file {path}: {error}"), file=sys.stderr)
+        return {}
+
+
+def parse_env_root(entry: str) -> dict:
+    """Parses an entry of `LOCALGIT_ROOTS`, a directory optionally followed by `:` and its
+    max depth (e.g. `~/code:3`)."""
+    path, _, max_depth = entry.rpartition(":")
+    if path and max_depth.isdigit():
+        return {"path": path, "max_depth": int(max_depth)}
+    return {"path": entry}
+
+
+def get_search_roots() -> list[SearchRoot]:
+    """Gets the directories searched for local repositories: the `;` separated entries of
+    `LOCALGIT_ROOTS` if it is set, otherwise the `roots` of the config file, otherwise the
+    home directory. Roots of the config file are either paths or tables with a `path`, a
+    `max_depth`, `one_file_system` and the `concurrency` of the walk of their filesystem (see
+    `discovery.stream_git_dirs`). `one_file_system` defaults to the top level
+    `one_file_system` of the config file, which `LOCALGIT_ONE_FILE_SYSTEM` overrides.
+
+    Returns the roots with their paths expanded and made absolute. Invalid roots are reported
+    and skipped.
+    """
+    config = load_config()
+    one_file_system = config.get("one_file_system", False)
+    if (env_one_file_system := os.environ.get("LOCALGIT_ONE_FILE_SYSTEM")) is not None:
+        one_file_system = env_one_file_system not in ("", "0")
+
+    if env_roots := os.environ.get("LOCALGIT_ROOTS"):
+        entries = [parse_env_root(entry) for entry in env_roots.split(";") if entry]
+    else:
+        entries = config.get("roots") or ["~"]
+        if not isinstance(entries, list):
+            print(
+                warning(f"Ignoring the invalid search root {entries!r}."),
+                file=sys.stderr,
+            )
+            entries = []
+
+    roots = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"path": entry}
+        path = entry.get("path") if isinstance(entry, dict) else None
+        max_depth = entry.get("max_depth") if isinstance(entry, dict) else None
+        concurrency = entry.get("concurrency") if isinstance(entry, dict) else None
+        if (
+            not isinstance(path, str)
+            or not path
+            or (
+                max_depth is not None
+                and (not isinstance(max_depth, int) or isinstance(max_depth, bool))
+            )
+            or (
+                concurrency is not None
+                and (
+                    not isinstance(concurrency, int)
+                    or isinstance(concurrency, bool)
+                    or concurrency < 1
+                )
+            )
+        ):
+            print(
+                warning(f"Ignoring the invalid search root {entry!r}."), file=sys.stderr
+            )
+            continue
+
+        roots.append(
+            SearchRoot(
+                os.path.abspath(os.path.expanduser(path)),
+                max_depth,
+                bool(entry.get("one_file_system", one_file_system)),
+                concurrency,
+            )
+        )
+    return roots
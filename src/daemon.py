@@ -0,0 +1,551 @@
+import io
+import json
+import os
+import os.path
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable
+
+from . import executor, utils
+from .dirty import get_exclude_files, get_excludes_file, parse_ignored_dirs
+from .index import get_cache_dir
+from .inotify import (
+    IN_CREATE,
+    IN_IGNORED,
+    IN_ISDIR,
+    IN_MOVED_TO,
+    IN_Q_OVERFLOW,
+    Inotify,
+)
+from .pretty_print import failure, success, warning
+from .records import collect_records
+from .refs import get_common_dir, resolve_git_dir
+from .utils import scan_git_dirs
+
+DAEMON_COMMANDS = ("status", "list", "log")
+# the environment variables of the client the answer depends on
+DAEMON_ENV = ("LOCALGIT_EXCLUDE_REPO", "LOCALGIT_EXCLUDE_DIR")
+# the environment variables of the client the repositories the daemon found depend on
+DISCOVERY_ENV = ("LOCALGIT_ROOTS", "LOCALGIT_ONE_FILE_SYSTEM")
+DEFAULT_REFRESH_SECONDS = 60
+MAX_WATCHES_PER_REPO = 10000
+READ_SIZE = 64 * 1024
+
+
+def get_socket_path() -> str:
+    """Gets the path of the Unix socket of the daemon in the cache directory."""
+    return os.path.join(get_cache_dir(), "daemon.sock")
+
+
+def can_answer(args) -> bool:
+    """Whether the daemon can answer a command. It answers `status`, `list` and `log` unless
+    the answer depends on more than the state of the repositories: the current directory
+    (--repo-directories), the time (--timeout, --deadline, log --since and --until, fetching
+    for status --commit-diffs) or this process (--profile, --trace2, status --no-cache).
+
+    Args:
+        args: The parsed CL arguments and their values.
+    """
+    if (
+        args.subcommand not in DAEMON_COMMANDS
+        or args.profile is not None
+        or args.trace2 is not None
+        or getattr(args, "repo_directories", None)
+        or getattr(args, "timeout", None) is not None
+        or getattr(args, "deadline", None) is not None
+    ):
+        return False
+    if args.subcommand == "status":
+        return not args.no_cache and (not args.commit_diffs or args.no_fetch)
+    if args.subcommand == "log":
+        return args.since is None and args.until is None
+    return True
+
+
+def read_all(conn: socket.socket) -> bytes:
+    """Reads from a connection until the other end stops writing."""
+    chunks = []
+    while chunk := conn.recv(READ_SIZE):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def query_daemon(args, argv: list[str]) -> int | None:
+    """Has the daemon answer a command if it is running and can answer it (see `can_answer`),
+    and prints its output.
+
+    Args:
+        args: The parsed CL arguments and their values.
+        argv: The CL arguments.
+
+    Returns the exit code of the command or None if it has to be run by this process.
+    """
+    if not can_answer(args):
+        return None
+
+    request = {
+        "argv": argv,
+        "home": os.path.expanduser("~"),
+        "env": {name: os.environ.get(name) for name in DAEMON_ENV + DISCOVERY_ENV},
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(get_socket_path())
+            client.sendall(json.dumps(request).encode("utf-8"))
+            client.shutdown(socket.SHUT_WR)
+            response = json.loads(read_all(client))
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(response, dict) or "exit_code" not in response:
+        return None
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
+
+
+def get_ignored_paths(work_dir: str) -> set[str]:
+    """Gets the directories of a repository that match an ignore pattern (e.g.
+    `node_modules`), which are not watched.
+
+    Returns the absolute paths of the directories.
+    """
+    status = subprocess.Popen(
+        ["git", "status", "--porcelain=v2", "--ignored=matching"],
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output, _ = status.communicate()
+    if status.returncode != 0:
+        return set()
+    return {
+        os.path.join(work_dir, rel_path)
+        for rel_path in parse_ignored_dirs(output.decode("utf-8", "surrogateescape"))
+    }
+
+
+class ReportMemo:
+    """The exit codes and outputs of the repositories for the commands the daemon answered,
+    each kept until something changes in its repository (see `RepoWatcher`). The daemon
+    installs it as `executor.report_memo` so `run_repos` only runs the commands in the
+    repositories that changed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}  # by repository, then by query
+        self.generations = {}  # by repository, incremented by every change
+        self.watched = set()  # the repositories whose results can be kept
+        self.query = ""  # the command being answered
+
+    def invalidate(self, work_dir: str) -> None:
+        with self.lock:
+            self.results.pop(work_dir, None)
+            self.generations[work_dir] = self.generations.get(work_dir, 0) + 1
+
+    def invalidate_all(self) -> None:
+        with self.lock:
+            for work_dir in self.results:
+                self.generations[work_dir] = self.generations.get(work_dir, 0) + 1
+            self.results.clear()
+
+    def unwatch(self, work_dir: str) -> None:
+        with self.lock:
+            self.watched.discard(work_dir)
+            self.results.pop(work_dir, None)
+
+    def forget(self, work_dir: str) -> None:
+        """Drops everything kept for a repository that is gone."""
+        with self.lock:
+            self.watched.discard(work_dir)
+            self.results.pop(work_dir, None)
+            self.generations.pop(work_dir, None)
+
+    def run(
+        self, work_dir: str, func: Callable[[], tuple[int, str]]
+    ) -> tuple[int, str]:
+        """Gets the exit code and output of the command being answered in a repository,
+        calling `func` for them if the repository changed since they were kept.
+
+        Args:
+            work_dir: The directory where the local repo is.
+            func: The function running the command in the repository.
+        """
+        with self.lock:
+            result = self.results.get(work_dir, {}).get(self.query)
+            if result is not None:
+                return result
+            generation = self.generations.get(work_dir, 0)
+
+        result = func()
+        with self.lock:
+            # not if the repository changed while the command ran
+            if (
+                work_dir in self.watched
+                and self.generations.get(work_dir, 0) == generation
+            ):
+                self.results.setdefault(work_dir, {})[self.query] = result
+        return result
+
+
+class RepoWatcher:
+    """Watches the git directories (HEAD, the index, the refs and the ignore rules) and the
+    working trees (except `.git` and ignored directories) of repositories with inotify, and
+    invalidates the results of a repository in the `ReportMemo` when anything changes in
+    it. When the ignore rules of a repository change, it is walked and watched again so the
+    directories that are no longer ignored are watched too."""
+
+    def __init__(self, memo: ReportMemo):
+        self.memo = memo
+        self.inotify = Inotify()
+        self.lock = threading.Lock()
+        self.repos = {}  # the repositories of every watch descriptor
+        self.paths = {}  # the directory of every watch descriptor
+        self.recursive = set()  # the descriptors whose new subdirectories are watched
+        self.git_wds = set()  # the descriptors of directories of git directories
+        self.ignored = {}  # the ignored directories of every repository
+        self.num_watches = {}  # by repository
+        self.known = set()  # the repositories that were watched or failed to be
+        # the repositories whose ignore rules depend on each file, by the descriptor of its
+        # directory and its name (see `dirty.get_exclude_files`)
+        self.ignore_files = {}
+
+    def watch(self, path: str, work_dir: str, recursive: bool, git: bool) -> None:
+        """Watches a directory of a repository, and its subdirectories if `recursive`. Must be
+        called with the lock held.
+
+        Raises:
+            OSError: The directory could not be watched or the repository has too many
+                directories.
+        """
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            if self.num_watches.get(work_dir, 0) >= MAX_WATCHES_PER_REPO:
+                raise OSError(
+                    f"more than {MAX_WATCHES_PER_REPO} directories in {work_dir}"
+                )
+            wd = self.inotify.add_watch(path)
+            self.num_watches[work_dir] = self.num_watches.get(work_dir, 0) + 1
+            self.repos.setdefault(wd, set()).add(work_dir)
+            self.paths[wd] = path
+            if git:
+                self.git_wds.add(wd)
+            if not recursive:
+                continue
+
+            self.recursive.add(wd)
+            try:
+                with os.scandir(path) as scan:
+                    entries = list(scan)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if (
+                    is_dir
+                    and entry.name != ".git"
+                    and entry.path not in self.ignored.get(work_dir, ())
+                ):
+                    stack.append(entry.path)
+
+    def watch_repo(self, work_dir: str) -> bool:
+        """Watches everything the status, branch, refs and logs of a repository depend on.
+
+        Returns whether the repository is watched.
+        """
+        git_dir = resolve_git_dir(work_dir)
+        if git_dir is None:
+            return False
+        common_dir = get_common_dir(git_dir)
+        ignored = get_ignored_paths(work_dir)
+        exclude_files = get_exclude_files(common_dir, get_excludes_file(work_dir))
+
+        with self.lock:
+            self.ignored[work_dir] = ignored
+            for path in exclude_files:
+                # the global files are outside of the repository, in directories that exist
+                try:
+                    wd = self.inotify.add_watch(os.path.dirname(path))
+                except OSError:
+                    continue
+                self.paths.setdefault(wd, os.path.dirname(path))
+                key = (wd, os.path.basename(path))
+                self.ignore_files.setdefault(key, set()).add(work_dir)
+            try:
+                for path in {git_dir, common_dir, os.path.join(common_dir, "info")}:
+                    if os.path.isdir(path):
+                        self.watch(path, work_dir, False, True)
+                for path in {
+                    os.path.join(git_dir, "refs"),
+                    os.path.join(common_dir, "refs"),
+                }:
+                    if os.path.isdir(path):
+                        self.watch(path, work_dir, True, True)
+                self.watch(work_dir, work_dir, True, False)
+            except OSError:
+                return False
+        return True
+
+    def remove_watches(self, work_dir: str) -> None:
+        """Removes the watches of a repository that no other repository shares."""
+        with self.lock:
+            for key in list(self.ignore_files):
+                self.ignore_files[key].discard(work_dir)
+                if not self.ignore_files[key]:
+                    del self.ignore_files[key]
+            ignore_file_wds = {wd for wd, _ in self.ignore_files}
+            for wd in set(self.repos).union(self.paths):
+                work_dirs = self.repos.get(wd, set())
+                work_dirs.discard(work_dir)
+                if work_dirs or wd in ignore_file_wds:
+                    continue
+                self.inotify.rm_watch(wd)
+                self.repos.pop(wd, None)
+                self.paths.pop(wd, None)
+                self.recursive.discard(wd)
+                self.git_wds.discard(wd)
+            self.ignored.pop(work_dir, None)
+            self.num_watches.pop(work_dir, None)
+
+    def unwatch_repo(self, work_dir: str) -> None:
+        """Stops watching a repository that was deleted or moved, removing the watches no
+        other repository shares."""
+        self.remove_watches(work_dir)
+        self.memo.forget(work_dir)
+
+    def rewatch_repo(self, work_dir: str) -> None:
+        """Walks and watches a repository again after its ignore rules changed."""
+        self.remove_watches(work_dir)
+        watched = self.watch_repo(work_dir)
+        # not `forget`, a command running since before the change must not keep its result
+        self.memo.invalidate(work_dir)
+        if not watched:
+            self.memo.unwatch(work_dir)
+
+    def refresh(self) -> int:
+        """Finds the repositories again (see `utils.scan_git_dirs`), watches the new ones,
+        stops watching the ones that are gone and makes them the repositories the commands
+        are answered for.
+
+        Returns the number of repositories.
+        """
+        git_dirs = scan_git_dirs()
+        for work_dir in self.known - set(git_dirs):
+            self.known.discard(work_dir)
+            self.unwatch_repo(work_dir)
+        for work_dir in git_dirs:
+            if work_dir in self.known:
+                continue
+            self.known.add(work_dir)
+            if self.watch_repo(work_dir):
+                with self.memo.lock:
+                    self.memo.watched.add(work_dir)
+        utils.known_git_dirs = git_dirs
+        return len(git_dirs)
+
+    def drain(self) -> None:
+        """Handles the events that are queued, so the changes made before a command are
+        seen by it."""
+        rewatch = set()
+        with self.lock:
+            for event in self.inotify.read():
+                if event.mask & IN_Q_OVERFLOW:
+                    self.memo.invalidate_all()
+                    continue
+                work_dirs = self.repos.get(event.wd, set())
+                rewatch.update(self.ignore_files.get((event.wd, event.name), ()))
+                if event.name == ".gitignore" and event.wd not in self.git_wds:
+                    rewatch.update(work_dirs)
+                if event.mask & IN_IGNORED:
+                    self.repos.pop(event.wd, None)
+                    self.paths.pop(event.wd, None)
+                    self.recursive.discard(event.wd)
+                    self.git_wds.discard(event.wd)
+                    for key in [key for key in self.ignore_files if key[0] == event.wd]:
+                        del self.ignore_files[key]
+                # git takes a lock before writing HEAD, the index or a ref and then renames it
+                # to the file, and commands that only read may take the lock too
+                if event.wd in self.git_wds and event.name.endswith(".lock"):
+                    continue
+
+                for work_dir in work_dirs:
+                    self.memo.invalidate(work_dir)
+                if (
+                    event.mask & IN_ISDIR
+                    and event.mask & (IN_CREATE | IN_MOVED_TO)
+                    and event.wd in self.recursive
+                    and event.name != ".git"
+                ):
+                    path = os.path.join(self.paths[event.wd], event.name)
+                    for work_dir in work_dirs:
+                        try:
+                            self.watch(path, work_dir, True, event.wd in self.git_wds)
+                        except OSError:
+                            self.memo.unwatch(work_dir)
+
+        for work_dir in rewatch:
+            if work_dir in self.known:
+                self.rewatch_repo(work_dir)
+
+    def run(self) -> None:
+        """Handles the events as they come."""
+        while True:
+            select.select([self.inotify], [], [])
+            self.drain()
+
+
+def answer(request: dict, parser, run_command: Callable, watcher: RepoWatcher) -> dict:
+    """Runs a command sent by a client with the outputs of the repositories that did not
+    change since the daemon last answered it.
+
+    Args:
+        request: The CL arguments, home directory and environment of the client.
+        parser: The parser of the CL arguments.
+        run_command: The function running a command given its parsed arguments.
+        watcher: The watcher of the repositories.
+
+    Returns the exit code and outputs of the command, or whether the client has to run it.
+    """
+    if not isinstance(request, dict) or request.get("home") != os.path.expanduser("~"):
+        return {"fallback": True}
+    try:
+        with redirect_stderr(io.StringIO()):
+            args = parser.parse_args(request["argv"])
+    except (SystemExit, KeyError, TypeError):
+        return {"fallback": True}
+    if not can_answer(args):
+        return {"fallback": True}
+
+    env = request.get("env", {})
+    if any(env.get(name) != os.environ.get(name) for name in DISCOVERY_ENV):
+        return {"fallback": True}  # the client searches other roots
+
+    watcher.drain()
+    saved = {name: os.environ.get(name) for name in DAEMON_ENV}
+    watcher.memo.query = json.dumps([request["argv"], env])
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    try:
+        for name in DAEMON_ENV:
+            if env.get(name) is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = env[name]
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            with collect_records(args.format):
+                exit_code = run_command(args)
+    except Exception:
+        return {"fallback": True}
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+    }
+
+
+def is_running(socket_path: str) -> bool:
+    """Whether a daemon is listening on `socket_path`."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+    except OSError:
+        return False
+    return True
+
+
+def serve(parser, run_command: Callable, refresh_seconds: float) -> int:
+    """Runs the daemon until it is interrupted: finds and watches the repositories, finds
+    them again every `refresh_seconds` and answers the commands sent to its socket one at a
+    time.
+
+    Args:
+        parser: The parser of the CL arguments.
+        run_command: The function running a command given its parsed arguments.
+        refresh_seconds: How often the repositories are found again.
+
+    Returns exit codes 0 (the daemon was stopped) or 1 (it could not start).
+    """
+    socket_path = get_socket_path()
+    if is_running(socket_path):
+        print(warning(f"localgit daemon is already running on {socket_path}."))
+        return 1
+
+    memo = ReportMemo()
+    try:
+        watcher = RepoWatcher(memo)
+    except OSError as error:
+        print(failure(f"localgit daemon needs inotify (Linux): {error}"))
+        return 1
+
+    # so the git commands do not refresh the index and wake the watcher up
+    os.environ["GIT_OPTIONAL_LOCKS"] = "0"
+    num_repos = watcher.refresh()
+    threading.Thread(target=watcher.run, daemon=True).start()
+
+    def refresh() -> None:
+        while True:
+            time.sleep(refresh_seconds)
+            try:
+                watcher.refresh()
+            except Exception as error:  # keep the repositories found before
+                print(
+                    warning(f"Could not find the repositories again: {error!r}"),
+                    file=sys.stderr,
+                    flush=True,
+                )
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.lexists(socket_path):
+        os.unlink(socket_path)  # left behind by a daemon that did not stop cleanly
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    executor.report_memo = memo
+    print(
+        success(
+            f"localgit daemon is watching {len(memo.watched)} of {num_repos} repos on {socket_path}."
+        ),
+        flush=True,
+    )
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    request = json.loads(read_all(conn))
+                    response = answer(request, parser, run_command, watcher)
+                except ValueError:
+                    response = {"fallback": True}
+                try:
+                    conn.sendall(json.dumps(response).encode("utf-8"))
+                except OSError:
+                    continue
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        executor.report_memo = None
+        server.close()
+        os.unlink(socket_path)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import os.path
+import time
+
+from .gitindex import is_index_clean
+from .index import get_cache_dir, write_json
+from .refs import (
+    get_common_dir,
+    read_config_file_value,
+    read_ref_oid,
+    resolve_git_dir,
+)
+
+CLEAN_RECORD_VERSION = 2
+RACY_MTIME_NS = 2_000_000_000
+
+
+def get_record_path(work_dir: str) -> str:
+    """Gets the path of the file where the state of a repository is recorded when `git status`
+    finds it clean."""
+    name = hashlib.sha1(work_dir.encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(get_cache_dir(), "clean", f"{name}.json")
+
+
+def stat_key(path: str) -> list[int] | None:
+    """Gets the mtime, size and inode of a file or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def get_excludes_file(work_dir: str) -> str:
+    """Gets the global file of ignore patterns of a repository, `core.excludesFile` or
+    `$XDG_CONFIG_HOME/git/ignore` if it is not set. The setting is read without running git
+    from the config of the repository, `~/.gitconfig` and `$XDG_CONFIG_HOME/git/config`, in
+    the order git gives them precedence. Includes and the system config are not read.
+
+    Args:
+        work_dir: The directory where the local repo is.
+    """
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    config_paths = [
+        os.path.expanduser("~/.gitconfig"),
+        os.path.join(config_dir, "git", "config"),
+    ]
+    if (git_dir := resolve_git_dir(work_dir)) is not None:
+        config_paths.insert(0, os.path.join(get_common_dir(git_dir), "config"))
+
+    for config_path in config_paths:
+        if path := read_config_file_value(config_path, "core", None, "excludesfile"):
+            return os.path.join(work_dir, os.path.expanduser(path))
+    return os.path.join(config_dir, "git", "ignore")
+
+
+def get_exclude_files(common_dir: str, excludes_file: str) -> list[str]:
+    """Gets the files outside of the working tree that decide which files git ignores: the
+    ignore patterns of the repository, its global file of ignore patterns (see
+    `get_excludes_file`) and the config files that can set another one.
+
+    Args:
+        common_dir: The git directory shared by the worktrees of the repository.
+        excludes_file: The global file of ignore patterns of the repository.
+    """
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return [
+        os.path.join(common_dir, "info", "exclude"),
+        os.path.join(common_dir, "config"),
+        excludes_file,
+        os.path.join(config_dir, "git", "config"),
+        os.path.expanduser("~/.gitconfig"),
+    ]
+
+
+def parse_ignored_dirs(output: str) -> set[str]:
+    """Gets the ignored directories from the output of `git status --ignored=matching`, either
+    `--porcelain` or `--porcelain=v2`, relative to the working tree."""
+    return {
+        line.split(" ", 1)[1][:-1]
+        for line in output.split("\n")
+        if line.startswith(("! ", "!! ")) and line.endswith("/")
+    }
+
+
+def get_dir_mtimes(work_dir: str, ignored_dirs: set[str]) -> dict[str, int | None]:
+    """Gets the mtimes of all the directories of the working tree git looks at for untracked
+    files. A new untracked file changes the mtime of one of them.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        ignored_dirs: The ignored directories relative to `work_dir`, which are skipped.
+
+    Returns a map of the directories relative to `work_dir` to their mtime (ns). Recently
+    modified directories have no mtime so they never match.
+    """
+    now = time.time_ns()
+    dir_mtimes = {}
+    stack = [""]
+    while stack:
+        rel_path = stack.pop()
+        path = os.path.join(work_dir, rel_path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as scan:
+                entries = list(scan)
+        except OSError:
+            continue
+        dir_mtimes[rel_path] = mtime if mtime < now - RACY_MTIME_NS else None
+
+        for entry in entries:
+            child = os.path.join(rel_path, entry.name)
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir and entry.name != ".git" and child not in ignored_dirs:
+                stack.append(child)
+
+    return dir_mtimes
+
+
+def record_clean(
+    work_dir: str, ignored_dirs: set[str], excludes_file: str | None = None
+) -> None:
+    """Records the state of a repository that `git status` just found clean so `is_clean` can
+    tell later that nothing changed since without running git.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        ignored_dirs: The ignored directories relative to `work_dir` from the same
+            `git status --ignored=matching` call (see `parse_ignored_dirs`), which are skipped.
+        excludes_file: The global file of ignore patterns of the repository, looked up with
+            `get_excludes_file` if not given.
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return
+    common_dir = get_common_dir(git_dir)
+    excludes_file = excludes_file or get_excludes_file(work_dir)
+
+    write_json(
+        get_record_path(work_dir),
+        {
+            "version": CLEAN_RECORD_VERSION,
+            "head": read_ref_oid(work_dir),
+            "index": stat_key(os.path.join(git_dir, "index")),
+            "excludes_file": excludes_file,
+            "excludes": [
+                stat_key(path) for path in get_exclude_files(common_dir, excludes_file)
+            ],
+            "dirs": get_dir_mtimes(work_dir, ignored_dirs),
+        },
+    )
+
+
+def is_clean(work_dir: str) -> bool:
+    """Whether a repository is definitely clean, i.e. `git status --porcelain` would print
+    nothing, without running git. It is if HEAD, the index, the ignore rules and the
+    directories of the working tree are the same as when `git status` last found it clean
+    (see `record_clean`, which looked up the global file of ignore patterns; setting another
+    one changes a config file) and the stat data of every tracked file matches the index (see
+    `gitindex.is_index_clean`). False means it is possibly dirty.
+
+    Args:
+        work_dir: The directory where the local repo is.
+    """
+    try:
+        with open(get_record_path(work_dir), encoding="utf-8") as file:
+            record = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None or not isinstance(record, dict):
+        return False
+    common_dir = get_common_dir(git_dir)
+
+    if (
+        record.get("version") != CLEAN_RECORD_VERSION
+        or record.get("head") is None
+        or record["head"] != read_ref_oid(work_dir)
+        or record.get("index") is None
+        or record["index"] != stat_key(os.path.join(git_dir, "index"))
+        or not isinstance(record.get("excludes_file"), str)
+        or record.get("excludes")
+        != [
+            stat_key(path)
+            for path in get_exclude_files(common_dir, record["excludes_file"])
+        ]
+    ):
+        return False
+
+    for rel_path, mtime in record.get("dirs", {"": None}).items():
+        try:
+            if (
+                mtime is None
+                or os.stat(os.path.join(work_dir, rel_path)).st_mtime_ns != mtime
+            ):
+                return False
+        except OSError:
+            return False
+
+    return is_index_clean(work_dir, git_dir, common_dir)
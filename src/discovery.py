@@ -0,0 +1,334 @@
+import os
+import os.path
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
+
+from .config import SearchRoot
+
+SUBMODULE_PATH_RE = re.compile(r"^\s*path\s*=\s*(.+?)\s*$", re.MULTILINE)
+RACY_MTIME_NS = 2_000_000_000
+
+
+def default_num_workers() -> int:
+    """The default number of threads used to walk the directory tree. Walking is bound by
+    filesystem latency rather than CPU, so more threads than cores is fine."""
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def get_submodule_dirs(git_dir: str) -> list[str]:
+    """Gets the directories of the submodules (and their submodules) of a repository by reading
+    its `.gitmodules` file instead of walking its working tree.
+
+    Args:
+        git_dir: The directory where the local repo is.
+
+    Returns the directories of the submodules that are checked out.
+    """
+    try:
+        with open(os.path.join(git_dir, ".gitmodules"), encoding="utf-8") as file:
+            paths = SUBMODULE_PATH_RE.findall(file.read())
+    except (OSError, UnicodeDecodeError):
+        return []
+
+    submodule_dirs = []
+    for path in paths:
+        submodule_dir = os.path.normpath(os.path.join(git_dir, path))
+        if os.path.lexists(os.path.join(submodule_dir, ".git")):
+            submodule_dirs.append(submodule_dir)
+            submodule_dirs.extend(get_submodule_dirs(submodule_dir))
+    return submodule_dirs
+
+
+def is_dir(entry: os.DirEntry) -> bool:
+    """Whether a directory entry is a directory without following symlinks like `find`."""
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def read_dir(
+    path: str, cached: list | None, scan_start: int, descend_repo: bool = False
+) -> list | None:
+    """Reads a directory into an index node `[mtime_ns, is_repo, {subdir name: child node}]`.
+    The cached node is reused without listing the directory when its mtime has not changed.
+    Its children are the cached child nodes (or None for new subdirectories) and still need
+    to be revalidated by the caller.
+
+    Args:
+        path: The directory to read.
+        cached: The node of the directory from the previous run, if any.
+        scan_start: When the walk started (ns). Recently modified directories are stored
+            without an mtime so they are listed again on the next run.
+        descend_repo: Whether to list the subdirectories of a repository.
+
+    Returns the node of the directory or None if it can not be read.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    cached_dirs = cached[2] if cached is not None else {}
+    if cached is not None and cached[0] == mtime:
+        is_repo, names = cached[1], list(cached_dirs)
+    else:
+        try:
+            with os.scandir(path) as scan:
+                entries = list(scan)
+        except OSError:
+            return None
+        is_repo = any(entry.name == ".git" for entry in entries)
+        names = (
+            [entry.name for entry in entries if entry.name != ".git" and is_dir(entry)]
+            if not is_repo or descend_repo
+            else []
+        )
+
+    if mtime >= scan_start - RACY_MTIME_NS:
+        mtime = None
+
+    return [mtime, is_repo, {name: cached_dirs.get(name) for name in names}]
+
+
+def walk_children(
+    path: str,
+    node: list,
+    prune: Callable[[str], bool] | None,
+    scan_start: int,
+) -> list[tuple[str, list]]:
+    """Reads the subdirectories of an index node in place.
+
+    Args:
+        path: The directory of the node.
+        node: The index node whose children are replaced by their revalidated nodes.
+        prune: Predicate that is True for directories whose subtree should not be walked.
+            The cached nodes of pruned subtrees are kept as they are.
+        scan_start: When the walk started (ns).
+
+    Returns the directories and nodes of the subdirectories that should be walked.
+    """
+    children = []
+    for name, cached in list(node[2].items()):
+        child_path = os.path.join(path, name)
+        if prune is not None and prune(child_path):
+            node[2][name] = cached or [None, False, {}]
+            continue
+
+        child = read_dir(child_path, cached, scan_start)
+        if child is None:
+            del node[2][name]
+            continue
+        node[2][name] = child
+        children.append((child_path, child))
+    return children
+
+
+def walk_git_dirs(
+    top: str,
+    node: list,
+    prune: Callable[[str], bool] | None = None,
+    scan_start: int = 0,
+    depth: int = 1,
+    max_depth: int | None = None,
+) -> list[str]:
+    """Walks the directory tree under `top` looking for git repositories. Does not descend into
+    a repository once its `.git` entry is found (its submodules are read from `.gitmodules`)
+    and does not follow symlinks, like `find`. Only the directories whose mtime changed since
+    the index was built are listed again.
+
+    Args:
+        top: The directory to start walking from.
+        node: The index node of `top` as returned by `read_dir`. Updated in place.
+        prune: Predicate that is True for directories whose subtree should not be walked.
+        scan_start: When the walk started (ns).
+        depth: How many levels `top` is below the directory the search started from.
+        max_depth: How many levels below the directory the search started from are searched.
+            No limit if None.
+
+    Returns the directories of all the repositories found.
+    """
+    git_dirs = []
+    stack = [(top, node, depth)]
+    while stack:
+        path, node, depth = stack.pop()
+        if node[1]:
+            git_dirs.append(path)
+            git_dirs.extend(get_submodule_dirs(path))
+            continue
+        if max_depth is not None and depth >= max_depth:
+            continue
+        stack.extend(
+            (child_path, child, depth + 1)
+            for child_path, child in walk_children(path, node, prune, scan_start)
+        )
+
+    return git_dirs
+
+
+def device_pruner(
+    device: int, prune: Callable[[str], bool] | None = None
+) -> Callable[[str], bool]:
+    """Extends a pruning predicate for `walk_git_dirs` to the directories on another
+    filesystem than `device`, i.e. mount points, like `find -xdev`.
+
+    Args:
+        device: The `st_dev` of the filesystem the walk stays on.
+        prune: The predicate to extend, if any.
+    """
+
+    def prune_device(path: str) -> bool:
+        if prune is not None and prune(path):
+            return True
+        try:
+            return os.lstat(path).st_dev != device
+        except OSError:
+            return True
+
+    return prune_device
+
+
+def iter_walk_git_dirs(
+    root_dir: str,
+    prune: Callable[[str], bool] | None,
+    num_workers: int | None,
+    cached: list | None,
+    max_depth: int | None,
+    one_file_system: bool,
+    trees: dict[str, list | None],
+) -> Iterator[list[str]]:
+    """Finds the git repositories under `root_dir` by splitting its top level subtrees across
+    a pool of threads that each walk their subtree with `walk_git_dirs`.
+
+    Args:
+        root_dir: The directory to search.
+        prune: Predicate that is True for directories whose subtree should not be walked.
+        num_workers: The number of threads. Defaults to `default_num_workers()`.
+        cached: The index node of `root_dir` from the previous run, if any.
+        max_depth: How many levels of subdirectories of `root_dir` are searched. No limit if
+            None.
+        one_file_system: Whether to skip the directories on other filesystems than
+            `root_dir` (see `device_pruner`).
+        trees: The map the updated index node of `root_dir` is added to.
+
+    Yields the directories of the repositories found in each subtree as soon as its walk is
+    done.
+    """
+    scan_start = time.time_ns()
+    root = read_dir(root_dir, cached, scan_start, descend_repo=True)
+    trees[root_dir] = root
+    if root is None:
+        return
+
+    if root[1]:
+        # e.g. a dotfiles repository in the home directory. Keep looking for the others.
+        yield [root_dir, *get_submodule_dirs(root_dir)]
+    if max_depth is not None and max_depth < 1:
+        return
+
+    if one_file_system:
+        try:
+            prune = device_pruner(os.stat(root_dir).st_dev, prune)
+        except OSError:
+            return
+
+    subtrees = walk_children(root_dir, root, prune, scan_start)
+    with ThreadPoolExecutor(num_workers or default_num_workers()) as executor:
+        futures = [
+            executor.submit(walk_git_dirs, path, node, prune, scan_start, 1, max_depth)
+            for path, node in subtrees
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def parallel_walk_git_dirs(
+    root_dir: str,
+    prune: Callable[[str], bool] | None = None,
+    num_workers: int | None = None,
+    cached: list | None = None,
+    max_depth: int | None = None,
+    one_file_system: bool = False,
+) -> tuple[list[str], list | None]:
+    """Finds all the git repositories under `root_dir` (see `iter_walk_git_dirs`).
+
+    Returns the sorted directories of all the repositories found and the updated index node
+    of `root_dir`.
+    """
+    trees = {}
+    git_dirs = set()
+    for found in iter_walk_git_dirs(
+        root_dir, prune, num_workers, cached, max_depth, one_file_system, trees
+    ):
+        git_dirs.update(found)
+    return sorted(git_dirs), trees[root_dir]
+
+
+def stream_git_dirs(
+    roots: list[SearchRoot],
+    prune: Callable[[str], bool] | None,
+    cached: dict[str, list],
+    trees: dict[str, list | None],
+) -> Iterator[list[str]]:
+    """Finds the git repositories under all the search roots with one walker per filesystem,
+    so a slow filesystem (e.g. a network mount) does not hold up the others. Each walker has
+    its own pool of threads, as big as the largest `concurrency` of its roots, and walks its
+    roots one after the other.
+
+    Args:
+        roots: The directories to search.
+        prune: Predicate that is True for directories whose subtree should not be walked.
+        cached: The index node of every root from the previous run.
+        trees: The map the updated index node of every root is added to.
+
+    Yields the directories of the repositories found in each subtree, from all the walkers,
+    as soon as its walk is done.
+
+    Raises:
+        Exception: The error a walker ran into, once it is done, so the repositories of its
+            filesystem are not silently missing.
+    """
+    devices = {}
+    for root in roots:
+        try:
+            devices.setdefault(os.stat(root.path).st_dev, []).append(root)
+        except OSError:
+            trees[root.path] = None
+
+    found_queue = queue.SimpleQueue()
+
+    def walk_device(device_roots: list[SearchRoot]) -> None:
+        num_workers = max(
+            (root.concurrency for root in device_roots if root.concurrency),
+            default=None,
+        )
+        try:
+            for root in device_roots:
+                for found in iter_walk_git_dirs(
+                    root.path,
+                    prune,
+                    num_workers,
+                    cached.get(root.path),
+                    root.max_depth,
+                    root.one_file_system,
+                    trees,
+                ):
+                    found_queue.put(found)
+        except Exception as error:
+            # put on the queue for `stream_git_dirs` to re-raise as it drains it
+            found_queue.put(error)
+        finally:
+            found_queue.put(None)  # this walker is done
+
+    for device_roots in devices.values():
+        threading.Thread(target=walk_device, args=(device_roots,), daemon=True).start()
+
+    for _ in devices:
+        while (found := found_queue.get()) is not None:
+            if isinstance(found, Exception):
+                raise found
+            yield found
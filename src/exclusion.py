@@ -0,0 +1,153 @@
+import fnmatch
+import os
+import os.path
+import re
+from typing import Iterator
+
+GLOB_CHARS = "*?["
+
+
+class PatternNode:
+    """A node of the trie of the `LOCALGIT_EXCLUDE_DIR` entries with glob characters, reached
+    by matching one path component per level either literally or with a glob."""
+
+    __slots__ = ("children", "globs", "excluded", "excludes_below")
+
+    def __init__(self):
+        self.children = {}
+        self.globs = []
+        self.excluded = False  # the directory and everything under it
+        self.excludes_below = False  # only what is under the directory
+
+    def add(self, component: str) -> "PatternNode":
+        """Gets the child of the node for a component of an entry, adding it if needed."""
+        if not any(char in component for char in GLOB_CHARS):
+            return self.children.setdefault(component, PatternNode())
+        for pattern, child in self.globs:
+            if pattern == component:
+                return child
+        child = PatternNode()
+        self.globs.append((component, child))
+        return child
+
+    def step(self, component: str) -> Iterator["PatternNode"]:
+        """Gets the children of the node that match a component of a path."""
+        if (child := self.children.get(component)) is not None:
+            yield child
+        for pattern, child in self.globs:
+            if fnmatch.fnmatchcase(component, pattern):
+                yield child
+
+
+class ExcludeMatcher:
+    """The --exclude repo names and `LOCALGIT_EXCLUDE_DIR` entries compiled once, so every
+    path is matched in one search and one walk of its components however many entries there
+    are.
+
+    Entries without glob characters exclude every path they are part of, both written with the
+    home directory as `~` (e.g. `~/.cache` also excludes `~/.cache-old`, and `~/.cache/` only
+    what is under `~/.cache`), like they always did. Entries with glob characters match whole path
+    components: starting with `~` or `/` they exclude the directory they name and everything
+    under it, and only what is under it with a trailing `/` (e.g. `~/work/*-old`). Other glob
+    entries, e.g. `*.egg-info` or `.local/share/nvim/*`, exclude matching directories at any
+    depth.
+
+    Args:
+        exclude: List of the github repo names to exclude.
+        exclude_dirs: List of the directories containing github repositories to ignore. Empty
+            entries are skipped.
+        home_dir: The directory `~` stands for. The home directory by default.
+    """
+
+    def __init__(
+        self, exclude: list[str], exclude_dirs: list[str], home_dir: str | None = None
+    ):
+        self.names = set(exclude)
+        self.anchored = PatternNode()  # matched from the root of the path
+        self.floating = PatternNode()  # matched from every component of the path
+        self.excludes_dirs = False
+        self.home_dir = home_dir = home_dir or os.path.expanduser("~")
+
+        substrings = []
+        for entry in exclude_dirs:
+            entry = entry.strip()
+            if not entry:
+                continue
+            self.excludes_dirs = True
+            if not any(char in entry for char in GLOB_CHARS):
+                substrings.append(re.escape(self.tilde_path(entry)))
+                continue
+
+            below = entry.endswith("/") and entry.strip("/") not in ("", "~")
+            if entry == "~" or entry.startswith("~/"):
+                entry = home_dir + entry[1:]
+
+            node = self.anchored if os.path.isabs(entry) else self.floating
+            for component in os.path.normpath(entry).split(os.sep):
+                if component:
+                    node = node.add(component)
+            if below:
+                node.excludes_below = True
+            else:
+                node.excluded = True
+        # matched against the path with the home directory as `~`
+        self.substrings = re.compile("|".join(substrings)) if substrings else None
+
+    def tilde_path(self, path: str) -> str:
+        """Writes the home directory at the start of a path as `~`."""
+        if path == self.home_dir or path.startswith(self.home_dir + os.sep):
+            return "~" + path[len(self.home_dir) :]
+        return path
+
+    def match(self, path: str) -> tuple[bool, bool]:
+        """Matches an absolute path against the `LOCALGIT_EXCLUDE_DIR` entries.
+
+        Returns whether the directory is excluded and whether everything under it is.
+        """
+        excludes_below = False
+        if self.substrings is not None:
+            tilde_path = self.tilde_path(path)
+            if self.substrings.search(tilde_path):
+                return True, True
+            # part of every path under the directory
+            excludes_below = self.substrings.search(tilde_path + os.sep) is not None
+
+        components = [component for component in path.split(os.sep) if component]
+        nodes = [self.anchored, self.floating]
+        for idx, component in enumerate(components):
+            last = idx == len(components) - 1
+            next_nodes = [self.floating]
+            for node in nodes:
+                for child in node.step(component):
+                    if child.excluded or (child.excludes_below and not last):
+                        return True, True
+                    next_nodes.append(child)
+            nodes = next_nodes
+        return False, excludes_below or any(node.excludes_below for node in nodes)
+
+    def is_excluded(self, git_dir: str) -> bool:
+        """Whether a repository is excluded by name or by directory."""
+        return os.path.basename(git_dir) in self.names or self.match(git_dir)[0]
+
+    def prune(self, path: str) -> bool:
+        """Whether the subtree of a directory does not have to be walked by discovery (see
+        `discovery.walk_git_dirs`) since every repository in it would be excluded. A
+        directory whose contents are excluded but that is a repository itself (e.g. `~/.cache`
+        for the entry `~/.cache/`) is still walked.
+        """
+        excluded, excludes_below = self.match(path)
+        if excluded:
+            return True
+        return excludes_below and not os.path.lexists(os.path.join(path, ".git"))
+
+    def partition(self, git_dirs: list[str]) -> tuple[list[str], list[str]]:
+        """Splits the directories containing github repositories into the valid and the
+        excluded ones in one pass."""
+        valid_git_dirs = []
+        excluded_git_dirs = []
+        for git_dir in git_dirs:
+            if self.is_excluded(git_dir):
+                excluded_git_dirs.append(git_dir)
+            else:
+                valid_git_dirs.append(git_dir)
+        return valid_git_dirs, excluded_git_dirs
@@ -0,0 +1,424 @@
+import io
+import os
+import os.path
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from .pretty_print import warning
+from .records import emit_record, retime_records, start_repo
+
+T = TypeVar("T")
+
+# the repos are handled by threads mostly waiting on git, the disk and the network
+DEFAULT_JOBS = min(32, (os.cpu_count() or 1) * 4)
+ORDERS = ("sorted", "completion")
+STRAGGLER_SECONDS = 5
+MAX_STRAGGLERS = 10
+
+
+class GitTimeout(Exception):
+    """Raised when a git command of a repository runs past the timeout of its operations or
+    the deadline of the run."""
+
+
+limits = threading.local()
+# set by `localgit daemon` to reuse the output of the repositories that did not change since
+# it answered the same command (see `daemon.ReportMemo`)
+report_memo = None
+
+
+def get_deadline(seconds: float | None) -> float | None:
+    """Gets the `time.monotonic()` of the deadline of a run that has to be done in `seconds`."""
+    return None if seconds is None else time.monotonic() + seconds
+
+
+@contextmanager
+def limited(timeout: float | None, deadline: float | None) -> Iterator[None]:
+    """Limits the git commands run in this thread through `communicate` for the duration of
+    the context.
+
+    Args:
+        timeout: The number of seconds each git command may take.
+        deadline: The `time.monotonic()` by which all the git commands have to be done.
+    """
+    limits.timeout = timeout
+    limits.deadline = deadline
+    try:
+        yield
+    finally:
+        limits.timeout = None
+        limits.deadline = None
+
+
+def get_timeout(timeout: float | None = None) -> float | None:
+    """Gets how long the git command about to run in this thread may take: the smallest of
+    `timeout`, the `--timeout` of the run and what is left until the `--deadline` of the run
+    (see `run_limited`).
+
+    Args:
+        timeout: The timeout of the command itself, if it has one.
+
+    Returns the number of seconds or None if there is no limit.
+    """
+    timeouts = [timeout, getattr(limits, "timeout", None)]
+    deadline = getattr(limits, "deadline", None)
+    if deadline is not None:
+        timeouts.append(max(0, deadline - time.monotonic()))
+    return min((limit for limit in timeouts if limit is not None), default=None)
+
+
+def is_limited(timeout: float | None = None) -> bool:
+    """Gets whether the git command about to run in this thread has a time limit (see
+    `get_timeout`). Only then is it started with `start_new_session=True` so `communicate`
+    can kill it with the processes it started: in a new session git has no controlling
+    terminal, so credential, passphrase and host key prompts fail.
+
+    Args:
+        timeout: The timeout of the command itself, if it has one.
+    """
+    return get_timeout(timeout) is not None
+
+
+def communicate(
+    process: subprocess.Popen, timeout: float | None = None
+) -> tuple[bytes, bytes]:
+    """Waits for a git command like `process.communicate()` but only for as long as
+    `get_timeout` allows. A command with a time limit must be started with
+    `start_new_session=is_limited(timeout)` so that it and the processes it started (e.g.
+    `ssh` or `git-remote-https`) can be killed together.
+
+    Args:
+        process: The git command.
+        timeout: The timeout of the command itself, if it has one.
+
+    Returns the stdout and stderr of the command.
+
+    Raises:
+        GitTimeout: The command was killed because it ran out of time.
+    """
+    try:
+        return process.communicate(timeout=get_timeout(timeout))
+    except subprocess.TimeoutExpired:
+        # kill the transport helpers git started too, they keep the pipes open
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except ProcessLookupError:
+            pass
+        process.communicate()
+        raise GitTimeout()
+
+
+class RepoOutput:
+    """Stand-in for `sys.stdout` that sends what the `report_*` functions print from a worker
+    thread to the buffer of the repository that thread is working on."""
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer or self.stdout).write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.stdout.flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.stdout, name)
+
+
+@contextmanager
+def buffered_stdout() -> Iterator[RepoOutput]:
+    """Replaces `sys.stdout` with a `RepoOutput` for the duration of the context."""
+    output = RepoOutput(sys.stdout)
+    sys.stdout = output
+    try:
+        yield output
+    finally:
+        sys.stdout = output.stdout
+
+
+def run_buffered(
+    output: RepoOutput, report: Callable[[str, str], int], git_name: str, git_dir: str
+) -> tuple[int, str]:
+    """Runs `report` for a repository while buffering what it prints.
+
+    Args:
+        output: The `RepoOutput` installed as `sys.stdout`.
+        report: The function reporting on a repository given its directory and folder name.
+        git_name: The name of the folder containing the github repository.
+        git_dir: The directory where the local repo is.
+
+    Returns the exit code of `report` and what it printed.
+    """
+    output.local.buffer = io.StringIO()
+    try:
+        exit_code = report(git_dir, git_name)
+        return exit_code, output.local.buffer.getvalue()
+    finally:
+        output.local.buffer = None
+
+
+def run_memoized(
+    output: RepoOutput, report: Callable[[str, str], int], git_name: str, git_dir: str
+) -> tuple[int, str]:
+    """Like `run_buffered` but gets the exit code and output of the repository from
+    `report_memo` if it has them, with the `seconds` of its records set to the time that took.
+    """
+    start = time.monotonic()
+    ran = False
+
+    def run() -> tuple[int, str]:
+        nonlocal ran
+        ran = True
+        return run_buffered(output, report, git_name, git_dir)
+
+    exit_code, text = report_memo.run(git_dir, run)
+    if not ran:
+        text = retime_records(text, time.monotonic() - start)
+    return exit_code, text
+
+
+def run_limited(
+    report: Callable[[str, str], int],
+    git_dir: str,
+    git_name: str,
+    timeout: float | None,
+    deadline: float | None,
+    timings: list[tuple[str, float, bool]],
+    output_format: str = "text",
+) -> int:
+    """Runs `report` for a repository with the limits `communicate` enforces on its git
+    commands. A repository whose git command ran out of time (or that was not started before
+    the deadline) is reported as timed out.
+
+    Args:
+        report: The function reporting on a repository given its directory and folder name.
+        git_dir: The directory where the local repo is.
+        git_name: The name of the folder containing the github repository.
+        timeout: The number of seconds each git command of the repository may take.
+        deadline: The `time.monotonic()` by which the whole run has to be done.
+        timings: The list the directory, duration and whether the repository timed out are
+            appended to.
+        output_format: "text" or the format of the records (see `records.FORMATS`).
+
+    Returns the exit code of `report`, 1 if the repository timed out.
+    """
+    start = time.monotonic()
+    start_repo()
+    timed_out = False
+    try:
+        if deadline is not None and start >= deadline:
+            raise GitTimeout()
+        with limited(timeout, deadline):
+            return report(git_dir, git_name)
+    except GitTimeout:
+        timed_out = True
+        if output_format != "text":
+            emit_record(git_dir, git_name, status="timed_out")
+            return 1
+        home_path = os.path.expanduser("~")
+        print(
+            f"{git_dir.replace(home_path, '~')}: "
+            + warning(f"{git_name}")
+            + warning("->")
+            + warning(f" Timed Out after {time.monotonic() - start:.1f}s")
+        )
+        return 1
+    finally:
+        timings.append((git_dir, time.monotonic() - start, timed_out))
+
+
+def report_stragglers(timings: list[tuple[str, float, bool]]) -> None:
+    """Prints the repositories that timed out or took longer than `STRAGGLER_SECONDS`,
+    slowest first.
+
+    Args:
+        timings: The directory, duration and whether each repository timed out.
+    """
+    stragglers = sorted(
+        (timing for timing in timings if timing[2] or timing[1] >= STRAGGLER_SECONDS),
+        key=lambda timing: timing[1],
+        reverse=True,
+    )
+    if not stragglers:
+        return
+
+    home_path = os.path.expanduser("~")
+    print()
+    print(warning("Slowest repos:"))
+    for git_dir, duration, timed_out in stragglers[:MAX_STRAGGLERS]:
+        status = " (timed out)" if timed_out else ""
+        print(f"  - {git_dir.replace(home_path, '~')}: {duration:.1f}s{status}")
+    if len(stragglers) > MAX_STRAGGLERS:
+        print(f"  ... and {len(stragglers) - MAX_STRAGGLERS} more")
+
+
+def iter_streamed(
+    submit: Callable[[str, str], Future], gits: Iterable[tuple[str, str]], order: str
+) -> Iterator[Future]:
+    """Submits the repositories of a stream (e.g. `utils.iter_valid_git_dirs`) from another
+    thread as they are found, so the first ones are handled while the others are still being
+    found.
+
+    Args:
+        submit: The function submitting a repository given its folder name and directory.
+        gits: The pairs of the folder names and directories of the repositories.
+        order: "sorted" to yield the futures in the order of `gits` or "completion" to yield
+            them as soon as each repository is done.
+
+    Yields the futures of all the repositories.
+
+    Raises:
+        Exception: The error raised while iterating `gits` (e.g. by discovery), after the
+            futures of the repositories submitted before it.
+    """
+    futures = queue.SimpleQueue()
+
+    def feed() -> None:
+        submitted = 0
+        error = None
+        try:
+            for git_name, git_dir in gits:
+                future = submit(git_name, git_dir)
+                if order == "completion":
+                    future.add_done_callback(futures.put)
+                else:
+                    futures.put(future)
+                submitted += 1
+        except Exception as exc:
+            # re-raised by `iter_streamed` after the futures submitted before it
+            error = exc
+        finally:
+            # the number of futures to wait for
+            futures.put((submitted, error))
+
+    threading.Thread(target=feed, daemon=True).start()
+    total = None
+    error = None
+    done = 0
+    while total is None or done < total:
+        future = futures.get()
+        if isinstance(future, tuple):
+            total, error = future
+            continue
+        done += 1
+        yield future
+    if error is not None:
+        raise error
+
+
+def run_repos(
+    report: Callable[[str, str], int],
+    gits: Iterable[tuple[str, str]],
+    jobs: int = DEFAULT_JOBS,
+    order: str = "sorted",
+    timeout: float | None = None,
+    deadline: float | None = None,
+    output_format: str = "text",
+    timings: list[tuple[str, float, bool]] | None = None,
+) -> int:
+    """Runs `report` for every repository over a pool of `jobs` threads. The output of each
+    repository is buffered and printed in one piece, either in the order of `gits` or in the
+    order the repositories finish. The repositories that were slow are listed at the end of
+    the text output.
+
+    Args:
+        report: The function reporting on a repository given its directory and folder name.
+        gits: List of pairs of the folder names and directories of where the local repositories are,
+            or a stream of them that are handled as they come (see `iter_streamed`).
+        jobs: The maximum number of repositories handled at the same time.
+        order: "sorted" to print in the order of `gits` or "completion" to print as soon as
+            each repository is done.
+        timeout: The number of seconds each git command of a repository may take.
+        deadline: The `time.monotonic()` by which all the repositories have to be done (see
+            `get_deadline`).
+        output_format: "text" or the format of the records `report` emits (see
+            `records.FORMATS`).
+        timings: The list the directory, duration and whether each repository timed out
+            are appended to, e.g. to count the repositories cut off by the deadline.
+
+    Returns the exit codes of all the `report` calls or'ed together.
+    """
+    timings = [] if timings is None else timings
+
+    def limited_report(git_dir: str, git_name: str) -> int:
+        return run_limited(
+            report, git_dir, git_name, timeout, deadline, timings, output_format
+        )
+
+    exit_code = 0
+    streamed = not isinstance(gits, list)
+    if report_memo is None and (jobs <= 1 or (not streamed and len(gits) <= 1)):
+        for git_name, git_dir in gits:
+            exit_code |= limited_report(git_dir, git_name)
+        if output_format == "text":
+            report_stragglers(timings)
+        return exit_code
+
+    run = run_buffered if report_memo is None else run_memoized
+    with buffered_stdout() as output, ThreadPoolExecutor(max(1, jobs)) as executor:
+
+        def submit(git_name: str, git_dir: str) -> Future:
+            return executor.submit(run, output, limited_report, git_name, git_dir)
+
+        if streamed:
+            futures = iter_streamed(submit, gits, order)
+        else:
+            futures = [submit(git_name, git_dir) for git_name, git_dir in gits]
+            if order == "completion":
+                futures = as_completed(futures)
+        for future in futures:
+            repo_exit_code, text = future.result()
+            exit_code |= repo_exit_code
+            output.stdout.write(text)
+            output.stdout.flush()
+
+    if output_format == "text":
+        report_stragglers(timings)
+    return exit_code
+
+
+def map_repos(
+    func: Callable[[str], T],
+    gits: list[tuple[str, str]],
+    jobs: int = DEFAULT_JOBS,
+    timeout: float | None = None,
+    deadline: float | None = None,
+) -> list[T | GitTimeout]:
+    """Calls `func` with the directory of every repository over a pool of `jobs` threads.
+
+    Args:
+        func: The function called with the directory of a repository.
+        gits: List of pairs of the folder names and directories of where the local repositories are.
+        jobs: The maximum number of repositories handled at the same time.
+        timeout: The number of seconds each git command of a repository may take.
+        deadline: The `time.monotonic()` by which all the repositories have to be done.
+
+    Returns the results of `func` in the order of `gits`, or the `GitTimeout` raised for the
+    repositories that ran out of time.
+    """
+
+    def limited_func(git_dir: str) -> T | GitTimeout:
+        try:
+            with limited(timeout, deadline):
+                return func(git_dir)
+        except GitTimeout as error:
+            return error
+
+    if jobs <= 1 or len(gits) <= 1:
+        return [limited_func(git_dir) for _, git_dir in gits]
+
+    with ThreadPoolExecutor(jobs) as executor:
+        return list(executor.map(limited_func, [git_dir for _, git_dir in gits]))
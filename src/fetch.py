@@ -0,0 +1,126 @@
+import os.path
+import re
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from .pretty_print import failure, success, warning
+from .records import emit_record
+from .refs import read_remote_url
+from .utils import FetchStatus, call_fetch, get_cur_branch
+
+DEFAULT_PER_HOST = 4
+URL_HOST_RE = re.compile(r"^[a-z][a-z0-9+.-]*://(?:[^@/]*@)?(\[[^\]]*\]|[^:/]*)")
+SCP_HOST_RE = re.compile(r"^(?:[^@/]*@)?(\[[^\]]*\]|[^:/]+):")
+
+
+def get_remote_host(url: str | None) -> str:
+    """Gets the host of a remote url, e.g. `github.com` for both
+    `https://github.com/user/repo.git` and `git@github.com:user/repo.git`.
+
+    Args:
+        url: The url of the remote.
+
+    Returns the host, or "local" for local paths and `file://` urls.
+    """
+    if not url:
+        return "local"
+    if match := URL_HOST_RE.match(url):
+        return match.group(1).lower() or "local"
+    if match := SCP_HOST_RE.match(url):
+        return match.group(1).lower()
+    return "local"
+
+
+class HostLimiter:
+    """Limits how many fetches run against the same remote host at the same time."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, host: str) -> Iterator[None]:
+        with self.lock:
+            semaphore = self.semaphores.setdefault(
+                host, threading.BoundedSemaphore(self.per_host)
+            )
+        with semaphore:
+            yield
+
+
+def report_fetch(
+    git_dir: str,
+    git_name: str,
+    silent: bool,
+    verbose: bool,
+    timeout: float | None,
+    limiter: HostLimiter,
+    results: list[tuple[str, FetchStatus, int]],
+    output_format: str = "text",
+) -> int:
+    """Fetch the origin of a repository and report the result of fetching.
+
+    Args:
+        git_dir: The directory where the local repo is.
+        git_name: The name of the folder containing the github repository.
+        silent: Whether to remove details from output.
+        verbose: Whether to print for directories unaffected by the command.
+        timeout: The number of seconds after which the fetch is considered stalled and killed.
+        limiter: The limit of concurrent fetches per remote host.
+        results: The list the directory, status and number of updated refs are appended to.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
+
+    Returns exit codes 0 (if the fetch was successful) or 1 (otherwise).
+    """
+    cur_branch = get_cur_branch(git_dir)
+    if cur_branch is None:
+        return 0
+
+    url = read_remote_url(git_dir)
+    with limiter.limit(get_remote_host(url)):
+        fetch_status, num_updated = call_fetch(git_dir, timeout)
+    results.append((git_dir, fetch_status, num_updated))
+
+    if output_format != "text":
+        emit_record(
+            git_dir,
+            git_name,
+            branch=cur_branch,
+            status=fetch_status.name.lower() if url else "remote_not_found",
+            updated_refs=num_updated,
+        )
+        return int(fetch_status in (FetchStatus.STALLED, FetchStatus.FAILED))
+
+    home_path = os.path.expanduser("~")
+    print_text = f"{git_dir.replace(home_path, '~')}: "
+
+    if fetch_status == FetchStatus.UP_TO_DATE:
+        if not silent and verbose:
+            print(print_text + f"{success(git_name)}<{cur_branch}>")
+        return 0
+
+    if fetch_status == FetchStatus.UPDATED:
+        if not silent:
+            print(
+                print_text
+                + f"{success(git_name)}<{cur_branch}>{success('->')}"
+                + success(f" Updated:{num_updated}")
+            )
+        return 0
+
+    if fetch_status == FetchStatus.STALLED:
+        print(
+            print_text
+            + f"{warning(git_name)}<{cur_branch}>{warning('->')}"
+            + warning(f" Stalled after {timeout}s")
+        )
+    else:
+        print(
+            print_text
+            + f"{failure(git_name)}<{cur_branch}>{failure('->')}"
+            + failure(" Fetch Failed" if url else " Remote Not Found")
+        )
+    return 1
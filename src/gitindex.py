@@ -0,0 +1,239 @@
+import mmap
+import os
+import os.path
+import re
+import struct
+from typing import NamedTuple
+
+INDEX_SIGNATURE = b"DIRC"
+ENTRY_STAT = struct.Struct(">10I")
+SHA256_RE = re.compile(
+    r"^\s*objectformat\s*=\s*sha256\s*$", re.IGNORECASE | re.MULTILINE
+)
+
+FLAG_ASSUME_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE_MASK = 0x3000
+EXTENDED_FLAG_SKIP_WORKTREE = 0x4000
+EXTENDED_FLAG_INTENT_TO_ADD = 0x2000
+# extensions whose entries are not all in the index file itself
+UNSUPPORTED_EXTENSIONS = (b"link", b"sdir")
+
+
+class IndexEntry(NamedTuple):
+    """The cached stat data of a file in `.git/index`."""
+
+    path: str
+    ctime: tuple[int, int]
+    mtime: tuple[int, int]
+    ino: int
+    mode: int
+    uid: int
+    gid: int
+    size: int
+    flags: int
+    extended_flags: int
+
+
+def get_oid_size(common_dir: str) -> int:
+    """Gets the size in bytes of the object ids of a repository (32 for sha256, 20 otherwise).
+
+    Args:
+        common_dir: The common directory of the repository (see `refs.get_common_dir`).
+    """
+    try:
+        with open(os.path.join(common_dir, "config"), encoding="utf-8") as file:
+            return 32 if SHA256_RE.search(file.read()) else 20
+    except (OSError, UnicodeDecodeError):
+        return 20
+
+
+def read_varint(data: bytes, offset: int) -> tuple[int, int]:
+    """Reads an offset encoded varint used by index v4 for the path prefix lengths.
+
+    Returns the value and the offset after it.
+    """
+    byte = data[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+
+def parse_index(data: bytes, oid_size: int = 20) -> list[IndexEntry] | None:
+    """Parses the entries of a version 2, 3 or 4 `.git/index` file.
+
+    Args:
+        data: The content of the index file.
+        oid_size: The size in bytes of the object ids (see `get_oid_size`).
+
+    Returns the entries or None if the index is not supported (e.g. split or sparse indexes).
+    """
+    if len(data) < 12 or data[:4] != INDEX_SIGNATURE:
+        return None
+    version, num_entries = struct.unpack_from(">II", data, 4)
+    if version not in (2, 3, 4):
+        return None
+
+    entries = []
+    offset = 12
+    path = b""
+    for _ in range(num_entries):
+        start = offset
+        stat = ENTRY_STAT.unpack_from(data, offset)
+        offset += ENTRY_STAT.size + oid_size
+        (flags,) = struct.unpack_from(">H", data, offset)
+        offset += 2
+        extended_flags = 0
+        if flags & FLAG_EXTENDED:
+            (extended_flags,) = struct.unpack_from(">H", data, offset)
+            offset += 2
+
+        if version == 4:
+            strip, offset = read_varint(data, offset)
+            end = data.find(b"\0", offset)
+            path = path[: len(path) - strip] + data[offset:end]
+            offset = end + 1
+        else:
+            end = data.find(b"\0", offset)
+            path = data[offset:end]
+            # entries are padded with 1 to 8 NULs to a multiple of 8 bytes
+            offset = start + ((end - start + 8) & ~7)
+
+        entries.append(
+            IndexEntry(
+                path.decode("utf-8", "surrogateescape"),
+                (stat[0], stat[1]),
+                (stat[2], stat[3]),
+                stat[5],
+                stat[6],
+                stat[7],
+                stat[8],
+                stat[9],
+                flags,
+                extended_flags,
+            )
+        )
+
+    # the extensions come after the entries and before the trailing checksum
+    while offset + 8 <= len(data) - oid_size:
+        signature = data[offset : offset + 4]
+        if signature in UNSUPPORTED_EXTENSIONS:
+            return None
+        (size,) = struct.unpack_from(">I", data, offset + 4)
+        offset += 8 + size
+
+    return entries
+
+
+def read_index(git_dir: str, common_dir: str) -> list[IndexEntry] | None:
+    """Reads the entries of the index of a repository by memory mapping it.
+
+    Args:
+        git_dir: The git directory of the repository or worktree.
+        common_dir: The common directory of the repository (see `refs.get_common_dir`).
+
+    Returns the entries or None if the index can not be read or is not supported.
+    """
+    try:
+        with open(os.path.join(git_dir, "index"), "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parse_index(data, get_oid_size(common_dir))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def stat_matches(entry: IndexEntry, stat: os.stat_result) -> bool:
+    """Whether the cached stat data of an index entry matches the file in the working tree,
+    compared like git does by default (nanoseconds only if git recorded them).
+
+    Args:
+        entry: The index entry.
+        stat: The `os.lstat` of the file in the working tree.
+    """
+    mtime_s, mtime_ns = divmod(stat.st_mtime_ns, 1_000_000_000)
+    ctime_s, ctime_ns = divmod(stat.st_ctime_ns, 1_000_000_000)
+    file_type = entry.mode & 0o170000
+
+    return (
+        (stat.st_mode & 0o170000) == file_type
+        and (file_type != 0o100000 or (stat.st_mode & 0o100) == (entry.mode & 0o100))
+        and entry.mtime[0] == mtime_s
+        and entry.mtime[1] in (0, mtime_ns)
+        and entry.ctime[0] == ctime_s
+        and entry.ctime[1] in (0, ctime_ns)
+        and entry.ino == stat.st_ino & 0xFFFFFFFF
+        and entry.uid == stat.st_uid & 0xFFFFFFFF
+        and entry.gid == stat.st_gid & 0xFFFFFFFF
+        and entry.size == stat.st_size & 0xFFFFFFFF
+    )
+
+
+def get_changed_entries(
+    work_dir: str, git_dir: str, common_dir: str
+) -> dict[str, list[int] | None] | None:
+    """Gets the tracked files whose stat data in the working tree does not match the index,
+    i.e. the files `git status` possibly shows as modified or deleted.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        git_dir: The git directory of the repository or worktree.
+        common_dir: The common directory of the repository (see `refs.get_common_dir`).
+
+    Returns the paths of the files relative to `work_dir` mapped to their mtime (ns), size
+    and inode (None for deleted files), or None if the index can not tell which files changed,
+    e.g. an entry is racily clean (modified in the same time unit the index was written), is
+    unmerged, is a submodule or was added with `-N`.
+    """
+    try:
+        index_mtime = divmod(
+            os.stat(os.path.join(git_dir, "index")).st_mtime_ns, 1_000_000_000
+        )
+    except OSError:
+        return None
+
+    entries = read_index(git_dir, common_dir)
+    if entries is None:
+        return None
+
+    changed = {}
+    for entry in entries:
+        if entry.flags & FLAG_STAGE_MASK or entry.mode & 0o170000 == 0o160000:
+            return None
+        if entry.extended_flags & EXTENDED_FLAG_INTENT_TO_ADD:
+            return None
+        if (
+            entry.flags & FLAG_ASSUME_VALID
+            or entry.extended_flags & EXTENDED_FLAG_SKIP_WORKTREE
+        ):
+            continue
+        if entry.mtime >= (index_mtime if entry.mtime[1] else (index_mtime[0], 0)):
+            return None  # racily clean
+
+        try:
+            stat = os.lstat(os.path.join(work_dir, entry.path))
+        except FileNotFoundError:
+            changed[entry.path] = None
+            continue
+        except OSError:
+            return None
+        if not stat_matches(entry, stat):
+            changed[entry.path] = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+    return changed
+
+
+def is_index_clean(work_dir: str, git_dir: str, common_dir: str) -> bool:
+    """Whether none of the tracked files in the working tree changed compared to the index,
+    checked with the cached stat data in the index instead of `git status` (see
+    `get_changed_entries`). False means the repository is possibly dirty.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        git_dir: The git directory of the repository or worktree.
+        common_dir: The common directory of the repository (see `refs.get_common_dir`).
+    """
+    return get_changed_entries(work_dir, git_dir, common_dir) == {}
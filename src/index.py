@@ -0,0 +1,76 @@
+import json
+import os
+import os.path
+import tempfile
+
+INDEX_VERSION = 2
+
+
+def get_cache_dir() -> str:
+    """Gets the cache directory of localgit (`$XDG_CACHE_HOME/localgit`, `~/.cache/localgit`
+    by default)."""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_dir, "localgit")
+
+
+def get_index_path() -> str:
+    """Gets the path of the repository index in the cache directory."""
+    return os.path.join(get_cache_dir(), "index.json")
+
+
+def write_json(path: str, data) -> None:
+    """Atomically writes `data` as compact JSON to `path`. Failing to write is not an error
+    since everything localgit caches can be recomputed.
+
+    Args:
+        path: The file to write.
+        data: The JSON serializable data.
+    """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+
+
+def load_index() -> dict[str, list]:
+    """Loads the index of the directory trees of the search roots saved by a previous run.
+
+    Returns the index node (see `discovery.read_dir`) of every root that has a usable index.
+    """
+    try:
+        with open(get_index_path(), encoding="utf-8") as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if (
+        not isinstance(index, dict)
+        or index.get("version") != INDEX_VERSION
+        or not isinstance(index.get("roots"), dict)
+    ):
+        return {}
+    return index["roots"]
+
+
+def save_index(trees: dict[str, list | None]) -> None:
+    """Atomically saves the index of the directory trees of the search roots. Failing to save
+    the index is not an error, the next run will walk the whole trees again.
+
+    Args:
+        trees: The index node of every root, None for the roots that could not be read.
+    """
+    write_json(
+        get_index_path(),
+        {
+            "version": INDEX_VERSION,
+            "roots": {root: tree for root, tree in trees.items() if tree is not None},
+        },
+    )
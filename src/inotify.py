@@ -0,0 +1,111 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+from typing import NamedTuple
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_EXCL_UNLINK = 0x04000000
+IN_ISDIR = 0x40000000
+
+# everything that changes the contents of a directory or of the files in it, but not reads
+CHANGE_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+    | IN_EXCL_UNLINK
+)
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+
+
+class Event(NamedTuple):
+    """An inotify event of a watched directory."""
+
+    wd: int
+    mask: int
+    name: str  # of the entry of the directory, "" for the directory itself
+
+
+class Inotify:
+    """A non-blocking inotify instance, through the libc functions since the standard library
+    has no bindings for them."""
+
+    def __init__(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self.add_watch_func = libc.inotify_add_watch
+            self.rm_watch_func = libc.inotify_rm_watch
+            init = libc.inotify_init1
+        except (OSError, AttributeError) as error:
+            raise OSError("inotify is not available") from error
+
+        self.add_watch_func.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.rm_watch_func.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int = CHANGE_MASK) -> int:
+        """Watches a directory. Watching the same directory again returns the same
+        descriptor.
+
+        Returns the watch descriptor the events of the directory have.
+
+        Raises:
+            OSError: The directory can not be watched, e.g. `ENOSPC` when
+                `fs.inotify.max_user_watches` is reached.
+        """
+        wd = self.add_watch_func(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        """Stops watching a directory. A descriptor the kernel already removed (e.g. the
+        directory was deleted) is ignored."""
+        self.rm_watch_func(self.fd, wd)
+
+    def read(self) -> list[Event]:
+        """Reads the events that are queued, without waiting for more."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                return events
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                events.append(Event(wd, mask, os.fsdecode(name)))
+
+    def close(self) -> None:
+        os.close(self.fd)
@@ -1,6 +1,7 @@
 import os.path
 
 from .pretty_print import failure, success
+from .records import emit_record
 from .utils import get_cur_branch
 
 
@@ -8,6 +9,7 @@ def report_list(
     git_dir: str,
     git_name: str,
     excluded: bool,
+    output_format: str = "text",
 ):
     """List all the local repo clones found on the device.
 
@@ -15,12 +17,18 @@ def report_list(
         git_dir: The directory where the local repo is.
         git_name: The name of the folder containing the github repository.
         excluded: Whether the repo will be excluded by other commands given the configuration.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
     """
 
     cur_branch = get_cur_branch(git_dir)
     if cur_branch is None:
         return 0
 
+    if output_format != "text":
+        emit_record(git_dir, git_name, branch=cur_branch, excluded=excluded)
+        return 0
+
     branch_text = f"<{cur_branch}>" if cur_branch else ""
     home_path = os.path.expanduser("~")
 
@@ -1,21 +1,38 @@
 #!/usr/bin/env python3
 
+import itertools
 import os.path
+import sys
+from contextlib import redirect_stdout
 
+from .catfile import close_cat_files
+from .daemon import query_daemon, serve
+from .executor import get_deadline, map_repos, run_repos
+from .fetch import HostLimiter, report_fetch
 from .list import report_list
-from .log import report_log
+from .log import report_log, report_timeline
 from .parsers import setup_parser
 from .pretty_print import success, warning
+from .profiling import enable_profiling, report_profile
 from .pull import report_pull
-from .push import report_push
+from .records import collect_records
+from .push import plan_push, report_push, report_push_plan
 from .status import report_status
+from .statuscache import status_cache
+from .trace2 import make_run_dir, report_trace2
 from .utils import (
+    FetchStatus,
     find_dirs_from_repo_names,
-    get_excluded_git_dirs,
+    get_all_git_dirs,
     get_git_dirs,
     get_valid_git_dirs,
+    iter_valid_git_dirs,
+    partition_git_dirs,
 )
 
+# the commands that handle the repos as they are found with --order completion
+STREAMED_COMMANDS = ("status", "pull", "fetch", "log")
+
 
 def run_log(args, gits: list[tuple[str, str]]) -> int:
     """Runs the `localGits log` command with the input arguments.
@@ -26,14 +43,20 @@ def run_log(args, gits: list[tuple[str, str]]) -> int:
 
     Returns exit codes 0 (the command was ran successfully in all repos) or 1 (otherwise).
     """
-    exit_code = 0
-    for git_name, git_dir in gits:
-        exit_code |= report_log(
-            git_dir,
-            git_name,
-            args.num_logs,
+    if args.timeline:
+        return report_timeline(
+            gits, args.num_logs, args.since, args.until, args.jobs, args.format
         )
-    return exit_code
+
+    return run_repos(
+        lambda git_dir, git_name: report_log(
+            git_dir, git_name, args.num_logs, args.since, args.until, args.format
+        ),
+        gits,
+        args.jobs,
+        args.order,
+        output_format=args.format,
+    )
 
 
 def run_status(args, gits: list[tuple[str, str]]):
@@ -53,9 +76,9 @@ def run_status(args, gits: list[tuple[str, str]]):
     modified = all_tags_false or args.modified
     deleted = all_tags_false or args.deleted
 
-    exit_code = 0
-    for git_name, git_dir in gits:
-        exit_code |= report_status(
+    deadline = get_deadline(args.deadline)
+    exit_code = run_repos(
+        lambda git_dir, git_name: report_status(
             git_dir,
             git_name,
             args.silent,
@@ -64,9 +87,20 @@ def run_status(args, gits: list[tuple[str, str]]):
             modified,
             deleted,
             args.commit_diffs,
-        )
-
-    if exit_code == 0:
+            None if args.no_fetch else args.max_fetch_age,
+            args.format,
+            not args.no_cache,
+        ),
+        gits,
+        args.jobs,
+        args.order,
+        args.timeout,
+        deadline,
+        args.format,
+    )
+    status_cache.save()
+
+    if exit_code == 0 and args.format == "text":
         print(success("Repos are uptodate."))
 
     return exit_code
@@ -81,24 +115,32 @@ def run_pull(args, gits: list[tuple[str, str]]) -> int:
 
     Returns exit codes 0 (if the pull call was successful in all repos) or 1 (otherwise).
     """
-    exit_code = 0
-
-    for git_name, git_dir in gits:
-        exit_code |= report_pull(
+    deadline = get_deadline(args.deadline)
+    exit_code = run_repos(
+        lambda git_dir, git_name: report_pull(
             git_dir,
             git_name,
             args.silent,
             args.verbose,
-        )
-
-    if exit_code == 0:  # use an enum?
+            args.format,
+        ),
+        gits,
+        args.jobs,
+        args.order,
+        args.timeout,
+        deadline,
+        args.format,
+    )
+
+    if exit_code == 0 and args.format == "text":  # use an enum?
         print(success("Repos are uptodate."))
 
     return exit_code
 
 
 def run_push(args, gits: list[tuple[str, str]]) -> int:
-    """Runs the `localGits push` command with the input arguments.
+    """Runs the `localGits push` command with the input arguments. First finds what has to be
+    committed and pushed in all the repositories (see `plan_push`), then commits and pushes.
 
     Args:
         args: The parsed CL arguments for the push suparser and their values.
@@ -107,21 +149,112 @@ def run_push(args, gits: list[tuple[str, str]]) -> int:
     Returns exit codes 0 (if the push call was successful in all repos) or 1 (otherwise).
     """
 
-    exit_code = 0
-    for git_name, git_dir in gits:
-        exit_code |= report_push(
-            git_dir, git_name, args.silent, args.verbose, args.push_all, args.message
+    deadline = get_deadline(args.deadline)
+    plans = dict(
+        zip(gits, map_repos(plan_push, gits, args.jobs, args.timeout, deadline))
+    )
+
+    if args.dry_run:
+        return run_repos(
+            lambda git_dir, git_name: report_push_plan(
+                git_dir,
+                git_name,
+                args.verbose,
+                args.push_all,
+                plans[git_name, git_dir],
+                args.format,
+            ),
+            gits,
+            args.jobs,
+            args.order,
+            args.timeout,
+            deadline,
+            args.format,
         )
 
-    if exit_code == 0:
+    exit_code = run_repos(
+        lambda git_dir, git_name: report_push(
+            git_dir,
+            git_name,
+            args.silent,
+            args.verbose,
+            args.push_all,
+            args.message,
+            plans[git_name, git_dir],
+            args.format,
+        ),
+        gits,
+        args.jobs,
+        args.order,
+        args.timeout,
+        deadline,
+        args.format,
+    )
+
+    if exit_code == 0 and args.format == "text":
         print(success("Repos are uptodate."))
     return exit_code
 
 
-def run_list(gits: list[tuple[str, str]], excluded_gits: list[tuple[str, str]]) -> int:
+def run_fetch(args, gits: list[tuple[str, str]]) -> int:
+    """Runs the `localGits fetch` command with the input arguments.
+
+    Args:
+        args: The parsed CL arguments for the fetch suparser and their values.
+        gits: List of pairs of the folder names and directories of where the local repositories are.
+
+    Returns exit codes 0 (if the fetch was successful in all repos) or 1 (otherwise).
+    """
+    deadline = get_deadline(args.deadline)
+    limiter = HostLimiter(args.per_host)
+    results = []
+    timings = []
+    exit_code = run_repos(
+        lambda git_dir, git_name: report_fetch(
+            git_dir,
+            git_name,
+            args.silent,
+            args.verbose,
+            args.timeout,
+            limiter,
+            results,
+            args.format,
+        ),
+        gits,
+        args.jobs,
+        args.order,
+        args.timeout,
+        deadline,
+        args.format,
+        timings,
+    )
+    if args.format != "text":
+        return exit_code
+
+    # repos cut off by the timeout or deadline before their fetch was done
+    fetched = {git_dir for git_dir, _, _ in results}
+    num_timed_out = sum(
+        1 for git_dir, _, timed_out in timings if timed_out and git_dir not in fetched
+    )
+    num_updated = sum(updated for _, _, updated in results)
+    num_stalled = sum(1 for _, status, _ in results if status == FetchStatus.STALLED)
+    num_failed = sum(1 for _, status, _ in results if status == FetchStatus.FAILED)
+    summary = (
+        f"Fetched {len(results) + num_timed_out} repos: {num_updated} refs updated,"
+        f" {num_stalled} stalled, {num_timed_out} timed out, {num_failed} failed."
+    )
+    print(success(summary) if exit_code == 0 else warning(summary))
+
+    return exit_code
+
+
+def run_list(
+    args, gits: list[tuple[str, str]], excluded_gits: list[tuple[str, str]]
+) -> int:
     """Runs the `localGits list` command.
 
     Args:
+        args: The parsed CL arguments for the list suparser and their values.
         gits: List of pairs of the folder names and directories of where the local repositories
             that will not be ignored are.
         excluded_gits: List of pairs of the folder names and directories of where the local
@@ -130,21 +263,47 @@ def run_list(gits: list[tuple[str, str]], excluded_gits: list[tuple[str, str]])
     Returns exit codes 0 (if there are directories to be listed) or 1 (otherwise).
     """
     if len(gits) == 0 and len(excluded_gits) == 0:
-        print(warning("No local github repos found."))
+        if args.format == "text":
+            print(warning("No local github repos found."))
         return 1
 
-    for git_name, git_dir in gits:
-        report_list(git_dir, git_name, False)
+    run_repos(
+        lambda git_dir, git_name: report_list(git_dir, git_name, False, args.format),
+        gits,
+        args.jobs,
+        args.order,
+        output_format=args.format,
+    )
 
-    if len(excluded_gits) > 0:
+    if len(excluded_gits) > 0 and args.format == "text":
         print("\nExcluded: ")
 
-    for git_name, git_dir in excluded_gits:
-        report_list(git_dir, git_name, True)
+    run_repos(
+        lambda git_dir, git_name: report_list(git_dir, git_name, True, args.format),
+        excluded_gits,
+        args.jobs,
+        args.order,
+        output_format=args.format,
+    )
 
     return 0
 
 
+def run_daemon(args) -> int:
+    """Runs the `localgit daemon` command, which answers the `status`, `list` and `log`
+    commands of other localgit processes from memory (see `daemon.serve`).
+
+    Args:
+        args: The parsed CL arguments for the daemon suparser and their values.
+
+    Returns exit codes 0 (the daemon was stopped) or 1 (it could not start).
+    """
+    parser = setup_parser(
+        run_push, run_pull, run_status, run_log, run_fetch, run_daemon
+    )
+    return serve(parser, run_command, args.refresh)
+
+
 def main():
     """Executes the `localGits` command by finding all the local repos and call status, pull,
     push, or log in each of the repos. Also, setups the approriate argument parser for each of
@@ -155,34 +314,94 @@ def main():
 
     Returns exit code as determined by commands.
     """
-    parser = setup_parser(run_push, run_pull, run_status, run_log)
+    parser = setup_parser(
+        run_push, run_pull, run_status, run_log, run_fetch, run_daemon
+    )
     args = parser.parse_args()
+    if args.subcommand == "daemon":
+        return args.func(args)
+
+    # answered by `localgit daemon` if it is running
+    if (exit_code := query_daemon(args, sys.argv[1:])) is not None:
+        return exit_code
+
+    if args.profile is None and args.trace2 is None:
+        with collect_records(args.format):
+            return run_command(args)
+
+    trace2_run_dir = None if args.trace2 is None else make_run_dir(args.trace2)
+    enable_profiling(trace2_run_dir)
+    try:
+        with collect_records(args.format):
+            return run_command(args)
+    finally:
+        close_cat_files()  # so their git processes are in the profile too
+        # stdout only has the records when they are not text
+        with redirect_stdout(sys.stdout if args.format == "text" else sys.stderr):
+            if args.profile is not None:
+                report_profile(args.profile)
+            if trace2_run_dir is not None:
+                report_trace2(trace2_run_dir)
+
+
+def run_command(args) -> int:
+    """Finds the local repos to affect and runs the command in them.
 
+    Args:
+        args: The parsed CL arguments and their values.
+
+    Returns exit code as determined by commands.
+    """
     exclude = [] if args.exclude is None else args.exclude
 
     if env_exclude := os.environ.get("LOCALGIT_EXCLUDE_REPO"):
         exclude.extend(env_exclude.split(";"))
 
-    exclude_dirs = os.environ.get("LOCALGIT_EXCLUDE_DIR", "").split(";")
+    # an unset variable is no entries, not one empty entry
+    exclude_dirs = [
+        direc
+        for direc in os.environ.get("LOCALGIT_EXCLUDE_DIR", "").split(";")
+        if direc
+    ]
 
     if args.subcommand == "list":
         # hande the `list` command differently because the function parameters are not the same
-        valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs)
-        gits = get_git_dirs(valid_git_dirs)
-        gits.sort(key=lambda x: x[0])
-
         if args.all:
-            excluded_git_dirs = get_excluded_git_dirs(exclude, exclude_dirs)
+            valid_git_dirs, excluded_git_dirs = partition_git_dirs(
+                get_all_git_dirs(rescan=args.rescan), exclude, exclude_dirs
+            )
             excluded_gits = get_git_dirs(excluded_git_dirs)
             excluded_gits.sort(key=lambda x: x[1])
             # sort by directory string because there are a bunch of .local, .cache directories. Looks better for printing
         else:
+            valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs, args.rescan)
             excluded_gits = []
 
-        return run_list(gits, excluded_gits)
+        gits = get_git_dirs(valid_git_dirs)
+        gits.sort(key=lambda x: x[0])
+
+        return run_list(args, gits, excluded_gits)
+
+    if (
+        not args.repo_names
+        and not args.repo_directories
+        and args.order == "completion"
+        and args.subcommand in STREAMED_COMMANDS
+        and not getattr(args, "timeline", False)
+    ):
+        # start on the repos found first while the slower filesystems are still searched
+        gits = (
+            (os.path.basename(git_dir), git_dir)
+            for git_dir in iter_valid_git_dirs(exclude, exclude_dirs, args.rescan)
+        )
+        if (first := next(gits, None)) is None:
+            if args.format == "text":
+                print(warning("No local github repos found."))
+            return 1
+        return args.func(args, itertools.chain([first], gits))
 
     if not args.repo_names and not args.repo_directories:
-        valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs)
+        valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs, args.rescan)
         gits = get_git_dirs(valid_git_dirs)
     else:
         gits = []
@@ -192,12 +411,15 @@ def main():
             ]
             gits = get_git_dirs(git_dirs)
         if repo_names := args.repo_names:
-            valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs)
-            gits.extend(find_dirs_from_repo_names(repo_names, valid_git_dirs))
+            valid_git_dirs = get_valid_git_dirs(exclude, exclude_dirs, args.rescan)
+            # the warnings about unknown names are not records
+            with redirect_stdout(sys.stdout if args.format == "text" else sys.stderr):
+                gits.extend(find_dirs_from_repo_names(repo_names, valid_git_dirs))
             gits = list(set(gits))  # combine and make unique
 
     if len(gits) == 0:
-        print(warning("No local github repos found."))
+        if args.format == "text":
+            print(warning("No local github repos found."))
         return 1
 
     gits.sort(key=lambda x: x[0])
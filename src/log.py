@@ -1,16 +1,32 @@
+import heapq
+import itertools
 import os.path
+import time
 
-from .pretty_print import success
-from .utils import get_commit_logs, get_cur_branch
+from .executor import DEFAULT_JOBS, map_repos
+from .pretty_print import success, warning
+from .records import emit_record
+from .utils import get_commit_logs, get_cur_branch, get_timed_commit_logs
 
 
-def report_log(git_dir: str, git_name: str, num_logs: int) -> int:
+def report_log(
+    git_dir: str,
+    git_name: str,
+    num_logs: int,
+    since: str | None = None,
+    until: str | None = None,
+    output_format: str = "text",
+) -> int:
     """Reports the last `num_logs` outputs of the `git log --oneline` command for each repository.
 
     Args:
         git_dir: The repository containing the local clone of the repository.
         git_name: The name of the folder containing the github repository.
         num_logs: The last n logs of the `--oneline` log that will be shown. Maximum is 10.
+        since: Only show commits more recent than this date.
+        until: Only show commits older than this date.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
 
     Returns exit codes 0 or 1.
     """
@@ -18,7 +34,19 @@ def report_log(git_dir: str, git_name: str, num_logs: int) -> int:
     if cur_branch is None:
         return 0
 
-    logs = get_commit_logs(git_dir, num_logs)
+    logs = get_commit_logs(git_dir, num_logs, since, until)
+    if output_format != "text":
+        commits = [log.split(" ", 1) for log in logs if log]
+        emit_record(
+            git_dir,
+            git_name,
+            branch=cur_branch,
+            commits=[
+                {"hash": commit[0], "subject": commit[1] if len(commit) > 1 else ""}
+                for commit in commits
+            ],
+        )
+        return 0
 
     home_path = os.path.expanduser("~")
 
@@ -28,3 +56,61 @@ def report_log(git_dir: str, git_name: str, num_logs: int) -> int:
         if log:
             print("  -", log)
     return 0
+
+
+def report_timeline(
+    gits: list[tuple[str, str]],
+    num_logs: int,
+    since: str | None = None,
+    until: str | None = None,
+    jobs: int = DEFAULT_JOBS,
+    output_format: str = "text",
+) -> int:
+    """Reports the last `num_logs` commits of all the repositories together, newest first. The
+    logs of each repository are already sorted by `get_timed_commit_logs` so they are merged
+    with a heap, reading at most `num_logs` commits from each repository.
+
+    Args:
+        gits: List of pairs of the folder names and directories of where the local repositories are.
+        num_logs: The number of commits that will be shown.
+        since: Only show commits more recent than this date.
+        until: Only show commits older than this date.
+        jobs: The maximum number of repositories read at the same time.
+        output_format: "text" or the format of the records, one per commit (see
+            `records.FORMATS`).
+
+    Returns exit codes 0 (there are commits to show) or 1 (otherwise).
+    """
+    repo_logs = map_repos(
+        lambda git_dir: get_timed_commit_logs(git_dir, num_logs, since, until),
+        gits,
+        jobs,
+    )
+    timeline = heapq.merge(
+        *(
+            [(commit_time, git_name, git_dir, log) for commit_time, log in logs]
+            for (git_name, git_dir), logs in zip(gits, repo_logs)
+        ),
+        key=lambda commit: commit[0],
+        reverse=True,
+    )
+
+    exit_code = 1
+    for commit_time, git_name, git_dir, log in itertools.islice(timeline, num_logs):
+        exit_code = 0
+        if output_format != "text":
+            commit_hash, _, subject = log.partition(" ")
+            emit_record(
+                git_dir,
+                git_name,
+                time=commit_time,
+                hash=commit_hash,
+                subject=subject,
+            )
+            continue
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(commit_time))
+        print(f"{date} {success(git_name)}: {log}")
+
+    if exit_code and output_format == "text":
+        print(warning("No commits found."))
+    return exit_code
@@ -2,6 +2,19 @@ import argparse
 import os.path
 from typing import Any, Callable
 
+from .daemon import DEFAULT_REFRESH_SECONDS
+from .executor import DEFAULT_JOBS, ORDERS
+from .fetch import DEFAULT_PER_HOST
+from .profiling import DEFAULT_PROFILE_PATH
+from .records import FORMATS
+from .trace2 import DEFAULT_TRACE2_DIR
+
+DEFAULT_MAX_FETCH_AGE = 300
+# the formula rather than the value of `DEFAULT_JOBS` on the machine building the help
+JOBS_HELP = (
+    "The number of repos to handle at the same time. Default is 4 per CPU, at most 32."
+)
+
 
 class readable_dir(argparse.Action):
     """From stackoverflow and modified
@@ -31,6 +44,35 @@ class readable_dir(argparse.Action):
         setattr(namespace, self.dest, git_dirs)
 
 
+def add_output_args(subparser):
+    """Adds the --format, --profile and --trace2 arguments that every command has to its
+    parser.
+
+    Args:
+        subparser: The subparser of any of the commands.
+    """
+    subparser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="text",
+        help="Print coloured text, a JSON array of one record per repo at the end, or one JSON record per line as soon as each repo is done.",
+    )
+    subparser.add_argument(
+        "--profile",
+        nargs="?",
+        const=DEFAULT_PROFILE_PATH,
+        metavar="TRACE_FILE",
+        help=f"Time every git command, write them as a Chrome/Perfetto trace (to {DEFAULT_PROFILE_PATH} by default) and print the slowest repos and git commands.",
+    )
+    subparser.add_argument(
+        "--trace2",
+        nargs="?",
+        const=DEFAULT_TRACE2_DIR,
+        metavar="TRACE2_DIR",
+        help=f"Collect the trace2 events of every git command in a directory per repo (in {DEFAULT_TRACE2_DIR} by default) and print the regions git spent the most time in.",
+    )
+
+
 def add_common_args(subparser):
     """Adds all the common arguments that status, pull, and push have to their respective
     parsers.
@@ -70,13 +112,43 @@ def add_common_args(subparser):
         action="store_true",
         help="Print summary for all repos (including those unaffected by command).",
     )
+    subparser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Ignore the index of local repos and search the whole home directory again.",
+    )
+    subparser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=JOBS_HELP,
+    )
+    subparser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default="sorted",
+        help="Print the output of the repos sorted by name or as soon as each one is done.",
+    )
+    subparser.add_argument(
+        "--timeout",
+        type=float,
+        help="The number of seconds after which a git command of a repo is killed and the repo reported as timed out. No limit by default.",
+    )
+    subparser.add_argument(
+        "--deadline",
+        type=float,
+        help="The number of seconds after which all the repos that are not done are reported as timed out. No limit by default.",
+    )
+    add_output_args(subparser)
 
 
 def setup_status_subparser(
     subparsers: argparse._SubParsersAction, run_status: Callable[[Any], int]
 ):
     """Setups up the `localgit status` subparser with the common arguments and status specific arguments
-    including --modified, --untracked, --deleted, --commit-diffs."""
+    including --modified, --untracked, --deleted, --commit-diffs, --no-fetch, --max-fetch-age.
+    """
     status_parser = subparsers.add_parser(
         "status", help="Show the status of local repos."
     )
@@ -87,6 +159,22 @@ def setup_status_subparser(
         action="store_true",
         help="Whether to check how many commits a local repo is ahead and behind the origin.",
     )
+    status_parser.add_argument(
+        "--no-fetch",
+        action="store_true",
+        help="Do not fetch the origin for --commit-diffs, use the last fetched state.",
+    )
+    status_parser.add_argument(
+        "--max-fetch-age",
+        type=float,
+        default=DEFAULT_MAX_FETCH_AGE,
+        help=f"Only fetch the origin for --commit-diffs if the last fetch is older than this many seconds. Default is {DEFAULT_MAX_FETCH_AGE}.",
+    )
+    status_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Run git status in every repo instead of reusing the status of the repos that did not change since the last run.",
+    )
     file_type = status_parser.add_mutually_exclusive_group()
     file_type.add_argument(
         "--modified",
@@ -109,7 +197,7 @@ def setup_push_subparser(
     subparsers: argparse._SubParsersAction, run_push: Callable[[Any], int]
 ):
     """Setups up the `localgit push` subparser with the common arguments and status specific arguments
-    including --push-all, --message."""
+    including --push-all, --message, --dry-run."""
     push_parser = subparsers.add_parser(
         "push", help="Push all the commited changes in the local repos."
     )
@@ -127,6 +215,12 @@ def setup_push_subparser(
         type=str,
         help="The commit message. (Default is 'modified <comma separated list of modified files>. added <comma separated list of untracked files>)",
     )
+    push_parser.add_argument(
+        "--dry-run",
+        "-n",
+        action="store_true",
+        help="Only show what would be committed and pushed in each repo.",
+    )
 
 
 def setup_pull_subparser(
@@ -140,11 +234,31 @@ def setup_pull_subparser(
     add_common_args(pull_parser)
 
 
+def setup_fetch_subparser(
+    subparsers: argparse._SubParsersAction, run_fetch: Callable[[Any], int]
+):
+    """Setups up the `localgit fetch` subparser with the common arguments and fetch specific
+    arguments including --per-host. --timeout defaults to 60 seconds."""
+    fetch_parser = subparsers.add_parser(
+        "fetch", help="Fetch from origin for all local repos at the same time."
+    )
+    fetch_parser.set_defaults(func=run_fetch)
+    add_common_args(fetch_parser)
+    fetch_parser.add_argument(
+        "--per-host",
+        type=int,
+        default=DEFAULT_PER_HOST,
+        help=f"The number of repos fetched from the same host at the same time. Default is {DEFAULT_PER_HOST}.",
+    )
+    # a fetch that runs out of time is reported as stalled
+    fetch_parser.set_defaults(timeout=60)
+
+
 def setup_log_subparser(
     subparsers: argparse._SubParsersAction, run_log: Callable[[Any], int]
 ):
     """Setups up the `localgit log` subparser with common arguments excluding --silent and --verbose and add new
-    --num-logs argument."""
+    --num-logs, --timeline, --since, --until arguments."""
 
     log_parser = subparsers.add_parser(
         "log", help="Get the last n oneline commit logs of local repositories."
@@ -176,6 +290,40 @@ def setup_log_subparser(
         default=3,
         help="The number of logs to show for each local repo. Default if 3.",
     )
+    log_parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help="Show the logs of all the local repos together, newest first. --num-logs is the total number of logs.",
+    )
+    log_parser.add_argument(
+        "--since",
+        type=str,
+        help="Only show commits more recent than this date (eg 'midnight', '2 days ago').",
+    )
+    log_parser.add_argument(
+        "--until",
+        type=str,
+        help="Only show commits older than this date.",
+    )
+    log_parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Ignore the index of local repos and search the whole home directory again.",
+    )
+    log_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=JOBS_HELP,
+    )
+    log_parser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default="sorted",
+        help="Print the output of the repos sorted by name or as soon as each one is done.",
+    )
+    add_output_args(log_parser)
     log_parser.set_defaults(func=run_log)
 
 
@@ -197,6 +345,42 @@ def setup_list_subparser(subparsers: argparse._SubParsersAction):
         action="store_true",
         help="List all the local git repo folders including those that would be excluded.",
     )
+    list_parser.add_argument(
+        "--rescan",
+        action="store_true",
+        help="Ignore the index of local repos and search the whole home directory again.",
+    )
+    list_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=DEFAULT_JOBS,
+        help=JOBS_HELP,
+    )
+    list_parser.add_argument(
+        "--order",
+        choices=ORDERS,
+        default="sorted",
+        help="Print the output of the repos sorted by name or as soon as each one is done.",
+    )
+    add_output_args(list_parser)
+
+
+def setup_daemon_subparser(
+    subparsers: argparse._SubParsersAction, run_daemon: Callable[[Any], int]
+):
+    """Setups up the `localgit daemon` subparser with the --refresh argument."""
+    daemon_parser = subparsers.add_parser(
+        "daemon",
+        help="Watch the local repos and answer status, list and log from memory.",
+    )
+    daemon_parser.set_defaults(func=run_daemon)
+    daemon_parser.add_argument(
+        "--refresh",
+        type=float,
+        default=DEFAULT_REFRESH_SECONDS,
+        help=f"How often to search the home directory for new repos, in seconds. Default is {DEFAULT_REFRESH_SECONDS}.",
+    )
 
 
 def setup_parser(
@@ -204,15 +388,17 @@ def setup_parser(
     run_pull,
     run_status,
     run_log,
+    run_fetch,
+    run_daemon,
 ) -> argparse.ArgumentParser:
     """Setups up the argumental parser for `localgit` with subparsers for each of the its
-    commangs (status, log, pull, push, list)."""
+    commangs (status, log, pull, push, fetch, list, daemon)."""
 
     parser = argparse.ArgumentParser(
         prog="localgit",
         description="localgit helps manage all the local git repos.",
         epilog=(
-            "Use the status, pull, push, log, list commands to easily get an"
+            "Use the status, pull, push, fetch, log, list commands to easily get an"
             " overview of the local repo and update them accordingly."
         ),
     )
@@ -223,7 +409,9 @@ def setup_parser(
     setup_status_subparser(subparsers, run_status)
     setup_pull_subparser(subparsers, run_pull)
     setup_push_subparser(subparsers, run_push)
+    setup_fetch_subparser(subparsers, run_fetch)
     setup_log_subparser(subparsers, run_log)
     setup_list_subparser(subparsers)
+    setup_daemon_subparser(subparsers, run_daemon)
 
     return parser
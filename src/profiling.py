@@ -0,0 +1,183 @@
+import json
+import os
+import os.path
+import subprocess
+import threading
+import time
+from typing import NamedTuple
+
+from .pretty_print import warning
+from .trace2 import get_trace2_target
+
+DEFAULT_PROFILE_PATH = "localgit-profile.json"
+MAX_PROFILE_ROWS = 10
+
+
+class GitCall(NamedTuple):
+    """A git command run while profiling."""
+
+    command: list[str]
+    repo: str
+    start: float  # seconds since profiling started
+    duration: float
+    exit_code: int
+    # of stdout and stderr, 0 if they were not read with `communicate`
+    output_bytes: int
+    thread: int
+
+
+calls: list[GitCall] = []
+calls_lock = threading.Lock()
+profile_start = time.perf_counter()
+trace2_run_dir: str | None = None
+
+
+class ProfiledPopen(subprocess.Popen):
+    """`subprocess.Popen` that records a `GitCall` once the command is waited for, and points
+    the `GIT_TRACE2_EVENT` of the command to its repository when git's own traces are
+    collected. `enable_profiling` installs it as `subprocess.Popen` so it is used by every git
+    command localgit runs, including those run through `subprocess.call` and `check_output`.
+    """
+
+    def __init__(self, args, *popen_args, **kwargs):
+        self.profile_start = time.perf_counter()
+        self.profile_repo = os.fspath(kwargs.get("cwd") or os.getcwd())
+        self.profile_thread = threading.get_native_id()
+        self.communicating = False
+        self.recorded = False
+        if trace2_run_dir is not None:
+            kwargs["env"] = {
+                **(kwargs.get("env") or os.environ),
+                "GIT_TRACE2_EVENT": get_trace2_target(
+                    trace2_run_dir, self.profile_repo
+                ),
+            }
+        super().__init__(args, *popen_args, **kwargs)
+
+    def communicate(self, input=None, timeout=None):
+        self.communicating = True
+        try:
+            output, error = super().communicate(input, timeout)
+        finally:
+            self.communicating = False
+        self.record(len(output or b"") + len(error or b""))
+        return output, error
+
+    def wait(self, timeout=None):
+        exit_code = super().wait(timeout)
+        if not self.communicating:
+            self.record(0)
+        return exit_code
+
+    def record(self, output_bytes: int) -> None:
+        if self.recorded:
+            return
+        self.recorded = True
+        command = [self.args] if isinstance(self.args, str) else list(self.args)
+        call = GitCall(
+            [os.fspath(arg) for arg in command],
+            self.profile_repo,
+            self.profile_start - profile_start,
+            time.perf_counter() - self.profile_start,
+            self.returncode,
+            output_bytes,
+            self.profile_thread,
+        )
+        with calls_lock:
+            calls.append(call)
+
+
+def enable_profiling(trace2_dir: str | None = None) -> None:
+    """Records every git command started from now on (see `ProfiledPopen`).
+
+    Args:
+        trace2_dir: The directory the git commands write their trace2 events to, one
+            directory per repository (see `trace2.get_trace2_target`). None to not trace them.
+    """
+    global profile_start, trace2_run_dir
+    profile_start = time.perf_counter()
+    trace2_run_dir = trace2_dir
+    subprocess.Popen = ProfiledPopen
+
+
+def get_operation(command: list[str]) -> str:
+    """Gets the git subcommand of a command, e.g. `git status` for
+    `git -c core.quotepath=off status --porcelain=v2`."""
+    args = iter(command[1:])
+    for arg in args:
+        if arg in ("-c", "-C"):
+            next(args, None)
+        elif not arg.startswith("-"):
+            return f"{command[0]} {arg}"
+    return command[0]
+
+
+def write_trace(path: str, git_calls: list[GitCall]) -> None:
+    """Writes the git commands as complete events of the Chrome trace event format, which
+    `chrome://tracing` and https://ui.perfetto.dev open. Every thread of the pool is a track.
+
+    Args:
+        path: The JSON file to write.
+        git_calls: The git commands run while profiling.
+    """
+    pid = os.getpid()
+    events = [
+        {
+            "name": get_operation(call.command),
+            "cat": "git",
+            "ph": "X",
+            "ts": round(call.start * 1e6, 3),
+            "dur": round(call.duration * 1e6, 3),
+            "pid": pid,
+            "tid": call.thread,
+            "args": {
+                "command": " ".join(call.command),
+                "repo": call.repo,
+                "exit_code": call.exit_code,
+                "output_bytes": call.output_bytes,
+            },
+        }
+        for call in git_calls
+    ]
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def report_profile(path: str) -> None:
+    """Writes the trace of the git commands run while profiling (see `write_trace`) and prints
+    the repos that spent the most time in git and the slowest git commands.
+
+    Args:
+        path: The JSON file to write the trace to.
+    """
+    with calls_lock:
+        git_calls = sorted(calls, key=lambda call: call.start)
+    write_trace(path, git_calls)
+    print()
+    print(f"{len(git_calls)} git calls traced to {path}.")
+    if not git_calls:
+        return
+
+    repos = {}
+    for call in git_calls:
+        duration, num_calls = repos.get(call.repo, (0, 0))
+        repos[call.repo] = (duration + call.duration, num_calls + 1)
+
+    home_path = os.path.expanduser("~")
+    print(warning("Repos with the most time in git:"))
+    for repo, (duration, num_calls) in sorted(
+        repos.items(), key=lambda item: item[1][0], reverse=True
+    )[:MAX_PROFILE_ROWS]:
+        print(
+            f"  - {repo.replace(home_path, '~')}: {duration:.3f}s in {num_calls} git calls"
+        )
+
+    print(warning("Slowest git calls:"))
+    for call in sorted(git_calls, key=lambda call: call.duration, reverse=True)[
+        :MAX_PROFILE_ROWS
+    ]:
+        print(
+            f"  - {call.duration:.3f}s {get_operation(call.command)}"
+            f" in {call.repo.replace(home_path, '~')}"
+            f" (exit code {call.exit_code}, {call.output_bytes} bytes)"
+        )
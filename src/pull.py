@@ -1,24 +1,75 @@
 import os.path
 
 from .pretty_print import failure, success, warning
+from .records import emit_record
 from .utils import (
+    PullStatus,
     call_pull,
+    get_commit_diffs,
     get_cur_branch,
-    get_unpushed_files,
     handle_pull_output,
-    num_commits_behind,
 )
 
 
-def report_pull(git_dir: str, git_name: str, silent: bool, verbose: bool) -> int:
+def emit_pull_record(
+    git_dir: str, git_name: str, cur_branch: str, num_ahead: int, num_behind: int
+) -> int:
+    """Pulls like `report_pull` but emits the result as a record instead of printing it.
+
+    Returns exit code 0 (pull is successful) or 1 (otherwise).
+    """
+    if num_behind in (0, -1):
+        emit_record(
+            git_dir,
+            git_name,
+            branch=cur_branch,
+            status="up_to_date" if num_behind == 0 else "remote_branch_not_found",
+            ahead=num_ahead if num_behind == 0 else None,
+            behind=num_behind if num_behind == 0 else None,
+        )
+        return int(num_behind == -1)
+
+    result = call_pull(git_dir, cur_branch, num_ahead == 0)
+    emit_record(
+        git_dir,
+        git_name,
+        branch=cur_branch,
+        status=result.status.name.lower(),
+        ahead=num_ahead,
+        behind=num_behind,
+        changes=[
+            {
+                "path": path,
+                "added": None if added == "-" else int(added),
+                "deleted": None if deleted == "-" else int(deleted),
+            }
+            for added, deleted, path in result.changes
+        ],
+        merged=result.merged,
+        conflicts=result.conflicts,
+        error=result.error or None,
+    )
+    return int(result.status != PullStatus.MERGED)
+
+
+def report_pull(
+    git_dir: str,
+    git_name: str,
+    silent: bool,
+    verbose: bool,
+    output_format: str = "text",
+) -> int:
     """Pull changes in the origin for all repositories that are behind their origin and
-    report the result of pulling.
+    report the result of pulling. The origin is fetched once and the fetched branch merged
+    or rebased locally as `git pull` would (see `call_pull`).
 
     Args:
         git_dir: The directory where the local repo is.
         git_name: The name of the folder containing the github repository.
         silent: Whether to remove details from output.
         verbose: Whether to print for directories unaffected by the command.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
 
     Returns exit code 0 (pull is successful) or 1 (otherwise).
     """
@@ -27,10 +78,11 @@ def report_pull(git_dir: str, git_name: str, silent: bool, verbose: bool) -> int
     if cur_branch is None:
         return 0
 
-    num_behind = num_commits_behind(git_dir, cur_branch)
-    home_path = os.path.expanduser("~")
+    num_ahead, num_behind = get_commit_diffs(git_dir, cur_branch)
+    if output_format != "text":
+        return emit_pull_record(git_dir, git_name, cur_branch, num_ahead, num_behind)
 
-    files = get_unpushed_files(git_dir)
+    home_path = os.path.expanduser("~")
 
     fail_file_display_text = failure(f"{git_name}") + f"<{cur_branch}>{failure('->')} "
     pass_file_display_text = success(f"{git_name}") + f"<{cur_branch}>{success('->')} "
@@ -56,8 +108,8 @@ def report_pull(git_dir: str, git_name: str, silent: bool, verbose: bool) -> int
         print(fail_print_text)
         return 1
 
-    output, error = call_pull(git_dir, cur_branch)
-    successful, files, merged, failed_merge, summary = handle_pull_output(output, error)
+    result = call_pull(git_dir, cur_branch, num_ahead == 0)
+    successful, files, merged, failed_merge, summary = handle_pull_output(result)
 
     text = merge_conflict_print_text if len(failed_merge) > 0 else pass_print_text
 
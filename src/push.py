@@ -1,6 +1,10 @@
 import os.path
+from typing import NamedTuple
 
-from .pretty_print import failure, success
+from .executor import GitTimeout
+from .pretty_print import failure, success, warning
+from .records import emit_record
+from .refs import read_branch_remote, read_ref_oid, read_remote_url
 from .utils import (
     PushStatus,
     call_add_all,
@@ -12,6 +16,205 @@ from .utils import (
 )
 
 
+class PushPlan(NamedTuple):
+    """What `report_push` has to do in a repository, found by `plan_push`."""
+
+    branch: str
+    files: list[str]
+    num_ahead: int  # -1 when origin/<branch> does not exist
+    has_upstream: bool
+    # whether the branch has commits and there is an origin to push them to
+    has_commits: bool
+
+    @property
+    def needs_push(self) -> bool:
+        """Whether the branch has to be pushed even if nothing is committed: it is ahead of
+        origin/<branch> or it has commits but no upstream yet (e.g. a new branch, which is
+        pushed with `git push -u origin <branch>`)."""
+        return self.num_ahead > 0 or (not self.has_upstream and self.has_commits)
+
+
+def plan_push(git_dir: str) -> PushPlan | None:
+    """Finds the modified or untracked files, the number of commits ahead of the origin (after
+    fetching it), whether an upstream is configured for the current branch of a repository and
+    whether it has commits that could be pushed to the origin. Called for all the repositories
+    before anything is committed or pushed.
+
+    Args:
+        git_dir: The directory where the local repo is.
+
+    Returns the plan or None if the current branch could not be found or HEAD is detached.
+    """
+    cur_branch = get_cur_branch(git_dir)
+    if not cur_branch:
+        return None
+
+    return PushPlan(
+        cur_branch,
+        get_unpushed_files(git_dir),
+        num_commits_ahead(git_dir, cur_branch),
+        read_branch_remote(git_dir, cur_branch) is not None,
+        read_ref_oid(git_dir, f"refs/heads/{cur_branch}") is not None
+        and read_remote_url(git_dir) is not None,
+    )
+
+
+def get_commit_files(files: list[str], push_all: bool) -> list[str]:
+    """Gets the files `report_push` commits: all of them with `push_all`, otherwise only the
+    modified and deleted ones."""
+    if push_all:
+        return files
+    return [file for file in files if file.startswith(("M", "D"))]
+
+
+def get_commit_message(files: list[str], push_all: bool, message: str) -> str:
+    """Gets the message of the commit of `files`: `message` if there is one, otherwise a list
+    of the updated, added (with `push_all`) and deleted files."""
+    if message:
+        return message
+
+    modified_message = (
+        " Updated "
+        + ", ".join(file[2:] for file in files if file.startswith("M"))
+        + ". "
+        if any(file.startswith("M") for file in files)
+        else ""
+    )
+    added_message = (
+        " Added " + ", ".join(file[3:] for file in files if file.startswith("?")) + ". "
+        if push_all and any(file.startswith("?") for file in files)
+        else ""
+    )
+    deleted_message = (
+        " Deleted "
+        + ", ".join(file[2:] for file in files if file.startswith("D"))
+        + ". "
+        if any(file.startswith("D") for file in files)
+        else ""
+    )
+    return modified_message + added_message + deleted_message
+
+
+def commit_changes(
+    git_dir: str, files: list[str], push_all: bool, message: str
+) -> str | None:
+    """Commits the modified and deleted files, and the untracked files too with `push_all`.
+
+    Returns the summary line of the commit or None if the commit failed.
+    """
+    commit_message = get_commit_message(files, push_all, message)
+    if push_all:
+        call_add_all(git_dir)
+        return call_commit(git_dir, commit_message)
+    return call_commit(git_dir, commit_message, True)
+
+
+def report_push_plan(
+    git_dir: str,
+    git_name: str,
+    verbose: bool,
+    push_all: bool,
+    plan: PushPlan | GitTimeout | None,
+    output_format: str = "text",
+) -> int:
+    """Report what `report_push` would do in a repository without committing or pushing.
+
+    Args:
+        git_dir: The directory where the local repo is.
+        git_name: The name of the folder containing the github repository.
+        verbose: Whether to print for directories unaffected by the command.
+        push_all: Whether to commit and push both modified and untracked files.
+        plan: The plan of the repository from `plan_push` or the `GitTimeout` raised while
+            planning.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
+
+    Returns exit code 0.
+    """
+    if isinstance(plan, GitTimeout):
+        raise plan
+    if plan is None:
+        return 0
+
+    commit_files = get_commit_files(plan.files, push_all)
+    if output_format != "text":
+        emit_record(
+            git_dir,
+            git_name,
+            branch=plan.branch,
+            status="planned" if commit_files or plan.needs_push else "up_to_date",
+            files=commit_files,
+            ahead=plan.num_ahead if plan.num_ahead >= 0 else None,
+            set_upstream=not plan.has_upstream,
+        )
+        return 0
+
+    home_path = os.path.expanduser("~")
+    print_text = f"{git_dir.replace(home_path, '~')}: "
+
+    if not commit_files and not plan.needs_push:
+        if verbose:
+            print(print_text + success(f"{git_name}") + f"<{plan.branch}>")
+        return 0
+
+    actions = []
+    if commit_files:
+        actions.append(f"Commit {len(commit_files)} files")
+    if plan.num_ahead > 0:
+        plural = "s" if plan.num_ahead != 1 else ""
+        actions.append(f"Push {plan.num_ahead} commit{plural}")
+    elif commit_files:
+        actions.append("Push 1 commit")
+    elif plan.needs_push:
+        actions.append("Push the branch")
+    if not plan.has_upstream:
+        actions.append(f"Set upstream origin/{plan.branch}")
+
+    print(
+        print_text
+        + warning(f"{git_name}")
+        + f"<{plan.branch}>{warning('->')} "
+        + ", ".join(actions)
+    )
+    for file in commit_files:
+        print("  -", file)
+    return 0
+
+
+def emit_push_record(
+    git_dir: str, git_name: str, push_all: bool, message: str, plan: PushPlan
+) -> int:
+    """Commits and pushes like `report_push` but emits the result as a record instead of
+    printing it.
+
+    Returns exit codes 0 (if the push call was successful) or 1 (otherwise).
+    """
+    files = get_commit_files(plan.files, push_all)
+    fields = {
+        "branch": plan.branch,
+        "files": files,
+        "ahead": plan.num_ahead if plan.num_ahead >= 0 else None,
+    }
+    # like `report_push`, only untracked files without `push_all` are not pushed
+    if not files and (plan.files or not plan.needs_push):
+        emit_record(git_dir, git_name, status="up_to_date", **fields)
+        return 0
+
+    if files and commit_changes(git_dir, plan.files, push_all, message) is None:
+        emit_record(git_dir, git_name, status="commit_failed", **fields)
+        return 1
+
+    push_status = call_push(git_dir, plan.branch, not plan.has_upstream)
+    emit_record(
+        git_dir,
+        git_name,
+        status=push_status.name.lower(),
+        set_upstream=not plan.has_upstream,
+        **fields,
+    )
+    return int(push_status != PushStatus.SUCCESSFUL)
+
+
 def report_push(
     git_dir: str,
     git_name: str,
@@ -19,6 +222,8 @@ def report_push(
     verbose: bool,
     push_all: bool,
     message: str,
+    plan: PushPlan | GitTimeout | None,
+    output_format: str = "text",
 ) -> int:
     """Push all the repositories that are ahead of their origin and report the result of pushing.
 
@@ -29,18 +234,25 @@ def report_push(
         verbose: Whether to print for directories unaffected by the command.
         push_all: Whether to commit and push both modified and untracked files.
         message: The commit message. Default is "new updates"
+        plan: The plan of the repository from `plan_push` or the `GitTimeout` raised while
+            planning.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
 
     Returns exit codes 0 (if the push call was successful) or 1 (otherwise).
     """
-    cur_branch = get_cur_branch(git_dir)
-    if cur_branch is None:
+    if isinstance(plan, GitTimeout):
+        raise plan
+    if plan is None:
         return 0
+    if output_format != "text":
+        return emit_push_record(git_dir, git_name, push_all, message, plan)
 
-    files = get_unpushed_files(git_dir)
-    num_ahead = num_commits_ahead(git_dir, cur_branch)
+    cur_branch = plan.branch
+    files = plan.files
     home_path = os.path.expanduser("~")
 
-    if len(files) == 0 and num_ahead == 0:
+    if len(files) == 0 and not plan.needs_push:
         if not silent and verbose:
             print(
                 f"{git_dir.replace(home_path, '~')}: "
@@ -54,51 +266,17 @@ def report_push(
             success(f"{git_name}") + f"<{cur_branch}>{success('-> ')}"
         )
 
-        has_modified = any(file.startswith("M") for file in files)
-        has_untracked = any(file.startswith("?") for file in files)
-        has_deleted = any(file.startswith("D") for file in files)
-
-        modified_message = (
-            " Updated "
-            + ", ".join(file[2:] for file in files if file.startswith("M"))
-            + ". "
-            if has_modified and not message
-            else ""
-        )
-        added_message = (
-            " Added "
-            + ", ".join(file[3:] for file in files if file.startswith("?"))
-            + ". "
-            if has_untracked and not message
-            else ""
-        )
-        deleted_message = (
-            " Deleted "
-            + ", ".join(file[2:] for file in files if file.startswith("D"))
-            + ". "
-            if has_deleted and not message
-            else ""
-        )
-
-        if push_all:
-            call_add_all(git_dir)
-            commit_output = call_commit(
-                git_dir, message or (modified_message + added_message + deleted_message)
-            )
-        elif has_modified or has_deleted:
-            commit_output = call_commit(
-                git_dir, message or (modified_message + deleted_message), True
-            )
-        elif not silent and verbose:
-            print(
-                f"{git_dir.replace(home_path, '~')}: "
-                + success(f"{git_name}")
-                + f"<{cur_branch}>"
-            )
-            return 0
-        else:
+        if not get_commit_files(files, push_all):
+            if not silent and verbose:
+                print(
+                    f"{git_dir.replace(home_path, '~')}: "
+                    + success(f"{git_name}")
+                    + f"<{cur_branch}>"
+                )
             return 0
 
+        commit_output = commit_changes(git_dir, files, push_all, message)
+
         if commit_output is None:
             print(
                 f"{git_dir.replace(home_path, '~')}: "
@@ -109,13 +287,13 @@ def report_push(
             return 1
 
     else:
-        assert num_ahead > 0
-        # cases like merges from other branch into local branch.
+        assert plan.needs_push
+        # cases like merges from other branch into local branch or new branches.
         # No file is shown as modified or untracked but there are commits that have not been pushed
         pass_file_display_text = success(f"{git_name}") + f"<{cur_branch}> "
         commit_output = ""
 
-    push_status = call_push(git_dir, cur_branch)
+    push_status = call_push(git_dir, cur_branch, not plan.has_upstream)
 
     fail_file_display_text = failure(f"{git_name}") + f"<{cur_branch}>{failure('-> ')} "
 
@@ -0,0 +1,72 @@
+import io
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+FORMATS = ("text", "json", "ndjson")
+
+repo_state = threading.local()
+
+
+def start_repo() -> None:
+    """Marks that this thread starts working on a repository, for the `seconds` of the record
+    of the repository."""
+    repo_state.start = time.monotonic()
+
+
+def emit_record(git_dir: str, git_name: str, **fields) -> None:
+    """Prints the record of a repository as one line of JSON. Like the text output, it goes
+    through the buffer of the repository when the repositories are handled in parallel (see
+    `executor.run_repos`) so it is printed as soon as the repository is done with
+    `--order completion`.
+
+    Args:
+        git_dir: The directory where the local repo is.
+        git_name: The name of the folder containing the github repository.
+        fields: The other fields of the record.
+    """
+    record = {"path": git_dir, "name": git_name, **fields}
+    start = getattr(repo_state, "start", None)
+    if start is not None:
+        record["seconds"] = round(time.monotonic() - start, 6)
+    print(json.dumps(record))
+
+
+def retime_records(output: str, seconds: float) -> str:
+    """Sets the `seconds` of the records in the output of a repository, e.g. to the time it
+    took to get an output kept by `daemon.ReportMemo` instead of the time of the run it was
+    kept from."""
+    lines = []
+    for line in output.splitlines(keepends=True):
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if isinstance(record, dict) and "seconds" in record:
+                record["seconds"] = round(seconds, 6)
+                line = json.dumps(record) + "\n"
+        lines.append(line)
+    return "".join(lines)
+
+
+@contextmanager
+def collect_records(output_format: str) -> Iterator[None]:
+    """Prints the records emitted in the context as a single JSON array when it ends if
+    `output_format` is "json". Does nothing for the other formats.
+    """
+    if output_format != "json":
+        yield
+        return
+
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    try:
+        yield
+    finally:
+        lines = sys.stdout.getvalue().splitlines()
+        sys.stdout = stdout
+        print(json.dumps([json.loads(line) for line in lines if line], indent=2))
@@ -0,0 +1,272 @@
+import os.path
+import re
+
+OBJECT_ID_RE = re.compile(r"^([0-9a-f]{40}|[0-9a-f]{64})$")
+MAX_SYMREF_DEPTH = 5  # same limit as git
+PER_WORKTREE_REF_PREFIXES = ("refs/bisect/", "refs/worktree/", "refs/rewritten/")
+CONFIG_SECTION_RE = re.compile(r'^\s*\[\s*([^\s\]"]+)(?:\s+"(.*)")?\s*\]')
+CONFIG_KEY_RE = re.compile(r"^\s*([A-Za-z][A-Za-z0-9-]*)\s*=\s*(.*?)\s*$")
+
+
+def resolve_git_dir(work_dir: str) -> str | None:
+    """Gets the git directory of a repository. Follows `.git` files (`gitdir: <path>`) used by
+    worktrees and submodules.
+
+    Args:
+        work_dir: The directory where the local repo is.
+
+    Returns the git directory or None if it can not be found.
+    """
+    dot_git = os.path.join(work_dir, ".git")
+    if os.path.isdir(dot_git):
+        return dot_git
+
+    try:
+        with open(dot_git, encoding="utf-8") as file:
+            line = file.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    if not line.startswith("gitdir:"):
+        return None
+    git_dir = os.path.join(work_dir, line[len("gitdir:") :].strip())
+    return os.path.normpath(git_dir) if os.path.isdir(git_dir) else None
+
+
+def get_common_dir(git_dir: str) -> str:
+    """Gets the directory shared by all the worktrees of a repository (where the refs and
+    objects are) from the `commondir` file of a worktree's git directory.
+
+    Args:
+        git_dir: The git directory of the repository or worktree.
+
+    Returns the common directory, which is `git_dir` itself for the main worktree.
+    """
+    try:
+        with open(os.path.join(git_dir, "commondir"), encoding="utf-8") as file:
+            common_dir = file.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        return git_dir
+    return os.path.normpath(os.path.join(git_dir, common_dir))
+
+
+def get_ref_path(git_dir: str, common_dir: str, ref: str) -> str:
+    """Gets the path of the loose ref file of `ref`, which is in the worktree's own git
+    directory for per-worktree refs (e.g. HEAD) and in the common directory otherwise.
+    """
+    if ref == "HEAD" or ref.startswith(PER_WORKTREE_REF_PREFIXES):
+        return os.path.join(git_dir, ref)
+    return os.path.join(common_dir, ref)
+
+
+def resolve_ref(
+    git_dir: str, common_dir: str, ref: str
+) -> tuple[str, str | None] | None:
+    """Follows the symbolic refs starting from `ref` through the loose ref files.
+
+    Args:
+        git_dir: The git directory of the repository or worktree.
+        common_dir: The common directory of the repository (see `get_common_dir`).
+        ref: The full name of the ref, e.g. "HEAD" or "refs/heads/main".
+
+    Returns the full name of the last ref in the chain and the object id in its loose ref file
+    (None if it has none, i.e. it is packed or unborn), or None if a file could not be read.
+    """
+    for _ in range(MAX_SYMREF_DEPTH):
+        try:
+            with open(get_ref_path(git_dir, common_dir, ref), encoding="utf-8") as file:
+                content = file.read().strip()
+        except FileNotFoundError:
+            return ref, None
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        if not content.startswith("ref:"):
+            return (ref, content) if OBJECT_ID_RE.match(content) else None
+        ref = content[len("ref:") :].strip()
+
+    return None
+
+
+def read_packed_refs(common_dir: str) -> dict[str, str]:
+    """Reads the `packed-refs` file of a repository.
+
+    Args:
+        common_dir: The common directory of the repository (see `get_common_dir`).
+
+    Returns a map of the full names of the packed refs to their object ids.
+    """
+    packed_refs = {}
+    try:
+        with open(os.path.join(common_dir, "packed-refs"), encoding="utf-8") as file:
+            for line in file:
+                if line.startswith(("#", "^")):
+                    continue
+                oid, _, ref = line.rstrip("\n").partition(" ")
+                packed_refs[ref] = oid
+    except (OSError, UnicodeDecodeError):
+        pass
+    return packed_refs
+
+
+def read_ref_oid(work_dir: str, ref: str = "HEAD") -> str | None:
+    """Gets the object id a ref points to without running git.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        ref: The full name of the ref, e.g. "HEAD" or "refs/remotes/origin/main".
+
+    Returns the object id or None if the ref does not exist or could not be read.
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return None
+    common_dir = get_common_dir(git_dir)
+
+    resolved = resolve_ref(git_dir, common_dir, ref)
+    if resolved is None:
+        return None
+    ref, oid = resolved
+    return oid or read_packed_refs(common_dir).get(ref)
+
+
+def read_head_ref(work_dir: str) -> str | None:
+    """Resolves HEAD of a repository by reading `HEAD` and the loose ref files it points to,
+    following symbolic refs like `git branch --show-current` does.
+
+    Args:
+        work_dir: The directory where the local repo is.
+
+    Returns the full name of the ref HEAD points to, "" when HEAD is detached, or None if the
+    layout is not understood (e.g. reftable).
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return None
+
+    resolved = resolve_ref(git_dir, get_common_dir(git_dir), "HEAD")
+    if resolved is None:
+        return None
+    ref, oid = resolved
+    if ref == "HEAD":
+        return "" if oid is not None else None
+    return ref
+
+
+def read_head_branch(work_dir: str) -> str | None:
+    """Gets the current branch of a repository without running git.
+
+    Args:
+        work_dir: The directory where the local repo is.
+
+    Returns the name of the current branch, "" when HEAD is detached or does not point to a
+    branch, or None if it could not be read.
+    """
+    ref = read_head_ref(work_dir)
+    if ref is None or ref == "refs/heads/.invalid":  # reftable repositories
+        return None
+    return ref[len("refs/heads/") :] if ref.startswith("refs/heads/") else ""
+
+
+def get_last_fetch_time(work_dir: str) -> float | None:
+    """Gets when a repository was last fetched from the mtime of its `FETCH_HEAD`, which every
+    fetch rewrites.
+
+    Args:
+        work_dir: The directory where the local repo is.
+
+    Returns the time of the last fetch or None if it was never fetched.
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return None
+
+    fetch_times = []
+    for directory in {git_dir, get_common_dir(git_dir)}:
+        try:
+            fetch_times.append(os.stat(os.path.join(directory, "FETCH_HEAD")).st_mtime)
+        except OSError:
+            pass
+    return max(fetch_times, default=None)
+
+
+def read_config_file_value(
+    path: str, section: str, subsection: str | None, key: str
+) -> str | None:
+    """Reads a value from a git config file without running git. Does not follow includes.
+
+    Args:
+        path: The path of the config file.
+        section: The name of the section, e.g. "remote".
+        subsection: The name of the subsection, e.g. "origin", or None.
+        key: The name of the key in lower case, e.g. "url".
+
+    Returns the value or None if it is not set.
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            lines = file.readlines()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    in_section = False
+    for line in lines:
+        if match := CONFIG_SECTION_RE.match(line):
+            in_section = (
+                match.group(1).lower() == section and match.group(2) == subsection
+            )
+        elif (
+            in_section
+            and (match := CONFIG_KEY_RE.match(line))
+            and match.group(1).lower() == key
+        ):
+            return match.group(2).strip('"')
+    return None
+
+
+def read_config_value(
+    work_dir: str, section: str, subsection: str | None, key: str
+) -> str | None:
+    """Reads a value from the config of a repository without running git. Does not follow
+    includes or read the global config.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        section: The name of the section, e.g. "remote".
+        subsection: The name of the subsection, e.g. "origin", or None.
+        key: The name of the key in lower case, e.g. "url".
+
+    Returns the value or None if it is not set.
+    """
+    git_dir = resolve_git_dir(work_dir)
+    if git_dir is None:
+        return None
+    return read_config_file_value(
+        os.path.join(get_common_dir(git_dir), "config"), section, subsection, key
+    )
+
+
+def read_remote_url(work_dir: str, remote: str = "origin") -> str | None:
+    """Reads the url of a remote from the config of a repository without running git. Does
+    not apply `url.<base>.insteadOf`.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        remote: The name of the remote.
+
+    Returns the url or None if the remote has none.
+    """
+    return read_config_value(work_dir, "remote", remote, "url")
+
+
+def read_branch_remote(work_dir: str, branch: str) -> str | None:
+    """Reads the remote a branch tracks (`branch.<branch>.remote`) from the config of a
+    repository without running git.
+
+    Args:
+        work_dir: The directory where the local repo is.
+        branch: The name of the branch.
+
+    Returns the name of the remote or None if the branch has no upstream.
+    """
+    return read_config_value(work_dir, "branch", branch, "remote")
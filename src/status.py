@@ -1,7 +1,8 @@
 import os.path
 
 from .pretty_print import failure, success
-from .utils import get_commit_diffs, get_cur_branch, get_unpushed_files
+from .records import emit_record
+from .utils import get_repo_status, get_status_commit_diffs
 
 
 def report_status(
@@ -13,6 +14,9 @@ def report_status(
     modified: bool,
     deleted: bool,
     commit_diffs: bool,
+    max_fetch_age: float | None = 0,
+    output_format: str = "text",
+    use_cache: bool = True,
 ) -> int:
     """Report the status of local repositories.
 
@@ -25,20 +29,29 @@ def report_status(
         modified: Whether to only report modified files.
         modified: Whether to only report deleted files.
         commit_diffs: Whether to check how many commits a local repo is ahead and behind the origin.
+        max_fetch_age: The number of seconds after which the origin is fetched again for
+            `commit_diffs` or None to never fetch.
+        output_format: "text" or the format of the record of the repository (see
+            `records.FORMATS`).
+        use_cache: Whether to reuse the status of the repository if it did not change since
+            the last run (see `statuscache.StatusCache`).
 
     Returns exit codes 0 (the local repository is uptodate) or 1 (otherwise).
     """
 
-    cur_branch = get_cur_branch(git_dir)
+    status = get_repo_status(git_dir, use_cache)
 
-    if cur_branch is None:
+    if status is None:
         return 0
 
+    cur_branch = status.branch
     num_ahead, num_behind = (
-        get_commit_diffs(git_dir, cur_branch) if commit_diffs else (0, 0)
+        get_status_commit_diffs(git_dir, status, max_fetch_age)
+        if commit_diffs
+        else (0, 0)
     )
 
-    files = get_unpushed_files(git_dir)
+    files = status.files
     home_path = os.path.expanduser("~")
 
     modified_count = sum(1 for file in files if file.startswith("M")) if modified else 0
@@ -47,6 +60,31 @@ def report_status(
     )
     deleted_count = sum(1 for file in files if file.startswith("D")) if deleted else 0
 
+    if output_format != "text":
+        remote_found = num_ahead != -1 and num_behind != -1
+        emit_record(
+            git_dir,
+            git_name,
+            branch=cur_branch,
+            modified=modified_count,
+            untracked=untracked_count,
+            deleted=deleted_count,
+            files=[
+                file
+                for file in files
+                if (modified and file.startswith("M"))
+                or (untracked and file.startswith("?"))
+                or (deleted and file.startswith("D"))
+            ],
+            ahead=num_ahead if commit_diffs and remote_found else None,
+            behind=num_behind if commit_diffs and remote_found else None,
+            remote_branch_found=remote_found if commit_diffs else None,
+        )
+        return int(
+            bool(modified_count or untracked_count or deleted_count)
+            or (num_ahead, num_behind) != (0, 0)
+        )
+
     no_files = (
         len(files) == 0
         or (modified_count == 0 and modified and not untracked and not deleted)
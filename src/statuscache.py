@@ -0,0 +1,189 @@
+import json
+import os.path
+import threading
+import time
+
+from .dirty import RACY_MTIME_NS, get_dir_mtimes, get_exclude_files, stat_key
+from .gitindex import get_changed_entries
+from .index import get_cache_dir, write_json
+from .refs import get_common_dir, get_ref_path, resolve_git_dir
+
+STATUS_CACHE_VERSION = 2
+MAX_STATUS_CACHE_ENTRIES = 5000
+
+
+def get_status_cache_path() -> str:
+    """Gets the path of the status cache in the cache directory."""
+    return os.path.join(get_cache_dir(), "status.json")
+
+
+def get_ref_keys(
+    git_dir: str,
+    common_dir: str,
+    branch: str,
+    upstream: str | None,
+    excludes_file: str,
+) -> list:
+    """Gets the stat data of what a status depends on besides the working tree: HEAD, the
+    index, the refs of the branch and its upstream (loose or packed) and the files that decide
+    which files git ignores (see `dirty.get_exclude_files`)."""
+    paths = [
+        os.path.join(git_dir, "HEAD"),
+        os.path.join(git_dir, "index"),
+        os.path.join(common_dir, "packed-refs"),
+        *get_exclude_files(common_dir, excludes_file),
+    ]
+    if branch:
+        paths.append(get_ref_path(git_dir, common_dir, f"refs/heads/{branch}"))
+    if upstream:
+        paths.append(get_ref_path(git_dir, common_dir, f"refs/remotes/{upstream}"))
+        paths.append(get_ref_path(git_dir, common_dir, f"refs/heads/{upstream}"))
+    return [stat_key(path) for path in paths]
+
+
+class StatusCache:
+    """The statuses of repositories found by `git status`, each with the fingerprint of the
+    state it was found in. A status is reused as long as the fingerprint matches, so a warm
+    `localgit status` only runs git in the repositories that changed. The cache is one file
+    in the cache directory (see `get_status_cache_path`), loaded on first use and saved by
+    `save`, and keeps the `max_entries` most recently used repositories."""
+
+    def __init__(self, max_entries: int = MAX_STATUS_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = None
+        self.changed = False
+
+    def load(self) -> dict:
+        """Gets the entries by repository in least recently used order, read from the cache
+        file the first time. Must be called with the lock held."""
+        if self.entries is not None:
+            return self.entries
+
+        self.entries = {}
+        try:
+            with open(get_status_cache_path(), encoding="utf-8") as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return self.entries
+        if isinstance(cache, dict) and cache.get("version") == STATUS_CACHE_VERSION:
+            self.entries = cache.get("entries", {})
+        return self.entries
+
+    def get(self, work_dir: str) -> list | None:
+        """Gets the status of a repository if its fingerprint still matches the one it was
+        stored with (see `put`).
+
+        Args:
+            work_dir: The directory where the local repo is.
+
+        Returns the stored status or None if there is none or the repository changed.
+        """
+        with self.lock:
+            entry = self.load().get(work_dir)
+        if not isinstance(entry, dict):
+            return None
+
+        git_dir = resolve_git_dir(work_dir)
+        if git_dir is None:
+            return None
+        common_dir = get_common_dir(git_dir)
+        branch, upstream = entry["status"][:2]
+
+        excludes_file = entry.get("excludes_file")
+        if not isinstance(excludes_file, str) or entry.get("refs") != get_ref_keys(
+            git_dir, common_dir, branch, upstream, excludes_file
+        ):
+            return None
+        for rel_path, mtime in entry.get("dirs", {"": None}).items():
+            try:
+                if os.stat(os.path.join(work_dir, rel_path)).st_mtime_ns != mtime:
+                    return None
+            except OSError:
+                return None
+        if entry.get("changed") != get_changed_entries(work_dir, git_dir, common_dir):
+            return None
+
+        with self.lock:
+            # most recently used last
+            self.entries[work_dir] = self.entries.pop(work_dir, entry)
+            self.changed = True
+        return entry["status"]
+
+    def get_fingerprint(self, work_dir: str) -> tuple[str, str, dict] | None:
+        """Gets the part of the fingerprint of a repository that has to be taken before
+        `git status` runs, so a file changed while it runs does not match: the tracked files
+        that do not match the index.
+
+        Returns the git directory, the common directory and the changed files or None if the
+        repository can not be cached.
+        """
+        git_dir = resolve_git_dir(work_dir)
+        if git_dir is None:
+            return None
+        common_dir = get_common_dir(git_dir)
+        changed = get_changed_entries(work_dir, git_dir, common_dir)
+        if changed is None:
+            return None
+
+        recent = time.time_ns() - RACY_MTIME_NS
+        if any(key is not None and key[0] >= recent for key in changed.values()):
+            return None  # could change again without its stat data changing
+        return git_dir, common_dir, changed
+
+    def put(
+        self,
+        work_dir: str,
+        fingerprint: tuple[str, str, dict],
+        status: list,
+        ignored_dirs: set[str],
+        excludes_file: str,
+    ) -> None:
+        """Stores the status of a repository with its fingerprint: HEAD, the index and refs
+        (see `get_ref_keys`), the mtimes of the directories of the working tree (which a new
+        untracked file changes) and the tracked files that do not match the index.
+
+        Args:
+            work_dir: The directory where the local repo is.
+            fingerprint: The fingerprint from `get_fingerprint`, taken before `git status`.
+            status: The branch, upstream, commit differences and files found by git.
+            ignored_dirs: The ignored directories relative to `work_dir`, which are skipped.
+            excludes_file: The global file of ignore patterns of the repository (see
+                `dirty.get_excludes_file`).
+        """
+        git_dir, common_dir, changed = fingerprint
+        dirs = get_dir_mtimes(work_dir, ignored_dirs)
+        if None in dirs.values():
+            return  # recently modified directories never match
+
+        entry = {
+            "status": status,
+            "refs": get_ref_keys(
+                git_dir, common_dir, status[0], status[1], excludes_file
+            ),
+            "excludes_file": excludes_file,
+            "dirs": dirs,
+            "changed": changed,
+        }
+        with self.lock:
+            entries = self.load()
+            entries.pop(work_dir, None)
+            entries[work_dir] = entry
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+            self.changed = True
+
+    def save(self) -> None:
+        """Writes the entries to the cache file if they changed. The next use loads the file
+        again."""
+        with self.lock:
+            if self.changed:
+                write_json(
+                    get_status_cache_path(),
+                    {"version": STATUS_CACHE_VERSION, "entries": self.entries},
+                )
+            self.entries = None
+            self.changed = False
+
+
+status_cache = StatusCache()
@@ -0,0 +1,106 @@
+import json
+import os
+import os.path
+import tempfile
+import time
+from typing import Iterator
+
+from .pretty_print import warning
+
+DEFAULT_TRACE2_DIR = "localgit-trace2"
+MAX_TRACE2_ROWS = 10
+
+
+def make_run_dir(trace2_dir: str) -> str:
+    """Makes the directory of the traces of this run in `trace2_dir`, so the traces of
+    earlier runs are not aggregated with them.
+
+    Returns the path of the directory.
+    """
+    os.makedirs(trace2_dir, exist_ok=True)
+    return tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=trace2_dir)
+
+
+def get_trace2_target(run_dir: str, work_dir: str) -> str:
+    """Gets the `GIT_TRACE2_EVENT` target of the git commands run in a repository: a
+    directory of the run directory named after the repository, in which git writes one file
+    per process (including the processes git starts itself, e.g. `upload-pack`).
+
+    Args:
+        run_dir: The directory of the traces of the run (see `make_run_dir`).
+        work_dir: The directory the git command runs in.
+    """
+    target = os.path.join(run_dir, work_dir.strip(os.sep).replace(os.sep, "_") or "_")
+    os.makedirs(target, exist_ok=True)
+    return target
+
+
+def read_events(path: str) -> Iterator[dict]:
+    """Reads the events of a trace2 event file, skipping the lines that are cut short."""
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def aggregate_trace2(
+    run_dir: str,
+) -> tuple[dict[tuple[str, str, str], tuple[float, set[str]]], dict[str, float]]:
+    """Adds up the time spent in every region of git (e.g. `status/untracked` or
+    `index/refresh`) across the processes of all the repositories.
+
+    Args:
+        run_dir: The directory of the traces of the run.
+
+    Returns the seconds spent in and the repositories of every region by the name of the
+    git command, the category and the label of the region, and the total seconds of the
+    processes of every git command.
+    """
+    regions = {}
+    commands = {}
+    for repo_entry in os.scandir(run_dir):
+        if not repo_entry.is_dir():
+            continue
+        for trace_entry in os.scandir(repo_entry.path):
+            command = "git"
+            for event in read_events(trace_entry.path):
+                kind = event.get("event")
+                if kind == "cmd_name":
+                    command = event.get("name", command)
+                elif kind == "region_leave" and "t_rel" in event:
+                    key = (command, event.get("category", ""), event.get("label", ""))
+                    seconds, repos = regions.get(key, (0, set()))
+                    repos.add(repo_entry.name)
+                    regions[key] = (seconds + event["t_rel"], repos)
+                elif kind == "exit" and "t_abs" in event:
+                    commands[command] = commands.get(command, 0) + event["t_abs"]
+    return regions, commands
+
+
+def report_trace2(run_dir: str) -> None:
+    """Prints the regions git spent the most time in, with their share of the time of the
+    git command they are part of and the number of repositories they were in.
+
+    Args:
+        run_dir: The directory of the traces of the run.
+    """
+    regions, commands = aggregate_trace2(run_dir)
+    print()
+    print(
+        f"git trace2 events of {sum(1 for _ in os.scandir(run_dir))} repos are in {run_dir}."
+    )
+    if not regions:
+        return
+
+    print(warning("Time in git regions:"))
+    for (command, category, label), (seconds, repos) in sorted(
+        regions.items(), key=lambda item: item[1][0], reverse=True
+    )[:MAX_TRACE2_ROWS]:
+        total = commands.get(command)
+        share = f" ({seconds / total:.0%} of git {command})" if total else ""
+        print(
+            f"  - git {command} {category}/{label}: {seconds:.3f}s{share}"
+            f" in {len(repos)} repos"
+        )
@@ -1,8 +1,25 @@
+import os
 import os.path
 import subprocess
+import time
 from enum import Enum
-
+from typing import Iterator, NamedTuple
+
+from .backends import call_backends
+from .config import get_search_roots
+from .dirty import get_excludes_file, is_clean, parse_ignored_dirs, record_clean
+from .executor import GitTimeout, communicate, is_limited
+from .discovery import stream_git_dirs
+from .exclusion import ExcludeMatcher
+from .index import load_index, save_index
 from .pretty_print import failure, success, warning
+from .refs import get_last_fetch_time, resolve_git_dir
+from .statuscache import status_cache
+
+# the repositories `localgit daemon` found and watches, None outside of the daemon
+known_git_dirs: list[str] | None = None
+# the values git reads as false for a boolean config
+FALSE_CONFIG_VALUES = ("false", "no", "off", "0", "")
 
 
 class PushStatus(Enum):
@@ -13,17 +30,86 @@ class PushStatus(Enum):
     OTHER_FAILURE = 2
 
 
-def get_commit_logs(git_dir: str, num_logs: int) -> list[str]:
-    """Get the last min(`num_logs`, number of commit logs) logs of a github repository.
+class PullStatus(Enum):
+    """Enum for storing the status of the attemped pull."""
+
+    MERGED = 0
+    CONFLICT = 1
+    OVERWRITTEN = 2
+    UNRESOLVED = 3
+    FAILED = 4
+
+
+class FetchStatus(Enum):
+    """Enum for storing the status of the attemped fetch."""
+
+    UPDATED = 0
+    UP_TO_DATE = 1
+    STALLED = 2
+    FAILED = 3
+
+
+def get_log_filters(since: str | None = None, until: str | None = None) -> list[str]:
+    """Gets the `git log` options that only show the commits in a time range.
+
+    Args:
+        since: Only show commits more recent than this date, e.g. "midnight" or "2 days ago".
+        until: Only show commits older than this date.
+    """
+    filters = []
+    if since:
+        filters.append(f"--since={since}")
+    if until:
+        filters.append(f"--until={until}")
+    return filters
+
+
+def get_commit_logs(
+    git_dir: str, num_logs: int, since: str | None = None, until: str | None = None
+) -> list[str]:
+    """Get the last min(`num_logs`, number of commit logs) logs of a github repository. Only
+    the logs shown are read, with `git log -n num_logs`.
 
     Args:
         git_dir: The directory where the local repo is.
         num_logs: Maximum number of logs to get from the repositories.
+        since: Only get commits more recent than this date.
+        until: Only get commits older than this date.
 
     Returns a list of the last `num_logs` logs.
     """
     logs_output = subprocess.Popen(
-        ["git", "log", "--oneline"],
+        ["git", "log", "--oneline", "-n", str(num_logs)]
+        + get_log_filters(since, until),
+        cwd=git_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output, error = logs_output.communicate()
+
+    if error.decode("utf-8"):
+        return []
+    return output.decode("utf-8").split("\n")
+
+
+def get_timed_commit_logs(
+    git_dir: str, num_logs: int, since: str | None = None, until: str | None = None
+) -> list[tuple[int, str]]:
+    """Get the last min(`num_logs`, number of commit logs) logs of a github repository with
+    their commit time, with `git log -n num_logs --format=%ct %h %s`.
+
+    Args:
+        git_dir: The directory where the local repo is.
+        num_logs: Maximum number of logs to get from the repositories.
+        since: Only get commits more recent than this date.
+        until: Only get commits older than this date.
+
+    Returns a list of the commit times (seconds since the epoch) and `--oneline` logs, from
+    newest to oldest.
+    """
+    logs_output = subprocess.Popen(
+        ["git", "log", "-n", str(num_logs), "--format=%ct %h %s"]
+        + get_log_filters(since, until),
         cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -32,9 +118,15 @@ def get_commit_logs(git_dir: str, num_logs: int) -> list[str]:
 
     if error.decode("utf-8"):
         return []
-    # print(error.decode("utf-8"))
-    logs = output.decode("utf-8").split("\n")
-    return logs[: min(len(logs), num_logs)]
+
+    logs = []
+    for line in output.decode("utf-8").split("\n"):
+        if line:
+            commit_time, log = line.split(" ", 1)
+            logs.append((int(commit_time), log))
+    # git orders by commit time but parents are always shown after their children
+    logs.sort(key=lambda log: log[0], reverse=True)
+    return logs
 
 
 def call_commit(git_dir: str, message: str, tracked: bool = False) -> str | None:
@@ -47,8 +139,10 @@ def call_commit(git_dir: str, message: str, tracked: bool = False) -> str | None
     Returns:
         The text output from the command or None if commit failed.
     """
-    if tracked: option = "-am"
-    else: option = "-m"
+    if tracked:
+        option = "-am"
+    else:
+        option = "-m"
 
     output = subprocess.Popen(
         ["git", "commit", option, message],
@@ -78,171 +172,407 @@ def call_add_all(git_dir: str) -> None:
     )
 
 
-def call_push(git_dir: str, cur_branch: str) -> PushStatus:
+def call_push(git_dir: str, cur_branch: str, set_upstream: bool = False) -> PushStatus:
     """Call `git push` or `git push -u origin cur_branch`.
 
     Args:
         git_dir: The github directory where the command will be run.
         cur_branch: The branch that the user has checkout.
+        set_upstream: Whether the branch has no upstream yet, in which case it is pushed to
+            `origin/cur_branch` and set as its upstream.
 
     Returns:
         Whether the command was successful.
     """
+    command = f"git push -u origin {cur_branch}" if set_upstream else "git push"
     push_output = subprocess.Popen(
-        "git push".split(" "),
+        command.split(" "),
         cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        start_new_session=is_limited(),
     )
-    _, error = push_output.communicate()
+    _, error = communicate(push_output)
 
-    # print(f"{output=}")
-    # print(f"{error=}")
     error = error.decode("utf-8")
     if "push declined due to repository rule violations" in error:
         return PushStatus.REPO_VIOLATION
-
-    if "git push --set-upstream origin" in error:
-        push_output = subprocess.Popen(
-            f"git push -u origin {cur_branch}".split(" "),
-            cwd=git_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        _, error = push_output.communicate()
-        # print(f"{output=}")
-        # print(f"{error=}")
+    if push_output.returncode != 0:
+        return PushStatus.OTHER_FAILURE
     return PushStatus.SUCCESSFUL
 
 
-def call_pull(git_dir, cur_branch) -> tuple[str, str]:
-    """Call `git pull origin cur_branch`.
+def get_changed_paths(git_dir: str, revisions: str) -> list[str]:
+    """Call `git diff --name-only -z revisions`.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        revisions: The revisions to compare, e.g. `HEAD...origin/main`.
+
+    Returns:
+        The paths of the files that differ.
+    """
+    diff = subprocess.Popen(
+        ["git", "diff", "--name-only", "--no-renames", "-z", revisions],
+        cwd=git_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output, _ = diff.communicate()
+    return [
+        path for path in output.decode("utf-8", "surrogateescape").split("\0") if path
+    ]
+
+
+def get_dirty_paths(git_dir: str) -> set[str]:
+    """Gets the paths of the modified, staged and untracked files with
+    `git status --porcelain -z --untracked-files=all`.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+
+    Returns:
+        The paths of the files that have local changes.
+    """
+    status = subprocess.Popen(
+        ["git", "status", "--porcelain", "-z", "--untracked-files=all"],
+        cwd=git_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output, _ = status.communicate()
+
+    paths = set()
+    entries = iter(output.decode("utf-8", "surrogateescape").split("\0"))
+    for entry in entries:
+        if not entry:
+            continue
+        paths.add(entry[3:])
+        if entry[0] in "RC":  # renames and copies are followed by the original path
+            paths.add(next(entries, ""))
+    return paths
+
+
+class PullResult(NamedTuple):
+    """What `call_pull` did, read from the machine readable output of git."""
+
+    status: PullStatus
+    changes: list[tuple[str, str, str]]  # `git diff --numstat`: added, deleted, path
+    merged: list[str]  # changed on both sides and merged without conflicts
+    conflicts: list[str]  # the files with conflicts or that would be overwritten
+    error: str
+
+
+def read_pull_config(git_dir: str, cur_branch: str) -> tuple[str | None, str | None]:
+    """Reads how `git pull` integrates a branch with a single `git config` call:
+    `branch.<cur_branch>.rebase`, or `pull.rebase` if it is not set, and `pull.ff`.
 
     Args:
         git_dir: The github directory where the command will be run.
         cur_branch: The branch that the user has checkout.
 
     Returns:
-        Tuple reporting whether the stdout, and stderr.
+        The rebase and fast-forward settings, None for the ones that are not set.
     """
-    pull_output = subprocess.Popen(
-        f"git pull origin {cur_branch}".split(" "),
+    config = subprocess.Popen(
+        [
+            "git",
+            "config",
+            "-z",
+            "--get-regexp",
+            r"^(pull\.rebase|pull\.ff|branch\..*\.rebase)$",
+        ],
         cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
+    output, _ = config.communicate()
+
+    values = {}
+    for entry in output.decode("utf-8", "surrogateescape").split("\0"):
+        if entry:
+            key, _, value = entry.partition("\n")
+            values[key] = value or "true"  # a key without a value is true
+    rebase = values.get(f"branch.{cur_branch}.rebase", values.get("pull.rebase"))
+    return rebase, values.get("pull.ff")
+
+
+def get_integrate_command(
+    git_dir: str, cur_branch: str, fast_forward: bool
+) -> list[str]:
+    """Gets the command integrating `origin/cur_branch` the way `git pull` would given the
+    config (see `read_pull_config`): `git rebase` if `pull.rebase` or
+    `branch.<cur_branch>.rebase` is set, `git merge --ff-only` if `pull.ff` is `only` and a
+    plain `git merge` if neither is set. Like `git pull`, a branch that can be fast-forwarded
+    is fast-forwarded instead of rebased, and an interactive rebase is done without
+    interaction.
 
-    output, error = pull_output.communicate()
-    output = output.decode("utf-8")
-    error = error.decode("utf-8")
+    Args:
+        git_dir: The github directory where the command will be run.
+        cur_branch: The branch that the user has checkout.
+        fast_forward: Whether the local branch has no commits the origin does not have.
+    """
+    upstream = f"origin/{cur_branch}"
+    rebase, ff = read_pull_config(git_dir, cur_branch)
+    rebase = (rebase or "false").lower()
+    ff = (ff or "true").lower()
+
+    if ff == "only" or (fast_forward and rebase not in FALSE_CONFIG_VALUES):
+        return ["git", "merge", "--ff-only", upstream]
+    if rebase in ("merges", "m"):
+        return ["git", "rebase", "--rebase-merges", upstream]
+    if rebase not in FALSE_CONFIG_VALUES:
+        return ["git", "rebase", upstream]
+    if ff in FALSE_CONFIG_VALUES:
+        return ["git", "merge", "--no-edit", "--no-ff", upstream]
+    return ["git", "merge", "--no-edit", upstream]
+
+
+def is_integrating(git_dir: str) -> bool:
+    """Gets whether a merge or rebase was stopped by conflicts and not resolved yet."""
+    git_path = resolve_git_dir(git_dir) or git_dir
+    return any(
+        os.path.exists(os.path.join(git_path, name))
+        for name in ("MERGE_HEAD", "rebase-merge", "rebase-apply")
+    )
+
+
+def call_pull(git_dir: str, cur_branch: str, fast_forward: bool) -> PullResult:
+    """Integrate `origin/cur_branch`, which `get_commit_diffs` already fetched, the way
+    `git pull origin cur_branch` would (see `get_integrate_command`) without fetching the
+    origin a second time. What was pulled, merged and conflicted is read from `git diff -z`
+    rather than the text git prints.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        cur_branch: The branch that the user has checkout.
+        fast_forward: Whether the local branch has no commits the origin does not have, in
+            which case no files can be merged.
+
+    Returns:
+        The result of the merge.
+    """
+    if is_integrating(git_dir):
+        return PullResult(PullStatus.UNRESOLVED, [], [], [], "")
+
+    upstream = f"origin/{cur_branch}"
+    incoming = get_changed_paths(git_dir, f"HEAD...{upstream}")
+    if not is_clean(git_dir):
+        overwritten = get_dirty_paths(git_dir).intersection(incoming)
+        if overwritten:
+            return PullResult(PullStatus.OVERWRITTEN, [], [], sorted(overwritten), "")
+    outgoing = [] if fast_forward else get_changed_paths(git_dir, f"{upstream}...HEAD")
+
+    merge = subprocess.Popen(
+        get_integrate_command(git_dir, cur_branch, fast_forward),
+        cwd=git_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    _, error = merge.communicate()
 
-    # print(f"{output=}")
-    # print(f"{error=}")
-    return output, error
+    both_changed = set(incoming).intersection(outgoing)
+    if merge.returncode == 0:
+        diff = subprocess.Popen(
+            ["git", "diff", "--numstat", "--no-renames", "-z", "ORIG_HEAD", "HEAD"],
+            cwd=git_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output, _ = diff.communicate()
+        changes = [
+            tuple(line.split("\t", 2))
+            for line in output.decode("utf-8", "surrogateescape").split("\0")
+            if line
+        ]
+        return PullResult(PullStatus.MERGED, changes, sorted(both_changed), [], "")
+
+    conflicts = subprocess.Popen(
+        ["git", "diff", "--name-only", "--diff-filter=U", "-z"],
+        cwd=git_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    output, _ = conflicts.communicate()
+    conflicted = [
+        path for path in output.decode("utf-8", "surrogateescape").split("\0") if path
+    ]
+    if conflicted:
+        merged = sorted(both_changed.difference(conflicted))
+        return PullResult(PullStatus.CONFLICT, [], merged, conflicted, "")
+
+    return PullResult(PullStatus.FAILED, [], [], [], error.decode("utf-8").strip())
+
+
+def format_numstat(changes: list[tuple[str, str, str]]) -> tuple[list[str], str]:
+    """Formats the lines of `git diff --numstat` like `git diff --stat` does.
+
+    Args:
+        changes: The number of added and deleted lines and the path of each changed file.
+
+    Returns:
+        A line per file and the summary line ("" if no file changed).
+    """
+    if not changes:
+        return [], ""
+
+    lines = []
+    insertions = 0
+    deletions = 0
+    for added, deleted, path in changes:
+        if added == "-":  # binary files have no line counts
+            lines.append(f" {path} | Bin")
+            continue
+        added, deleted = int(added), int(deleted)
+        insertions += added
+        deletions += deleted
+        total = added + deleted
+        scale = min(1, 40 / total) if total else 1
+        lines.append(
+            f" {path} | {total} {'+' * round(added * scale)}{'-' * round(deleted * scale)}"
+        )
+
+    summary = f" {len(changes)} file{'s' if len(changes) != 1 else ''} changed"
+    if insertions:
+        summary += f", {insertions} insertion{'s' if insertions != 1 else ''}(+)"
+    if deletions:
+        summary += f", {deletions} deletion{'s' if deletions != 1 else ''}(-)"
+    return lines, summary
 
 
 def handle_pull_output(
-    output: str, error: str
+    result: PullResult,
 ) -> tuple[bool, list[str], list[str], list[str], str]:
-    """Handles the output of `call_pull` to report what files were pull, merged, and failed to
+    """Handles the result of `call_pull` to report what files were pull, merged, and failed to
     merge.
 
     Args:
-        output: The text in the stdout after `git pull origin ...` was called.
-        error: The text in the stderr after `git pull origin ...` was called.
+        result: The result of `call_pull`.
 
     Returns:
         Tuple reporting whether the call was successful, the files that were pulled,
         successfully merged, filed to merge, and summary of the pull.
     """
-    pulled = []
-    merged = []
-    failed_merge = []
-    summary = ""
-    successful = True
-
-    if "Aborting" in error:  # git pull aborted because commits haven't been pushed
-        successful = False
-        error_lst = error.split("\n")
-        for idx, line in enumerate(error_lst):
-            if "overwritten by merge" in line:
-                summary = line.split(":")[1].strip() + ": "
-                for file in error_lst[idx + 1 :]:
-                    if "Please commit your changes" in file:
-                        break
-                    pulled.append(file.strip())
-                break
-    elif "fatal: Exiting because of an unresolved conflict" in error:  # merge conflict
-        successful = False
-        summary = failure("Unresolved Conflict")
-    else:
-        output_lst = output.split("\n")
-        for idx, line in enumerate(output_lst):
-
-            if line.startswith("Auto-merging"):  # Merge conflict exists
-                if output_lst[idx + 1].startswith(
-                    "CONFLICT (content): Merge conflict in "
-                ):
-                    message = output_lst[idx + 1].split(": ")[1].strip().split(" ")
-                    message = " ".join(message[0:2]) + ": " + " ".join(message[3:])
-                    failed_merge.append(
-                        message.replace("Merge conflict", warning("Merge conflict"))
-                    )
-                else:
-                    merged.append(
-                        line.replace("Auto-merging", success("Auto-merging") + ":")
-                    )
-            elif any(text in line for text in ["Fast-forward", "Merge made by"]):
-                # No conflicts
-                for file in output_lst[idx + 1 :]:
-                    if any(
-                        text in file
-                        for text in ["file changed", "insertion", "deletion"]
-                    ):
-                        summary = file.replace("+", success("+")).replace(
-                            "-", failure("-")
-                        )
-                        break
-                    pulled.append(file)
-                break
-
-    return successful, pulled, merged, failed_merge, summary
+    if result.status == PullStatus.OVERWRITTEN:
+        # git merge aborts because the changes haven't been committed
+        summary = (
+            "Your local changes to the following files would be overwritten by merge: "
+        )
+        return False, result.conflicts, [], [], summary
+    if result.status == PullStatus.UNRESOLVED:
+        return False, [], [], [], failure("Unresolved Conflict")
+    if result.status == PullStatus.FAILED:
+        return False, [], [], [], result.error
+
+    merged = [success("Auto-merging") + f": {file}" for file in result.merged]
+    failed_merge = [
+        warning("Merge conflict") + f": {file}" for file in result.conflicts
+    ]
+    if result.status == PullStatus.CONFLICT:
+        return True, [], merged, failed_merge, ""
 
+    pulled, summary = format_numstat(result.changes)
+    summary = summary.replace("+", success("+")).replace("-", failure("-"))
+    return True, pulled, merged, failed_merge, summary
 
-def get_commit_diffs(git_dir: str, cur_branch: str) -> tuple[int, ...]:
-    """Get the commit difference between the local repo and the origin.
+
+def call_fetch(git_dir: str, timeout: float | None = None) -> tuple[FetchStatus, int]:
+    """Call `git fetch origin`.
 
     Args:
         git_dir: The github directory where the command will be run.
-        cur_branch: The branch that the user has checkout.
+        timeout: The number of seconds after which the fetch is killed.
 
     Returns:
-        The number of commits the local repo is ahead and behind the origin.
+        The status of the fetch and the number of remote-tracking refs it updated.
     """
     fetch = subprocess.Popen(
-        f"git fetch origin {cur_branch}".split(" "),
+        "git fetch origin".split(" "),
         cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
+        start_new_session=is_limited(timeout),
     )
-    _, error = fetch.communicate()
-    if "couldn't find remote ref" in error.decode("utf-8"):
-        return -1, -1
+    try:
+        _, error = communicate(fetch, timeout)
+    except GitTimeout:
+        return FetchStatus.STALLED, 0
+
+    if fetch.returncode != 0:
+        return FetchStatus.FAILED, 0
+
+    # each updated ref is reported as `<old>..<new>  <branch> -> origin/<branch>`
+    num_updated = sum(
+        1
+        for line in error.decode("utf-8").split("\n")
+        if "->" in line and "FETCH_HEAD" not in line
+    )
+    if num_updated == 0:
+        return FetchStatus.UP_TO_DATE, 0
+    return FetchStatus.UPDATED, num_updated
+
+
+def fetch_branch(git_dir: str, cur_branch: str) -> tuple[bool, bool]:
+    """Call `git fetch origin cur_branch`.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        cur_branch: The branch that the user has checkout.
 
-    commits_count = subprocess.Popen(
-        f"git rev-list --left-right --count {cur_branch}...origin/{cur_branch}".split(
-            " "
-        ),
+    Returns:
+        Whether the branch was found in the origin and whether any remote-tracking ref was
+        updated by the fetch.
+    """
+    fetch = subprocess.Popen(
+        f"git fetch origin {cur_branch}".split(" "),
+        cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        cwd=git_dir,
+        start_new_session=is_limited(),
     )
-    output, error = commits_count.communicate()
+    _, error = communicate(fetch)
+    error = error.decode("utf-8")
+    if "couldn't find remote ref" in error:
+        return False, False
+
+    # up to date fetches only report ` * branch  <cur_branch>  -> FETCH_HEAD`
+    updated = any(
+        "->" in line and "FETCH_HEAD" not in line for line in error.split("\n")
+    )
+    return True, updated
+
+
+def count_commit_diffs(git_dir: str, cur_branch: str) -> tuple[int, ...]:
+    """Count the commits the local branch is ahead and behind `origin/cur_branch` without
+    fetching. Counts in-process from the commit-graph when possible (see
+    `commitgraph.get_commit_diffs_from_graph`) and with `git rev-list --left-right --count`
+    otherwise (see `backends`).
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        cur_branch: The branch that the user has checkout.
+
+    Returns:
+        The number of commits the local repo is ahead and behind the origin.
+    """
+    return call_backends("commit_diffs", git_dir, cur_branch)
+
+
+def get_commit_diffs(git_dir: str, cur_branch: str) -> tuple[int, ...]:
+    """Get the commit difference between the local repo and the origin.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        cur_branch: The branch that the user has checkout.
 
-    if "unknown revision or path not in the working tree" in error.decode("utf-8"):
+    Returns:
+        The number of commits the local repo is ahead and behind the origin.
+    """
+    found, _ = fetch_branch(git_dir, cur_branch)
+    if not found:
         return -1, -1
 
-    return tuple(int(diff) for diff in output.decode("utf-8")[:-1].split("\t"))
+    return count_commit_diffs(git_dir, cur_branch)
 
 
 def num_commits_ahead(git_dir: str, cur_branch: str) -> int:
@@ -272,7 +602,8 @@ def num_commits_behind(git_dir: str, cur_branch: str) -> int:
 
 
 def get_unpushed_files(git_dir: str) -> list[str]:
-    """Gets the files in the local branch that are modified or untracked.
+    """Gets the files in the local branch that are modified or untracked. Skips `git status`
+    if the repository is definitely clean (see `dirty.is_clean` and `backends`).
 
     Args:
         git_dir: The github directory where the command will be run.
@@ -280,35 +611,178 @@ def get_unpushed_files(git_dir: str) -> list[str]:
     Returns:
         The modified files (starting with 'M') and untracked files (starting with '??').
     """
-    files = subprocess.check_output(
-        ["git", "status", "--porcelain"],
-        text=True,
-        cwd=git_dir,
-    ).split("\n")
+    return call_backends("unpushed_files", git_dir)
 
-    return [file.strip() for file in files if file]
 
+class RepoStatus(NamedTuple):
+    """The output of `git status --porcelain=v2 --branch`."""
 
-def get_cur_branch(git_dir) -> str | None:
-    """Gets the current branch the local repo is checkout into.
+    branch: str
+    upstream: str | None
+    commit_diffs: tuple[int, int] | None
+    files: list[str]
+
+
+def quote_path(path: str) -> str:
+    """Quotes a path from the porcelain v2 output that contains spaces like the v1 output does."""
+    if " " in path and not path.startswith('"'):
+        return f'"{path}"'
+    return path
+
+
+def parse_porcelain_v2(output: str) -> RepoStatus:
+    """Parses the output of `git status --porcelain=v2 --branch`. The file entries are converted
+    to their `git status --porcelain` (v1) form, e.g. `M file`, `?? file`, `R old -> new`, so
+    they read the same as the output of `get_unpushed_files`.
+
+    Args:
+        output: The text in the stdout after `git status --porcelain=v2 --branch` was called.
+
+    Returns:
+        The branch ("" when detached), its upstream, the number of commits it is ahead and
+        behind the upstream (None when there is no upstream or it is gone), and the files.
+    """
+    branch = ""
+    upstream = None
+    commit_diffs = None
+    files = []
+
+    for line in output.split("\n"):
+        if line.startswith("# branch.head "):
+            head = line[len("# branch.head ") :]
+            branch = "" if head == "(detached)" else head
+        elif line.startswith("# branch.upstream "):
+            upstream = line[len("# branch.upstream ") :]
+        elif line.startswith("# branch.ab "):
+            ahead, behind = line[len("# branch.ab ") :].split(" ")
+            commit_diffs = (int(ahead), -int(behind))
+        elif line.startswith("1 "):
+            fields = line.split(" ", 8)
+            status = fields[1].replace(".", " ")
+            files.append(f"{status} {quote_path(fields[8])}".strip())
+        elif line.startswith("2 "):
+            fields = line.split(" ", 9)
+            status = fields[1].replace(".", " ")
+            path, orig_path = fields[9].split("\t", 1)
+            renamed = f"{quote_path(orig_path)} -> {quote_path(path)}"
+            files.append(f"{status} {renamed}".strip())
+        elif line.startswith("u "):
+            fields = line.split(" ", 10)
+            files.append(f"{fields[1]} {quote_path(fields[10])}")
+        elif line.startswith("? "):
+            files.append(f"?? {quote_path(line[2:])}")
+
+    return RepoStatus(branch, upstream, commit_diffs, files)
+
+
+def get_repo_status(git_dir: str, use_cache: bool = True) -> RepoStatus | None:
+    """Gets the branch, upstream, commit differences with the upstream and modified or untracked
+    files of a repository with a single `git status --porcelain=v2 --branch` call. If nothing
+    changed since the last call (see `statuscache.StatusCache`), the stored status is used
+    instead. If the repository is definitely clean (see `dirty.is_clean`), only the branch is
+    read and the upstream and commit differences are left unknown.
 
     Args:
         git_dir: The github directory where the command will be run.
+        use_cache: Whether to use and update the status cache.
 
     Returns:
-        The name of the current branch or None if there was an error.
+        The parsed status or None if there was an error.
     """
-    fetch = subprocess.Popen(
-        ["git", "branch", "--show-current"],
+    if use_cache and (cached := status_cache.get(git_dir)) is not None:
+        branch, upstream, commit_diffs, files = cached
+        return RepoStatus(
+            branch, upstream, tuple(commit_diffs) if commit_diffs else None, files
+        )
+
+    if is_clean(git_dir) and (cur_branch := get_cur_branch(git_dir)) is not None:
+        return RepoStatus(cur_branch, None, None, [])
+
+    fingerprint = status_cache.get_fingerprint(git_dir) if use_cache else None
+    status = subprocess.Popen(
+        # the ignored directories are skipped by the fingerprint and the clean record
+        ["git", "status", "--porcelain=v2", "--branch", "--ignored=matching"],
         cwd=git_dir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
-    output, error = fetch.communicate()
-    if error.decode("utf-8"):
+    output, _ = status.communicate()
+    if status.returncode != 0:
         return None
 
-    return output.decode()[:-1]
+    output = output.decode("utf-8")
+    repo_status = parse_porcelain_v2(output)
+    if repo_status.files and fingerprint is None:
+        return repo_status
+
+    ignored_dirs = parse_ignored_dirs(output)
+    excludes_file = get_excludes_file(git_dir)
+    if not repo_status.files:
+        record_clean(git_dir, ignored_dirs, excludes_file)
+    if fingerprint is not None:
+        status_cache.put(
+            git_dir,
+            fingerprint,
+            [
+                repo_status.branch,
+                repo_status.upstream,
+                list(repo_status.commit_diffs) if repo_status.commit_diffs else None,
+                repo_status.files,
+            ],
+            ignored_dirs,
+            excludes_file,
+        )
+    return repo_status
+
+
+def get_status_commit_diffs(
+    git_dir: str, status: RepoStatus, max_fetch_age: float | None = 0
+) -> tuple[int, ...]:
+    """Get the commit difference between the local repo and the origin, reusing the counts
+    from `get_repo_status` unless `origin/<branch>` was updated by fetching. Only fetches if
+    the last fetch of the repository is older than `max_fetch_age`, otherwise the existing
+    `origin/<branch>` is used.
+
+    Args:
+        git_dir: The github directory where the command will be run.
+        status: The status of the repository from `get_repo_status`.
+        max_fetch_age: The number of seconds after which the origin is fetched again (0 to
+            always fetch) or None to never fetch.
+
+    Returns:
+        The number of commits the local repo is ahead and behind the origin.
+    """
+    if not status.branch:
+        return -1, -1
+
+    last_fetch_time = get_last_fetch_time(git_dir)
+    if max_fetch_age is not None and (
+        last_fetch_time is None or time.time() - last_fetch_time >= max_fetch_age
+    ):
+        found, updated = fetch_branch(git_dir, status.branch)
+        if not found:
+            return -1, -1
+    else:
+        updated = False
+
+    if updated or status.upstream != f"origin/{status.branch}":
+        return count_commit_diffs(git_dir, status.branch)
+
+    return status.commit_diffs or (-1, -1)
+
+
+def get_cur_branch(git_dir) -> str | None:
+    """Gets the current branch the local repo is checkout into. Reads it from the `.git`
+    directory (see `refs.read_head_branch`) and only runs `git branch --show-current` if the
+    layout of the repository is not understood (see `backends`).
+
+    Args:
+        git_dir: The github directory where the command will be run.
+
+    Returns:
+        The name of the current branch or None if there was an error.
+    """
+    return call_backends("cur_branch", git_dir)
 
 
 def get_git_names(git_dirs: list[str]) -> list[str]:
@@ -350,72 +824,143 @@ def find_dirs_from_repo_names(
     return gits
 
 
-def get_all_git_dirs() -> list[str]:
-    """Gets all the local git repo clones found on the device. Uses `file . -name .git` ran on the
-    /home/$USER/ directory.
+def get_all_git_dirs(
+    exclude_dirs: list[str] | None = None, rescan: bool = False
+) -> list[str]:
+    """Gets all the local git repo clones found on the device: the ones `localgit daemon`
+    keeps up to date (see `known_git_dirs`) when it is answering the command, otherwise the
+    ones found by `scan_git_dirs`.
+
+    Args:
+        exclude_dirs: List of the directories containing github repositories to ignore. Their
+            subtrees are not walked when given.
+        rescan: Whether to ignore the index and walk the whole directory tree.
 
     Returns all the git repo clones found on the device.
     """
+    if known_git_dirs is not None and not rescan:
+        return list(known_git_dirs)
+    return scan_git_dirs(exclude_dirs, rescan)
 
-    root_dir = os.path.expanduser("~")
-    git_dirs = subprocess.check_output(
-        ["find", ".", "-name", ".git"],
-        text=True,
-        cwd=root_dir,
-    ).split("\n")
 
-    return [
-        os.path.abspath(os.path.dirname(root_dir + git_dir[1:]))
-        for git_dir in git_dirs
-        if git_dir
-    ]
+def iter_git_dirs(
+    exclude_dirs: list[str] | None = None, rescan: bool = False
+) -> Iterator[str]:
+    """Finds all the local git repo clones on the device by walking the search roots (see
+    `config.get_search_roots`, the home directory by default) with one walker per filesystem
+    (see `discovery.stream_git_dirs`). The directory trees are kept in an index (see
+    `index.get_index_path`), saved once the walks are done, so only the directories that
+    changed since the last run are listed again.
 
+    Args:
+        exclude_dirs: List of the directories containing github repositories to ignore. Their
+            subtrees are not walked when given.
+        rescan: Whether to ignore the index and walk the whole directory trees.
+
+    Yields every git repo clone found on the device as soon as it is found.
 
-def get_valid_git_dirs(exclude: list[str], exclude_dirs: list[str]) -> list[str]:
+    Raises:
+        Exception: The error a walk ran into (see `discovery.stream_git_dirs`).
+    """
+
+    matcher = ExcludeMatcher([], exclude_dirs or [])
+    prune = matcher.prune if matcher.excludes_dirs else None
+    cached = {} if rescan else load_index()
+    trees = {}
+    seen = set()
+    for found in stream_git_dirs(get_search_roots(), prune, cached, trees):
+        for git_dir in found:
+            if git_dir not in seen:
+                seen.add(git_dir)
+                yield git_dir
+    # not reached if a walk failed or the caller stopped early, which would leave the trees
+    # partial
+    save_index(trees)
+
+
+def scan_git_dirs(
+    exclude_dirs: list[str] | None = None, rescan: bool = False
+) -> list[str]:
+    """Finds all the local git repo clones on the device (see `iter_git_dirs`).
+
+    Args:
+        exclude_dirs: List of the directories containing github repositories to ignore. Their
+            subtrees are not walked when given.
+        rescan: Whether to ignore the index and walk the whole directory trees.
+
+    Returns all the git repo clones found on the device, sorted.
+    """
+    return sorted(iter_git_dirs(exclude_dirs, rescan))
+
+
+def partition_git_dirs(
+    git_dirs: list[str], exclude: list[str], exclude_dirs: list[str]
+) -> tuple[list[str], list[str]]:
+    """Splits the directories containing github repositories into the valid ones and the ones
+    excluded with the --exclude flag or environment variables in one pass (see
+    `exclusion.ExcludeMatcher`).
+
+    Args:
+        git_dirs: The directories containing github repositories.
+        exclude: List of the github repo names to exclude.
+        exclude_dirs: List of the directories containing github repositories to ignore.
+
+    Returns the valid and the excluded directories.
+    """
+    return ExcludeMatcher(exclude, exclude_dirs).partition(git_dirs)
+
+
+def get_valid_git_dirs(
+    exclude: list[str], exclude_dirs: list[str], rescan: bool = False
+) -> list[str]:
     """Gets all the valid directories containing github repositories excluding directories and
     folders specified in --exclude-dirs flag or environment variables.
 
     Args:
         exclude: List of the github repo names to exclude.
         exclude_dirs: List of the directories containing github repositories to ignore.
+        rescan: Whether to ignore the index and walk the whole directory tree.
 
     Returns all the directories containing git repositories after applying exclusion.
     """
+    all_git_dirs = get_all_git_dirs(exclude_dirs, rescan)
+    return partition_git_dirs(all_git_dirs, exclude, exclude_dirs)[0]
 
-    all_git_dirs = get_all_git_dirs()
 
-    return [
-        git_dir
-        for git_dir in all_git_dirs
-        if os.path.basename(git_dir) not in exclude
-        and not any(
-            direc in git_dir.replace(os.path.expanduser("~"), "~")
-            for direc in exclude_dirs
-        )
-    ]
+def iter_valid_git_dirs(
+    exclude: list[str], exclude_dirs: list[str], rescan: bool = False
+) -> Iterator[str]:
+    """Like `get_valid_git_dirs` but yields the directories as soon as they are found (see
+    `iter_git_dirs`), in no particular order.
+
+    Args:
+        exclude: List of the github repo names to exclude.
+        exclude_dirs: List of the directories containing github repositories to ignore.
+        rescan: Whether to ignore the index and walk the whole directory tree.
+    """
+    matcher = ExcludeMatcher(exclude, exclude_dirs)
+    if known_git_dirs is not None and not rescan:
+        git_dirs = iter(known_git_dirs)
+    else:
+        git_dirs = iter_git_dirs(exclude_dirs, rescan)
+    return (git_dir for git_dir in git_dirs if not matcher.is_excluded(git_dir))
 
 
-def get_excluded_git_dirs(exclude: list[str], exclude_dirs: list[str]) -> list[str]:
+def get_excluded_git_dirs(
+    exclude: list[str], exclude_dirs: list[str], rescan: bool = False
+) -> list[str]:
     """Gets all the directories containing github repositories that would be excluded with the
     --exclude-dirs flag or environment variables.
 
     Args:
         exclude: List of the github repo names to exclude.
         exclude_dirs: List of the directories containing github repositories to ignore.
+        rescan: Whether to ignore the index and walk the whole directory tree.
 
     Returns all the directories containing git repositories after applying exclusion.
     """
-    all_git_dirs = get_all_git_dirs()
-
-    return [
-        git_dir
-        for git_dir in all_git_dirs
-        if os.path.basename(git_dir) in exclude
-        or any(
-            direc in git_dir.replace(os.path.expanduser("~"), "~")
-            for direc in exclude_dirs
-        )
-    ]
+    all_git_dirs = get_all_git_dirs(rescan=rescan)
+    return partition_git_dirs(all_git_dirs, exclude, exclude_dirs)[1]
 
 
 def get_git_dirs(valid_git_dirs: list[str]) -> list[tuple[str, str]]:
@@ -0,0 +1,31 @@
+import pytest
+
+from src import catfile, statuscache, utils
+
+from .helpers import GIT_ENV
+
+CLEARED_ENV = (
+    "XDG_CONFIG_HOME",
+    "XDG_CACHE_HOME",
+    "LOCALGIT_ROOTS",
+    "LOCALGIT_ONE_FILE_SYSTEM",
+    "LOCALGIT_EXCLUDE_DIR",
+    "LOCALGIT_EXCLUDE_REPO",
+)
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    """Runs every test in its own home directory, git identity and localgit caches."""
+    home_dir = tmp_path / "home"
+    home_dir.mkdir()
+    monkeypatch.setenv("HOME", str(home_dir))
+    for name in CLEARED_ENV:
+        monkeypatch.delenv(name, raising=False)
+    for name, value in GIT_ENV.items():
+        monkeypatch.setenv(name, value)
+    cache = statuscache.StatusCache()
+    monkeypatch.setattr(statuscache, "status_cache", cache)
+    monkeypatch.setattr(utils, "status_cache", cache)
+    yield home_dir
+    catfile.close_cat_files()
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import time
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "localgit",
+    "GIT_AUTHOR_EMAIL": "localgit@example.com",
+    "GIT_COMMITTER_NAME": "localgit",
+    "GIT_COMMITTER_EMAIL": "localgit@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def git(work_dir: str, *args: str, stdin: str | None = None) -> str:
+    """Runs git in a repository and returns its stripped stdout."""
+    return subprocess.run(
+        ["git", "-c", "gc.auto=0", *args],
+        cwd=work_dir,
+        input=stdin,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+
+
+def make_repo(path: str, files: dict[str, str] | None = None) -> str:
+    """Creates a repository with one commit of `files` on `main`."""
+    os.makedirs(path, exist_ok=True)
+    git(path, "init", "-q", "-b", "main")
+    for name, content in (files or {"a.txt": "a\n"}).items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), "w", encoding="utf-8") as file:
+            file.write(content)
+    git(path, "add", ".")
+    git(path, "commit", "-q", "-m", "init")
+    return path
+
+
+def age_working_tree(work_dir: str) -> None:
+    """Moves the mtimes of the working tree into the past so they are not racy, which would
+    keep the in-process backends and the status cache from trusting them."""
+    past = time.time() - 60
+    for dir_path, dir_names, file_names in os.walk(work_dir):
+        dir_names[:] = [name for name in dir_names if name != ".git"]
+        for name in file_names:
+            os.utime(os.path.join(dir_path, name), (past, past))
+        os.utime(dir_path, (past, past))
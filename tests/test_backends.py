@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from src.backends import BACKENDS, OPERATIONS, Repo
+
+from .helpers import age_working_tree, git, make_repo
+
+
+def commit_file(work_dir: str, name: str, content: str) -> None:
+    with open(os.path.join(work_dir, name), "w", encoding="utf-8") as file:
+        file.write(content)
+    git(work_dir, "add", name)
+    git(work_dir, "commit", "-q", "-m", f"update {name}")
+
+
+@pytest.fixture
+def repos(tmp_path) -> dict[str, tuple[str, str]]:
+    """Clones of one remote in different states, by name, with their current branch."""
+    remote = str(tmp_path / "remote.git")
+    git(str(tmp_path), "init", "-q", "--bare", "-b", "main", remote)
+    seed = make_repo(str(tmp_path / "seed"))
+    git(seed, "remote", "add", "origin", remote)
+    git(seed, "push", "-q", "-u", "origin", "main")
+
+    def clone(name: str) -> str:
+        work_dir = str(tmp_path / name)
+        git(str(tmp_path), "clone", "-q", remote, work_dir)
+        return work_dir
+
+    diverged = clone("diverged")
+    commit_file(diverged, "local.txt", "local\n")
+    commit_file(seed, "remote.txt", "remote\n")
+    git(seed, "push", "-q")
+    git(diverged, "fetch", "-q")
+    git(diverged, "commit-graph", "write", "--reachable")
+    commit_file(diverged, "after-graph.txt", "loose\n")
+
+    dirty = clone("dirty")
+    with open(os.path.join(dirty, "a.txt"), "a", encoding="utf-8") as file:
+        file.write("more\n")
+    with open(os.path.join(dirty, "new.txt"), "w", encoding="utf-8") as file:
+        file.write("new\n")
+
+    detached = clone("detached")
+    git(detached, "checkout", "-q", "--detach")
+
+    new_branch = clone("new_branch")
+    git(new_branch, "checkout", "-q", "-b", "feature")
+    commit_file(new_branch, "feature.txt", "feature\n")
+
+    for work_dir in (diverged, dirty, detached, new_branch):
+        age_working_tree(work_dir)
+    return {
+        "diverged": (diverged, "main"),
+        "dirty": (dirty, "main"),
+        "detached": (detached, ""),
+        "new_branch": (new_branch, "feature"),
+    }
+
+
+def get_calls(branch: str) -> list[tuple[str, tuple]]:
+    calls = [("cur_branch", ()), ("unpushed_files", ())]
+    if branch:
+        calls.append(("commit_diffs", (branch,)))
+    return calls
+
+
+def call(backend_name: str, operation: str, work_dir: str, *args):
+    return getattr(BACKENDS[backend_name], OPERATIONS[operation])(Repo(work_dir), *args)
+
+
+@pytest.mark.parametrize("backend_name", sorted(BACKENDS))
+def test_backends_agree_with_subprocess(repos, backend_name):
+    for work_dir, branch in repos.values():
+        for operation, args in get_calls(branch):
+            # first, since `git status` records clean repositories for the other backends
+            expected = call("subprocess", operation, work_dir, *args)
+            result = call(backend_name, operation, work_dir, *args)
+            assert result is None or result == expected, (work_dir, operation)
+
+
+@pytest.mark.parametrize("backend_name", ["python", "batched"])
+def test_in_process_backends_answer(repos, backend_name):
+    work_dir, branch = repos["diverged"]
+    call("subprocess", "unpushed_files", work_dir)  # records the repository as clean
+
+    assert call(backend_name, "cur_branch", work_dir) == "main"
+    assert call(backend_name, "unpushed_files", work_dir) == []
+    assert call(backend_name, "commit_diffs", work_dir, branch) == (2, 1)
+    assert call(backend_name, "cur_branch", repos["detached"][0]) == ""
+    git(repos["new_branch"][0], "commit-graph", "write", "--reachable")
+    assert call(backend_name, "commit_diffs", *repos["new_branch"]) == (-1, -1)
+    # possibly dirty, so only git can tell
+    assert call(backend_name, "unpushed_files", repos["dirty"][0]) is None
+
+
+def test_only_batched_reads_packed_commits(repos):
+    work_dir, branch = repos["diverged"]
+    git(work_dir, "repack", "-d", "-q")
+
+    assert call("python", "commit_diffs", work_dir, branch) is None
+    assert call("batched", "commit_diffs", work_dir, branch) == (2, 1)
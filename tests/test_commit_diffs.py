@@ -0,0 +1,156 @@
+import os
+import time
+
+import pytest
+
+from src import utils
+from src.localgit import run_status
+from src.parsers import DEFAULT_MAX_FETCH_AGE, setup_parser
+from src.refs import get_last_fetch_time
+from src.utils import get_repo_status, get_status_commit_diffs
+
+from .helpers import git, make_repo
+
+
+class Remote:
+    """A bare remote with a clone that pushes to it as the other side of the fetches."""
+
+    def __init__(self, path):
+        self.path = path
+        self.seed = make_repo(str(path / "seed"))
+        self.bare = str(path / "remote.git")
+        git(str(path), "clone", "-q", "--bare", self.seed, self.bare)
+        git(self.seed, "remote", "add", "origin", self.bare)
+
+    def clone(self, name: str = "local") -> str:
+        work_dir = str(self.path / name)
+        git(str(self.path), "clone", "-q", self.bare, work_dir)
+        return work_dir
+
+    def push(self) -> None:
+        git(self.seed, "commit", "-q", "--allow-empty", "-m", "remote")
+        git(self.seed, "push", "-q", "origin", "main")
+
+
+@pytest.fixture
+def remote(tmp_path) -> Remote:
+    return Remote(tmp_path)
+
+
+@pytest.fixture
+def fetches(monkeypatch) -> list[str]:
+    """The repositories `get_status_commit_diffs` fetched."""
+    fetches = []
+    fetch_branch = utils.fetch_branch
+
+    def recording_fetch_branch(git_dir: str, cur_branch: str) -> tuple[bool, bool]:
+        fetches.append(git_dir)
+        return fetch_branch(git_dir, cur_branch)
+
+    monkeypatch.setattr(utils, "fetch_branch", recording_fetch_branch)
+    return fetches
+
+
+def age_fetch_head(work_dir: str, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(os.path.join(work_dir, ".git", "FETCH_HEAD"), (past, past))
+
+
+def get_commit_diffs(work_dir: str, max_fetch_age: float | None):
+    return get_status_commit_diffs(work_dir, get_repo_status(work_dir), max_fetch_age)
+
+
+def test_last_fetch_time(remote):
+    work_dir = remote.clone()
+    assert get_last_fetch_time(work_dir) is None
+
+    git(work_dir, "fetch", "-q")
+    fetch_head = os.path.join(work_dir, ".git", "FETCH_HEAD")
+    assert get_last_fetch_time(work_dir) == os.stat(fetch_head).st_mtime
+    age_fetch_head(work_dir, 600)
+    assert time.time() - get_last_fetch_time(work_dir) == pytest.approx(600, abs=5)
+
+
+def test_last_fetch_time_of_a_worktree(remote):
+    work_dir = remote.clone()
+    worktree = str(remote.path / "worktree")
+    git(work_dir, "worktree", "add", "-q", "-b", "feature", worktree)
+    assert get_last_fetch_time(worktree) is None
+
+    # fetched from either worktree
+    git(work_dir, "fetch", "-q")
+    assert get_last_fetch_time(worktree) is not None
+
+
+def test_never_fetched_repos_are_fetched(remote, fetches):
+    work_dir = remote.clone()
+    remote.push()
+    assert get_commit_diffs(work_dir, DEFAULT_MAX_FETCH_AGE) == (0, 1)
+    assert fetches == [work_dir]
+
+
+def test_recent_fetch_is_reused(remote, fetches):
+    work_dir = remote.clone()
+    git(work_dir, "fetch", "-q")
+    remote.push()
+
+    # the remote commit is not known until the origin is fetched again
+    assert get_commit_diffs(work_dir, DEFAULT_MAX_FETCH_AGE) == (0, 0)
+    assert fetches == []
+
+    age_fetch_head(work_dir, DEFAULT_MAX_FETCH_AGE + 1)
+    assert get_commit_diffs(work_dir, DEFAULT_MAX_FETCH_AGE) == (0, 1)
+    assert fetches == [work_dir]
+
+
+def test_zero_always_fetches(remote, fetches):
+    work_dir = remote.clone()
+    git(work_dir, "fetch", "-q")
+    remote.push()
+    assert get_commit_diffs(work_dir, 0) == (0, 1)
+    assert get_commit_diffs(work_dir, 0) == (0, 1)
+    assert fetches == [work_dir, work_dir]
+
+
+def test_no_fetch(remote, fetches):
+    work_dir = remote.clone()
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "local")
+    remote.push()
+
+    # even a repo that was never fetched uses the origin/main it has
+    assert get_last_fetch_time(work_dir) is None
+    assert get_commit_diffs(work_dir, None) == (1, 0)
+    assert fetches == []
+
+
+def test_branch_missing_from_the_origin(remote, fetches):
+    work_dir = remote.clone()
+    git(work_dir, "checkout", "-q", "-b", "local-only")
+    assert get_commit_diffs(work_dir, 0) == (-1, -1)
+    assert get_commit_diffs(work_dir, None) == (-1, -1)
+    assert fetches == [work_dir]
+
+
+@pytest.mark.parametrize(
+    "options, fetched",
+    [
+        ([], True),
+        (["--max-fetch-age", "0"], True),
+        (["--max-fetch-age", "3600"], False),
+        (["--no-fetch"], False),
+        (["--no-fetch", "--max-fetch-age", "0"], False),
+    ],
+)
+def test_options(remote, fetches, capsys, options, fetched):
+    work_dir = remote.clone()
+    git(work_dir, "fetch", "-q")
+    # older than the default but not an hour
+    age_fetch_head(work_dir, DEFAULT_MAX_FETCH_AGE + 1)
+    remote.push()
+
+    parser = setup_parser(*[None] * 6)
+    args = parser.parse_args(["status", "--commit-diffs", "--no-cache", *options])
+    # without the fetch the remote commit is not known
+    assert run_status(args, [("local", work_dir)]) == int(fetched)
+    assert fetches == ([work_dir] if fetched else [])
+    assert ("Behind:1" in capsys.readouterr().out) == fetched
@@ -0,0 +1,172 @@
+import os
+import random
+
+import pytest
+
+from src import catfile
+from src.commitgraph import get_commit_diffs_from_graph
+
+from .helpers import git
+
+NUM_HISTORIES = 12
+
+
+def init_repo(path) -> str:
+    work_dir = str(path)
+    os.makedirs(work_dir)
+    git(work_dir, "init", "-q", "-b", "main")
+    return work_dir
+
+
+def add_commits(
+    work_dir: str, rng: random.Random, commits: list[str], num_commits: int
+) -> None:
+    """Adds commits on the empty tree with random parents among the existing commits: mostly
+    one, sometimes two (merges) or three to four (octopus merges), and a few new roots.
+    """
+    tree = git(work_dir, "mktree", stdin="")
+    for _ in range(num_commits):
+        if not commits or rng.random() < 0.05:
+            num_parents = 0
+        else:
+            num_parents = rng.choices((1, 2, 3, 4), weights=(70, 20, 6, 4))[0]
+        # biased towards recent commits so the histories are deep rather than wide
+        parents = {
+            commits[max(0, len(commits) - 1 - int(rng.expovariate(0.2)))]
+            for _ in range(num_parents)
+        }
+        args = [arg for parent in sorted(parents) for arg in ("-p", parent)]
+        commits.append(
+            git(work_dir, "commit-tree", tree, *args, "-m", f"c{len(commits)}")
+        )
+
+
+def set_branches(work_dir: str, left: str, right: str) -> None:
+    git(work_dir, "update-ref", "refs/heads/main", left)
+    git(work_dir, "update-ref", "refs/remotes/origin/main", right)
+
+
+def rev_list_counts(work_dir: str) -> tuple[int, int]:
+    output = git(work_dir, "rev-list", "--left-right", "--count", "main...origin/main")
+    ahead, behind = output.split("\t")
+    return int(ahead), int(behind)
+
+
+def write_graph(work_dir: str, *args: str) -> None:
+    git(work_dir, "commit-graph", "write", "--reachable", *args)
+
+
+@pytest.mark.parametrize("seed", range(NUM_HISTORIES))
+def test_random_histories_match_rev_list(tmp_path, seed):
+    rng = random.Random(seed)
+    work_dir = init_repo(tmp_path / "repo")
+    commits = []
+    add_commits(work_dir, rng, commits, 80)
+
+    for _ in range(5):
+        set_branches(work_dir, rng.choice(commits), rng.choice(commits))
+        write_graph(work_dir)
+        assert get_commit_diffs_from_graph(work_dir, "main") == rev_list_counts(
+            work_dir
+        )
+
+
+def test_octopus_merge(tmp_path):
+    work_dir = init_repo(tmp_path / "repo")
+    tree = git(work_dir, "mktree", stdin="")
+    base = git(work_dir, "commit-tree", tree, "-m", "base")
+    tips = [
+        git(work_dir, "commit-tree", tree, "-p", base, "-m", f"side{idx}")
+        for idx in range(4)
+    ]
+    octopus = git(
+        work_dir,
+        "commit-tree",
+        tree,
+        *[arg for tip in tips[:3] for arg in ("-p", tip)],
+        "-m",
+        "octopus",
+    )
+    set_branches(work_dir, octopus, tips[3])
+    write_graph(work_dir)
+
+    assert get_commit_diffs_from_graph(work_dir, "main") == (4, 1)
+    assert rev_list_counts(work_dir) == (4, 1)
+
+
+def test_same_and_ancestor_commits(tmp_path):
+    rng = random.Random(0)
+    work_dir = init_repo(tmp_path / "repo")
+    commits = []
+    add_commits(work_dir, rng, commits, 20)
+    set_branches(work_dir, commits[-1], commits[-1])
+    write_graph(work_dir)
+
+    for left, right in ((commits[-1], commits[-1]), (commits[-1], commits[0])):
+        set_branches(work_dir, left, right)
+        assert get_commit_diffs_from_graph(work_dir, "main") == rev_list_counts(
+            work_dir
+        )
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_split_graph_chain(tmp_path, seed):
+    rng = random.Random(seed)
+    work_dir = init_repo(tmp_path / "repo")
+    commits = []
+    for _ in range(3):
+        add_commits(work_dir, rng, commits, 30)
+        set_branches(work_dir, commits[-1], commits[-1])
+        write_graph(work_dir, "--split=no-merge")
+
+    chain = os.path.join(work_dir, ".git", "objects", "info", "commit-graphs")
+    with open(os.path.join(chain, "commit-graph-chain"), encoding="utf-8") as file:
+        assert len(file.read().split()) == 3
+
+    for _ in range(5):
+        set_branches(work_dir, rng.choice(commits), rng.choice(commits))
+        assert get_commit_diffs_from_graph(work_dir, "main") == rev_list_counts(
+            work_dir
+        )
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_commits_written_after_the_graph(tmp_path, seed):
+    rng = random.Random(seed)
+    work_dir = init_repo(tmp_path / "repo")
+    commits = []
+    add_commits(work_dir, rng, commits, 40)
+    set_branches(work_dir, commits[-1], commits[-1])
+    write_graph(work_dir)
+    add_commits(work_dir, rng, commits, 30)
+
+    # loose commits
+    tips = [(rng.choice(commits[40:]), rng.choice(commits)) for _ in range(3)]
+    for left, right in tips:
+        set_branches(work_dir, left, right)
+        expected = rev_list_counts(work_dir)
+        assert get_commit_diffs_from_graph(work_dir, "main", batched=False) == expected
+        assert get_commit_diffs_from_graph(work_dir, "main") == expected
+
+    # packed commits, only read through `git cat-file --batch`
+    git(work_dir, "repack", "-d", "-q")
+    for left, right in tips:
+        set_branches(work_dir, left, right)
+        assert get_commit_diffs_from_graph(work_dir, "main", batched=False) is None
+        assert get_commit_diffs_from_graph(work_dir, "main") == rev_list_counts(
+            work_dir
+        )
+        # the git process is stopped once the walk is done
+        assert catfile.cat_files == {}
+
+
+def test_falls_back_without_graph_or_branch(tmp_path):
+    rng = random.Random(0)
+    work_dir = init_repo(tmp_path / "repo")
+    commits = []
+    add_commits(work_dir, rng, commits, 5)
+    git(work_dir, "update-ref", "refs/heads/main", commits[-1])
+
+    assert get_commit_diffs_from_graph(work_dir, "main") is None
+    write_graph(work_dir)
+    assert get_commit_diffs_from_graph(work_dir, "main") == (-1, -1)
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from src.config import (
+    SearchRoot,
+    get_config_path,
+    get_search_roots,
+    load_config,
+    parse_env_root,
+)
+
+
+def write_config(text: str) -> None:
+    path = get_config_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+@pytest.mark.parametrize(
+    "entry, root",
+    [
+        ("~/code:3", {"path": "~/code", "max_depth": 3}),
+        ("~/code", {"path": "~/code"}),
+        ("/mnt/a:b", {"path": "/mnt/a:b"}),
+        ("/mnt/a:b:0", {"path": "/mnt/a:b", "max_depth": 0}),
+        ("/mnt/data:", {"path": "/mnt/data:"}),
+        (":2", {"path": ":2"}),
+    ],
+)
+def test_parse_env_root(entry, root):
+    assert parse_env_root(entry) == root
+
+
+def test_config_path(home, monkeypatch, tmp_path):
+    assert get_config_path() == str(home / ".config" / "localgit" / "config.toml")
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "xdg"))
+    assert get_config_path() == str(tmp_path / "xdg" / "localgit" / "config.toml")
+
+
+def test_defaults_to_home(home):
+    assert load_config() == {}
+    assert get_search_roots() == [SearchRoot(str(home), None, False)]
+
+
+def test_env_roots(home, monkeypatch):
+    write_config('roots = ["/ignored"]\n')
+    monkeypatch.setenv("LOCALGIT_ROOTS", "~/code:2;;/srv/repos")
+    assert get_search_roots() == [
+        SearchRoot(str(home / "code"), 2, False),
+        SearchRoot("/srv/repos", None, False),
+    ]
+
+
+def test_config_roots(home, monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "xdg"))
+    write_config(
+        "one_file_system = true\n"
+        'roots = ["~/code", {path = "/mnt/nas", max_depth = 1, one_file_system = false,'
+        ' concurrency = 8}, {max_depth = 2}, {path = "/a", max_depth = "2"},'
+        ' {path = "/b", concurrency = 0}, 3]\n'
+    )
+    assert get_search_roots() == [
+        SearchRoot(str(home / "code"), None, True),
+        SearchRoot("/mnt/nas", 1, False, 8),
+    ]
+    assert capsys.readouterr().err.count("Ignoring the invalid search root") == 4
+
+
+@pytest.mark.parametrize(
+    "roots",
+    [
+        '"~/src"',
+        '{path = "~/src"}',
+        '[{path = "~/src", max_depth = true}]',
+        '[{path = "~/src", concurrency = false}]',
+    ],
+)
+def test_invalid_roots_are_not_walked(capsys, roots):
+    write_config(f"roots = {roots}\n")
+    assert get_search_roots() == []
+    assert "Ignoring the invalid search root" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "config, env, one_file_system",
+    [
+        ("", None, False),
+        ("one_file_system = true\n", None, True),
+        ("one_file_system = true\n", "0", False),
+        ("one_file_system = true\n", "", False),
+        ("", "1", True),
+    ],
+)
+def test_one_file_system(home, monkeypatch, config, env, one_file_system):
+    write_config(config + 'roots = ["~", {path = "/srv", one_file_system = true}]\n')
+    if env is not None:
+        monkeypatch.setenv("LOCALGIT_ONE_FILE_SYSTEM", env)
+    assert get_search_roots() == [
+        SearchRoot(str(home), None, one_file_system),
+        SearchRoot("/srv", None, True),
+    ]
+
+
+def test_invalid_config_is_ignored(home, capsys):
+    write_config("roots = [\n")
+    assert load_config() == {}
+    assert "Ignoring the config file" in capsys.readouterr().err
+    assert get_search_roots() == [SearchRoot(str(home), None, False)]
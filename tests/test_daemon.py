@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from src import daemon, executor
+from src.daemon import ReportMemo, RepoWatcher
+from src.records import emit_record, retime_records
+
+from .helpers import git, make_repo
+
+
+class Counter:
+    """A command for `ReportMemo.run` counting how often it runs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self) -> tuple[int, str]:
+        self.calls += 1
+        return 0, f"output {self.calls}\n"
+
+
+def test_memo_keeps_results_until_invalidated():
+    memo = ReportMemo()
+    memo.watched.add("/repo")
+    memo.query = "status"
+    command = Counter()
+
+    assert memo.run("/repo", command) == (0, "output 1\n")
+    assert memo.run("/repo", command) == (0, "output 1\n")
+    memo.query = "list"
+    assert memo.run("/repo", command) == (0, "output 2\n")
+
+    memo.invalidate("/repo")
+    memo.query = "status"
+    assert memo.run("/repo", command) == (0, "output 3\n")
+    assert command.calls == 3
+
+
+def test_memo_skips_unwatched_and_changed_repos():
+    memo = ReportMemo()
+    command = Counter()
+    memo.run("/unwatched", command)
+    memo.run("/unwatched", command)
+    assert command.calls == 2
+
+    memo.watched.add("/repo")
+
+    def changing() -> tuple[int, str]:
+        memo.invalidate("/repo")  # a change while the command runs
+        return command()
+
+    memo.run("/repo", changing)
+    memo.run("/repo", command)
+    assert command.calls == 4
+
+
+def test_retime_records():
+    output = 'text line\n{"path": "/repo", "seconds": 3.5}\n{"path": "/other"}\n'
+    lines = retime_records(output, 0.25).splitlines()
+    assert lines[0] == "text line"
+    assert json.loads(lines[1])["seconds"] == 0.25
+    assert "seconds" not in json.loads(lines[2])
+
+
+def test_memo_hits_are_retimed(tmp_path, monkeypatch, capsys):
+    memo = ReportMemo()
+    memo.watched.add(str(tmp_path))
+    monkeypatch.setattr(executor, "report_memo", memo)
+
+    def report(git_dir: str, git_name: str) -> int:
+        time.sleep(0.2)
+        emit_record(git_dir, git_name, status="up_to_date")
+        return 0
+
+    gits = [("repo", str(tmp_path))]
+    for _ in range(2):
+        executor.run_repos(report, gits, output_format="ndjson")
+    first, second = (json.loads(line) for line in capsys.readouterr().out.splitlines())
+    assert first["seconds"] >= 0.2
+    assert second["seconds"] < 0.2
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    """A `RepoWatcher` whose repositories are the ones in `found`."""
+    found = []
+    monkeypatch.setattr(daemon, "scan_git_dirs", lambda: list(found))
+    watcher = RepoWatcher(ReportMemo())
+    watcher.found = found
+    yield watcher
+    watcher.inotify.close()
+
+
+def is_kept(watcher: RepoWatcher, work_dir: str) -> bool:
+    watcher.drain()
+    return bool(watcher.memo.results.get(work_dir))
+
+
+def keep(watcher: RepoWatcher, work_dir: str) -> None:
+    watcher.memo.run(work_dir, Counter())
+    assert is_kept(watcher, work_dir)
+
+
+def test_changes_invalidate_the_repo(tmp_path, watcher):
+    work_dir = make_repo(str(tmp_path / "repo"), {"a.txt": "a\n", "sub/b.txt": "b\n"})
+    other = make_repo(str(tmp_path / "other"))
+    watcher.found.extend([work_dir, other])
+    assert watcher.refresh() == 2
+    assert watcher.memo.watched == {work_dir, other}
+
+    keep(watcher, work_dir)
+    keep(watcher, other)
+    with open(os.path.join(work_dir, "sub", "b.txt"), "a", encoding="utf-8") as file:
+        file.write("more\n")
+    assert not is_kept(watcher, work_dir)
+    assert is_kept(watcher, other)
+
+    keep(watcher, work_dir)
+    git(work_dir, "commit", "-q", "-am", "more")
+    assert not is_kept(watcher, work_dir)
+
+    keep(watcher, work_dir)
+    git(work_dir, "checkout", "-q", "-b", "feature")
+    assert not is_kept(watcher, work_dir)
+
+    # files in new directories are watched too
+    os.makedirs(os.path.join(work_dir, "new"))
+    watcher.drain()
+    keep(watcher, work_dir)
+    with open(os.path.join(work_dir, "new", "c.txt"), "w", encoding="utf-8") as file:
+        file.write("c\n")
+    assert not is_kept(watcher, work_dir)
+
+
+def test_gone_repos_are_unwatched(tmp_path, watcher):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    moved = str(tmp_path / "moved")
+    watcher.found.append(work_dir)
+    watcher.refresh()
+    keep(watcher, work_dir)
+    assert watcher.repos
+
+    shutil.move(work_dir, moved)
+    watcher.found[:] = [moved]
+    watcher.refresh()
+    watcher.drain()
+    assert watcher.known == {moved}
+    assert watcher.memo.watched == {moved}
+    assert work_dir not in watcher.memo.results
+    assert work_dir not in watcher.memo.generations
+    assert work_dir not in watcher.num_watches
+    assert all(work_dirs == {moved} for work_dirs in watcher.repos.values())
+
+    watcher.found.clear()
+    watcher.refresh()
+    watcher.drain()
+    assert not watcher.known and not watcher.repos and not watcher.paths
+
+
+def write_file(path: str, content: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def test_ignored_directories_are_not_watched(tmp_path, watcher):
+    work_dir = make_repo(str(tmp_path / "repo"), {".gitignore": "build/\n"})
+    os.makedirs(os.path.join(work_dir, "build"))
+    watcher.found.append(work_dir)
+    watcher.refresh()
+
+    keep(watcher, work_dir)
+    write_file(os.path.join(work_dir, "build", "out.o"), "out\n")
+    assert is_kept(watcher, work_dir)
+
+
+@pytest.mark.parametrize("ignore_file", [".gitignore", ".git/info/exclude", "global"])
+def test_changed_ignore_rules_watch_the_repo_again(
+    tmp_path, home, watcher, ignore_file
+):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    os.makedirs(os.path.join(work_dir, "build", "sub"))
+    if ignore_file == "global":
+        path = str(home / ".gitignore_global")
+        write_file(str(home / ".gitconfig"), f"[core]\n\texcludesFile = {path}\n")
+    else:
+        path = os.path.join(work_dir, ignore_file)
+    write_file(path, "build/\n")
+    watcher.found.append(work_dir)
+    watcher.refresh()
+    keep(watcher, work_dir)
+    write_file(os.path.join(work_dir, "build", "sub", "out.o"), "out\n")
+    assert is_kept(watcher, work_dir)
+
+    # the directory is not ignored anymore
+    write_file(path, "*.log\n")
+    assert not is_kept(watcher, work_dir)
+    keep(watcher, work_dir)
+    write_file(os.path.join(work_dir, "build", "sub", "out.o"), "changed\n")
+    assert not is_kept(watcher, work_dir)
+
+    # and is not watched again when ignored again
+    write_file(path, "build/\n")
+    watcher.drain()
+    keep(watcher, work_dir)
+    write_file(os.path.join(work_dir, "build", "sub", "out.o"), "again\n")
+    assert is_kept(watcher, work_dir)
+
+
+def test_rewatched_repos_are_unwatched(tmp_path, home, watcher):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    watcher.found.append(work_dir)
+    watcher.refresh()
+    write_file(os.path.join(work_dir, ".gitignore"), "build/\n")
+    watcher.drain()
+    assert watcher.ignore_files
+
+    watcher.found.clear()
+    watcher.refresh()
+    watcher.drain()
+    assert not watcher.repos and not watcher.paths and not watcher.ignore_files
@@ -0,0 +1,81 @@
+import os
+import subprocess
+
+import pytest
+
+from src import utils
+from src.dirty import get_excludes_file, is_clean
+
+from .helpers import age_working_tree, git, make_repo
+
+
+def git_excludes_file(work_dir: str) -> str:
+    path = git(work_dir, "config", "--path", "core.excludesFile")
+    return os.path.join(work_dir, path)
+
+
+@pytest.mark.parametrize(
+    "configs",
+    [
+        {},
+        {"global": "~/.ignore_global"},
+        {"xdg": "/etc/ignore_xdg"},
+        {"xdg": "/etc/ignore_xdg", "global": "~/.ignore_global"},
+        {"global": "~/.ignore_global", "local": "local_ignore"},
+        {"local": "~/.ignore_local"},
+    ],
+)
+def test_excludes_file_is_read_like_git(home, tmp_path, configs):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    paths = {
+        "global": str(home / ".gitconfig"),
+        "xdg": str(home / ".config" / "git" / "config"),
+        "local": os.path.join(work_dir, ".git", "config"),
+    }
+    for scope, value in configs.items():
+        os.makedirs(os.path.dirname(paths[scope]), exist_ok=True)
+        with open(paths[scope], "a", encoding="utf-8") as file:
+            file.write(f"[core]\n\texcludesFile = {value}\n")
+
+    excludes_file = get_excludes_file(work_dir)
+    if configs:
+        assert excludes_file == git_excludes_file(work_dir)
+    else:
+        assert excludes_file == str(home / ".config" / "git" / "ignore")
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    """The git commands started during the test."""
+    spawned = []
+    popen = subprocess.Popen
+
+    def recording_popen(args, *rest, **kwargs):
+        spawned.append(args[:2])
+        return popen(args, *rest, **kwargs)
+
+    monkeypatch.setattr(subprocess, "Popen", recording_popen)
+    return spawned
+
+
+def test_status_of_a_dirty_repo_runs_only_git_status(tmp_path, spawned):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    with open(os.path.join(work_dir, "new.txt"), "w", encoding="utf-8") as file:
+        file.write("new\n")
+    age_working_tree(work_dir)
+    spawned.clear()
+
+    assert utils.get_repo_status(work_dir).files
+    assert spawned == [["git", "status"]]
+
+
+def test_changed_excludes_file_is_recorded_again(home, tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    age_working_tree(work_dir)
+    git(work_dir, "status")
+    assert not utils.get_repo_status(work_dir).files
+    assert is_clean(work_dir)
+
+    with open(home / ".gitconfig", "a", encoding="utf-8") as file:
+        file.write("[core]\n\texcludesFile = ~/.ignore_global\n")
+    assert not is_clean(work_dir)
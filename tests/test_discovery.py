@@ -0,0 +1,196 @@
+import os
+import threading
+
+import pytest
+
+from src import discovery, executor, index, utils
+from src.config import SearchRoot
+from src.discovery import stream_git_dirs
+
+from .helpers import make_repo
+
+WAIT_SECONDS = 10
+
+
+def collect(roots: list[SearchRoot], prune=None) -> list[str]:
+    return sorted(
+        git_dir for found in stream_git_dirs(roots, prune, {}, {}) for git_dir in found
+    )
+
+
+class FakeStat:
+    """The stat of a directory with another device, to stand for another filesystem."""
+
+    def __init__(self, stat: os.stat_result, device: int):
+        self.stat = stat
+        self.st_dev = device
+
+    def __getattr__(self, name: str):
+        return getattr(self.stat, name)
+
+
+@pytest.fixture
+def devices(monkeypatch):
+    """Maps directories to fake devices."""
+    devices = {}
+    stat = os.stat
+
+    def fake_stat(path, *args, **kwargs):
+        result = stat(path, *args, **kwargs)
+        if path in devices:
+            return FakeStat(result, devices[path])
+        return result
+
+    monkeypatch.setattr(discovery.os, "stat", fake_stat)
+    return devices
+
+
+def test_roots_and_max_depth(tmp_path):
+    make_repo(str(tmp_path / "a" / "repo"))
+    make_repo(str(tmp_path / "a" / "x" / "y" / "deep"))
+    make_repo(str(tmp_path / "b" / "other"))
+
+    roots = [
+        SearchRoot(str(tmp_path / "a"), 2, False),
+        SearchRoot(str(tmp_path / "b"), None, False),
+        SearchRoot(str(tmp_path / "missing"), None, False),
+    ]
+    assert collect(roots) == [
+        str(tmp_path / "a" / "repo"),
+        str(tmp_path / "b" / "other"),
+    ]
+    roots[0] = SearchRoot(str(tmp_path / "a"), None, False)
+    assert str(tmp_path / "a" / "x" / "y" / "deep") in collect(roots)
+
+
+def test_one_walker_per_device(tmp_path, devices):
+    slow = make_repo(str(tmp_path / "slow" / "repo"))
+    fast = make_repo(str(tmp_path / "fast" / "repo"))
+    devices[str(tmp_path / "slow")] = 1
+    devices[str(tmp_path / "fast")] = 2
+    fast_found = threading.Event()
+
+    def prune(path: str) -> bool:
+        # the walker of the slow filesystem waits until the other one found its repository
+        if path.startswith(str(tmp_path / "slow")):
+            assert fast_found.wait(WAIT_SECONDS)
+        return False
+
+    roots = [
+        SearchRoot(str(tmp_path / "slow"), None, False),
+        SearchRoot(str(tmp_path / "fast"), None, False),
+    ]
+    found = []
+    for git_dirs in stream_git_dirs(roots, prune, {}, {}):
+        found.extend(git_dirs)
+        if fast in git_dirs:
+            fast_found.set()
+    assert found == [fast, slow]
+
+
+def test_walker_errors_are_raised(tmp_path, devices):
+    make_repo(str(tmp_path / "ok" / "repo"))
+    make_repo(str(tmp_path / "broken" / "repo"))
+    devices[str(tmp_path / "ok")] = 1
+    devices[str(tmp_path / "broken")] = 2
+
+    def prune(path: str) -> bool:
+        if path.startswith(str(tmp_path / "broken")):
+            raise PermissionError(path)
+        return False
+
+    roots = [
+        SearchRoot(str(tmp_path / "ok"), None, False),
+        SearchRoot(str(tmp_path / "broken"), None, False),
+    ]
+    with pytest.raises(PermissionError):
+        collect(roots, prune)
+
+
+def test_failed_discovery_does_not_save_the_index(tmp_path, monkeypatch):
+    make_repo(str(tmp_path / "code" / "repo"))
+    monkeypatch.setenv("LOCALGIT_ROOTS", str(tmp_path / "code"))
+
+    def failing_walk(*args, **kwargs):
+        raise PermissionError("walk")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(discovery, "walk_git_dirs", failing_walk)
+        with pytest.raises(PermissionError):
+            utils.scan_git_dirs()
+    assert not os.path.exists(index.get_index_path())
+
+    assert utils.scan_git_dirs() == [str(tmp_path / "code" / "repo")]
+    assert os.path.exists(index.get_index_path())
+
+
+@pytest.mark.parametrize("order", executor.ORDERS)
+def test_streamed_errors_are_raised_after_the_submitted_repos(order):
+    def gits():
+        yield "a", "/a"
+        yield "b", "/b"
+        raise PermissionError("discovery")
+
+    handled = []
+
+    def report(git_dir: str, git_name: str) -> int:
+        handled.append(git_name)
+        return 0
+
+    with pytest.raises(PermissionError):
+        executor.run_repos(report, gits(), jobs=2, order=order)
+    assert sorted(handled) == ["a", "b"]
+
+
+def write_file(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def test_walker_finds_repos_like_find(tmp_path):
+    top = tmp_path / "top"
+    repo = make_repo(str(top / "a" / "repo"))
+    # a repository in the working tree of another one is not looked for, unless it is a
+    # submodule
+    make_repo(str(top / "a" / "repo" / "vendored"))
+    write_file(
+        os.path.join(repo, ".gitmodules"),
+        '[submodule "lib"]\n\tpath = lib\n[submodule "gone"]\n\tpath = gone\n',
+    )
+    write_file(os.path.join(repo, "lib", ".git"), "gitdir: ../.git/modules/lib\n")
+    write_file(os.path.join(repo, "lib", ".gitmodules"), "[submodule]\n\tpath = sub\n")
+    write_file(os.path.join(repo, "lib", "sub", ".git"), "gitdir: x\n")
+    # a worktree has a `.git` file
+    write_file(str(top / "b" / "worktree" / ".git"), "gitdir: /elsewhere\n")
+    # symlinks are not followed
+    os.symlink(str(top / "a"), str(top / "b" / "link"))
+    make_repo(str(top / "c" / "d" / "e" / "deep"))
+
+    git_dirs, tree = discovery.parallel_walk_git_dirs(str(top))
+    assert git_dirs == sorted(
+        [
+            repo,
+            os.path.join(repo, "lib"),
+            os.path.join(repo, "lib", "sub"),
+            str(top / "b" / "worktree"),
+            str(top / "c" / "d" / "e" / "deep"),
+        ]
+    )
+    assert tree is not None and set(tree[2]) == {"a", "b", "c"}
+
+    git_dirs, _ = discovery.parallel_walk_git_dirs(str(top), max_depth=2)
+    assert str(top / "c" / "d" / "e" / "deep") not in git_dirs
+    assert repo in git_dirs
+
+    git_dirs, _ = discovery.parallel_walk_git_dirs(
+        str(top), prune=lambda path: path.endswith(os.sep + "c")
+    )
+    assert str(top / "c" / "d" / "e" / "deep") not in git_dirs
+
+
+def test_root_that_is_a_repo(tmp_path):
+    root = make_repo(str(tmp_path / "dotfiles"))
+    other = make_repo(str(tmp_path / "dotfiles" / "code" / "other"))
+    git_dirs, _ = discovery.parallel_walk_git_dirs(root)
+    assert git_dirs == [root, other]
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from src.exclusion import ExcludeMatcher
+
+HOME = "/home/user"
+
+
+def is_excluded(entry: str, path: str) -> bool:
+    return ExcludeMatcher([], [entry], HOME).is_excluded(path)
+
+
+@pytest.mark.parametrize(
+    "entry, path, excluded",
+    [
+        # plain entries are substrings of the path with the home directory as `~`
+        ("~/.cache", "/home/user/.cache", True),
+        ("~/.cache", "/home/user/.cache/plug/repo", True),
+        ("~/.cache", "/home/user/.cache-old/repo", True),
+        ("~/.cache", "/home/user/code/repo", False),
+        ("~/.cache/", "/home/user/.cache", False),
+        ("~/.cache/", "/home/user/.cache/repo", True),
+        ("/home/user/.cache", "/home/user/.cache/repo", True),
+        ("/mnt/data", "/mnt/data/repo", True),
+        ("/mnt/data", "/mnt/other/repo", False),
+        ("node_modules", "/home/user/a/node_modules/pkg", True),
+        ("node_modules", "/home/user/a/node_modules_old/pkg", True),
+        ("old", "/home/user/code/project-old", True),
+        ("user", "/home/user/code/repo", False),
+        (".local/share/nvim", "/home/user/.local/share/nvim/lazy/plugin", True),
+        # anchored globs
+        ("~/work/*-old", "/home/user/work/project-old", True),
+        ("~/work/*-old", "/home/user/work/project-old/sub", True),
+        ("~/work/*-old", "/home/user/work/project-older", False),
+        ("~/work/*-old", "/home/user/other/work/project-old", False),
+        ("~/work/*/", "/home/user/work/project", False),
+        ("~/work/*/", "/home/user/work/project/sub", True),
+        ("/srv/*/cache", "/srv/app/cache/repo", True),
+        ("/srv/*/cache", "/srv/app/sub/cache/repo", False),
+        # floating globs
+        ("*.egg-info", "/home/user/code/pkg.egg-info/repo", True),
+        ("*.egg-info", "/home/user/code/egg-info/repo", False),
+        ("vendor/[ab]*", "/home/user/code/vendor/alpha", True),
+        ("vendor/[ab]*", "/home/user/code/vendor/gamma", False),
+    ],
+)
+def test_entries(entry, path, excluded):
+    assert is_excluded(entry, path) == excluded
+
+
+def test_names_and_empty_entries():
+    matcher = ExcludeMatcher(["skip"], ["", "  "], HOME)
+    assert not matcher.excludes_dirs
+    assert matcher.is_excluded("/home/user/code/skip")
+    assert not matcher.is_excluded("/home/user/code/keep")
+
+
+def test_partition():
+    matcher = ExcludeMatcher(["skip"], ["~/.cache", "*-old"], HOME)
+    git_dirs = [
+        "/home/user/code/a",
+        "/home/user/code/skip",
+        "/home/user/.cache/b",
+        "/home/user/code/c-old",
+        "/home/user/code/d",
+    ]
+    assert matcher.partition(git_dirs) == (
+        ["/home/user/code/a", "/home/user/code/d"],
+        ["/home/user/code/skip", "/home/user/.cache/b", "/home/user/code/c-old"],
+    )
+
+
+def test_prune(tmp_path):
+    home = str(tmp_path)
+    matcher = ExcludeMatcher([], ["~/.cache/", "node_modules", "~/work/*-old"], home)
+    os.makedirs(os.path.join(home, ".cache", ".git"))
+
+    assert matcher.prune(os.path.join(home, "a", "node_modules"))
+    assert matcher.prune(os.path.join(home, "work", "x-old"))
+    assert matcher.prune(os.path.join(home, ".cache", "plug"))
+    # a repository itself, only what is under it is excluded
+    assert not matcher.prune(os.path.join(home, ".cache"))
+    assert not matcher.prune(os.path.join(home, "work"))
+    # everything under it is excluded and it is not a repository
+    assert ExcludeMatcher([], ["~/data/"], home).prune(os.path.join(home, "data"))
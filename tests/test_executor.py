@@ -0,0 +1,231 @@
+import io
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import redirect_stdout
+
+import pytest
+
+from src import executor
+from src.executor import (
+    GitTimeout,
+    communicate,
+    get_deadline,
+    is_limited,
+    limited,
+    map_repos,
+    report_stragglers,
+    run_repos,
+)
+
+WAIT_SECONDS = 10
+
+
+def is_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as file:
+            return file.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def start_sleeper(pid_path: str, timeout: float | None = None) -> subprocess.Popen:
+    """Starts a shell that starts a `sleep` the way git starts its transport helpers."""
+    return subprocess.Popen(
+        ["sh", "-c", f"sleep 30 & echo $! > {pid_path}; wait"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=is_limited(timeout),
+    )
+
+
+def read_pid(pid_path: str) -> int:
+    end = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < end:
+        try:
+            with open(pid_path, encoding="utf-8") as file:
+                if pid := file.read().strip():
+                    return int(pid)
+        except FileNotFoundError:
+            pass
+        time.sleep(0.01)
+    raise AssertionError("the sleep did not start")
+
+
+def test_commands_without_limits_keep_the_session(tmp_path):
+    assert not is_limited()
+    pid_path = str(tmp_path / "pid")
+    process = start_sleeper(pid_path)
+    try:
+        assert os.getsid(process.pid) == os.getsid(0)
+    finally:
+        # the `sleep` holds the pipes open until it is killed as well
+        os.kill(read_pid(pid_path), signal.SIGKILL)
+        process.kill()
+        process.communicate()
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    pid_path = str(tmp_path / "pid")
+    with limited(0.5, None):
+        assert is_limited()
+        process = start_sleeper(pid_path)
+        assert os.getsid(process.pid) == process.pid
+        sleep_pid = read_pid(pid_path)
+        start = time.monotonic()
+        with pytest.raises(GitTimeout):
+            communicate(process)
+    assert time.monotonic() - start < WAIT_SECONDS
+    assert process.returncode is not None
+    end = time.monotonic() + WAIT_SECONDS
+    while is_running(sleep_pid) and time.monotonic() < end:
+        time.sleep(0.01)
+    assert not is_running(sleep_pid)
+
+
+def test_own_timeout_of_a_command(tmp_path):
+    assert is_limited(0.2)
+    process = start_sleeper(str(tmp_path / "pid"), 0.2)
+    with pytest.raises(GitTimeout):
+        communicate(process, 0.2)
+    assert process.returncode is not None
+
+
+def test_commands_finishing_in_time_are_not_killed():
+    with limited(WAIT_SECONDS, get_deadline(WAIT_SECONDS)):
+        process = subprocess.Popen(
+            ["sh", "-c", "echo out; echo err >&2"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=is_limited(),
+        )
+        assert communicate(process) == (b"out\n", b"err\n")
+    assert not is_limited()
+
+
+def sleeping_report(git_dir: str, git_name: str) -> int:
+    process = subprocess.Popen(
+        ["sleep", "30"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=is_limited(),
+    )
+    communicate(process)
+    print(f"{git_name} done")
+    return 0
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_deadline_cuts_off_the_run(capsys, jobs):
+    gits = [(name, f"/repos/{name}") for name in "abcd"]
+    start = time.monotonic()
+    assert run_repos(sleeping_report, gits, jobs=jobs, deadline=get_deadline(0.3)) == 1
+    assert time.monotonic() - start < WAIT_SECONDS
+
+    output = capsys.readouterr().out
+    assert "done" not in output
+    assert output.count("Timed Out") == 4
+    # all of them are in the straggler report
+    assert "Slowest repos:" in output
+    assert output.count("(timed out)") == 4
+
+
+def test_deadline_of_map_repos():
+    gits = [(name, f"/repos/{name}") for name in "ab"]
+
+    def func(git_dir: str) -> str:
+        sleeping_report(git_dir, git_dir)
+        return git_dir
+
+    results = map_repos(func, gits, jobs=2, deadline=get_deadline(0.2))
+    assert all(isinstance(result, GitTimeout) for result in results)
+
+
+def test_records_of_timed_out_repos(capsys):
+    gits = [("a", "/repos/a")]
+    assert run_repos(sleeping_report, gits, timeout=0.2, output_format="ndjson") == 1
+    output = capsys.readouterr().out
+    assert '"status": "timed_out"' in output
+    assert "Slowest repos:" not in output
+
+
+def test_report_stragglers(home, monkeypatch, capsys):
+    monkeypatch.setattr(executor, "MAX_STRAGGLERS", 2)
+    report_stragglers([(str(home / "fast"), 0.1, False)])
+    assert capsys.readouterr().out == ""
+
+    report_stragglers(
+        [
+            (str(home / "fast"), 0.1, False),
+            (str(home / "slow"), 6.0, False),
+            ("/srv/stuck", 2.0, True),
+            (str(home / "slower"), 9.0, False),
+        ]
+    )
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == ""
+    assert "Slowest repos:" in lines[1]
+    assert lines[2:] == ["  - ~/slower: 9.0s", "  - ~/slow: 6.0s", "  ... and 1 more"]
+
+
+class Finisher:
+    """A report that finishes the repositories in the reverse order of `gits`."""
+
+    def __init__(self, names: list[str]):
+        self.done = {name: threading.Event() for name in names}
+        self.after = dict(zip(names, names[1:]))
+
+    def __call__(self, git_dir: str, git_name: str) -> int:
+        if git_name in self.after:
+            assert self.done[self.after[git_name]].wait(WAIT_SECONDS)
+            # for the future of the next repository to be done as well
+            time.sleep(0.1)
+        print(f"{git_name} line 1")
+        print(f"{git_name} line 2")
+        self.done[git_name].set()
+        return int(git_name == "b")
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+@pytest.mark.parametrize("order, printed", [("sorted", "abc"), ("completion", "cba")])
+def test_orders(capsys, order, printed, streamed):
+    gits = [(name, f"/repos/{name}") for name in "abc"]
+    report = Finisher(list("abc"))
+    assert run_repos(report, iter(gits) if streamed else gits, 3, order) == 1
+
+    lines = capsys.readouterr().out.splitlines()
+    # the output of each repository is printed in one piece
+    assert lines == [f"{name} line {n}" for name in printed for n in (1, 2)]
+
+
+def test_one_job_runs_in_order(capsys):
+    gits = [(name, f"/repos/{name}") for name in "abc"]
+    threads = set()
+
+    def report(git_dir: str, git_name: str) -> int:
+        threads.add(threading.get_ident())
+        print(git_name)
+        return 0
+
+    assert run_repos(report, gits, 1, "completion") == 0
+    assert capsys.readouterr().out.split() == ["a", "b", "c"]
+    assert threads == {threading.get_ident()}
+
+
+def test_map_repos_keeps_the_order():
+    gits = [(name, f"/repos/{name}") for name in "abcd"]
+    finisher = Finisher([f"/repos/{name}" for name in "abcd"])
+
+    def func(git_dir: str) -> str:
+        finisher(git_dir, git_dir)
+        return git_dir.upper()
+
+    with redirect_stdout(io.StringIO()):
+        results = map_repos(func, gits, jobs=4)
+    assert results == ["/REPOS/A", "/REPOS/B", "/REPOS/C", "/REPOS/D"]
+
+
+def test_default_jobs():
+    assert executor.DEFAULT_JOBS == min(32, (os.cpu_count() or 1) * 4)
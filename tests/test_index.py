@@ -0,0 +1,137 @@
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+from src import discovery, index, utils
+from src.discovery import read_dir
+
+from .helpers import make_repo
+
+
+def age_tree(top: str) -> None:
+    """Moves the mtimes of the directories under `top` out of the racy window."""
+    past = time.time() - 60
+    for dir_path, dir_names, _ in os.walk(top):
+        dir_names[:] = [name for name in dir_names if name != ".git"]
+        os.utime(dir_path, (past, past))
+
+
+@pytest.fixture
+def listed(monkeypatch):
+    """The directories listed with `os.scandir` by the walkers."""
+    listed = []
+    scandir = os.scandir
+
+    def recording_scandir(path):
+        listed.append(str(path))
+        return scandir(path)
+
+    monkeypatch.setattr(discovery.os, "scandir", recording_scandir)
+    return listed
+
+
+@pytest.fixture
+def code(tmp_path, monkeypatch) -> str:
+    code = str(tmp_path / "code")
+    os.makedirs(code)
+    monkeypatch.setenv("LOCALGIT_ROOTS", code)
+    return code
+
+
+def test_read_dir(tmp_path, listed):
+    top = str(tmp_path / "top")
+    os.makedirs(os.path.join(top, "a"))
+    make_repo(os.path.join(top, "repo"))
+    age_tree(top)
+    scan_start = time.time_ns()
+    listed.clear()
+
+    node = read_dir(top, None, scan_start)
+    assert node == [os.stat(top).st_mtime_ns, False, {"a": None, "repo": None}]
+    assert listed == [top]
+
+    # unchanged, the children are kept to be revalidated
+    node[2]["a"] = [1, False, {}]
+    assert read_dir(top, node, scan_start) == node
+    assert listed == [top]
+
+    # changed
+    os.makedirs(os.path.join(top, "b"))
+    os.utime(top, ns=(node[0] + 1, node[0] + 1))
+    changed = read_dir(top, node, scan_start)
+    assert changed[2] == {"a": [1, False, {}], "repo": None, "b": None}
+    assert listed == [top, top]
+
+    repo = read_dir(os.path.join(top, "repo"), None, scan_start)
+    assert repo[1] and repo[2] == {}
+
+
+def test_racy_directories_are_listed_again(tmp_path, listed):
+    top = str(tmp_path / "top")
+    os.makedirs(top)
+    node = read_dir(top, None, time.time_ns())
+    assert node[0] is None  # modified in the racy window
+    read_dir(top, node, time.time_ns())
+    assert listed == [top, top]
+
+
+def test_index_is_reused_and_invalidated(code, listed):
+    first = make_repo(os.path.join(code, "a", "first"))
+    os.makedirs(os.path.join(code, "b", "c"))
+    age_tree(code)
+
+    assert utils.scan_git_dirs() == [first]
+    assert os.path.exists(index.get_index_path())
+    assert listed
+
+    # nothing changed, nothing is listed again
+    listed.clear()
+    assert utils.scan_git_dirs() == [first]
+    assert listed == []
+
+    # a new repository is found through the directory that changed
+    second = make_repo(os.path.join(code, "b", "c", "second"))
+    listed.clear()
+    assert utils.scan_git_dirs() == [first, second]
+    assert os.path.join(code, "b", "c") in listed
+    assert os.path.join(code, "a") not in listed
+    assert os.path.join(code, "b") not in listed
+
+    # and a removed one is not found anymore
+    shutil.rmtree(first)
+    age_tree(code)
+    assert utils.scan_git_dirs() == [second]
+
+
+def test_rescan_ignores_the_index(code, listed):
+    repo = make_repo(os.path.join(code, "repo"))
+    age_tree(code)
+    utils.scan_git_dirs()
+
+    listed.clear()
+    assert utils.scan_git_dirs(rescan=True) == [repo]
+    assert code in listed and repo in listed
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "{",
+        "[]",
+        json.dumps({"version": index.INDEX_VERSION - 1, "roots": {}}),
+        json.dumps({"version": index.INDEX_VERSION, "roots": []}),
+    ],
+)
+def test_unusable_index(content):
+    os.makedirs(os.path.dirname(index.get_index_path()), exist_ok=True)
+    with open(index.get_index_path(), "w", encoding="utf-8") as file:
+        file.write(content)
+    assert index.load_index() == {}
+
+
+def test_save_and_load():
+    index.save_index({"/a": [1, False, {}], "/gone": None})
+    assert index.load_index() == {"/a": [1, False, {}]}
@@ -0,0 +1,121 @@
+import json
+import re
+
+import pytest
+
+from src.log import report_log, report_timeline
+from src.utils import get_timed_commit_logs
+
+from .helpers import git
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+TIMELINE_RE = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d (\w+): [0-9a-f]+ (.*)$")
+LOG_RE = re.compile(r"^  - [0-9a-f]+ (.*)$")
+START = 1_700_000_000
+
+
+@pytest.fixture
+def commit_at(monkeypatch):
+    """Commits with the author and committer dates set to `START` plus some seconds."""
+
+    def commit_at(work_dir: str, seconds: int) -> None:
+        date = f"@{START + seconds} +0000"
+        monkeypatch.setenv("GIT_AUTHOR_DATE", date)
+        monkeypatch.setenv("GIT_COMMITTER_DATE", date)
+        git(work_dir, "commit", "-q", "--allow-empty", "-m", f"at {seconds}")
+
+    return commit_at
+
+
+@pytest.fixture
+def gits(tmp_path, commit_at) -> list[tuple[str, str]]:
+    gits = []
+    for name, times in (("a", (10, 40, 70)), ("b", (20, 30, 80))):
+        work_dir = str(tmp_path / name)
+        git(str(tmp_path), "init", "-q", "-b", "main", work_dir)
+        for seconds in times:
+            commit_at(work_dir, seconds)
+        gits.append((name, work_dir))
+    return gits
+
+
+def show_timeline(capsys, gits, num_logs: int, since=None, until=None):
+    exit_code = report_timeline(gits, num_logs, since, until, jobs=2)
+    lines = ANSI_RE.sub("", capsys.readouterr().out).splitlines()
+    # the name of the repository and the subject of each commit
+    return exit_code, [TIMELINE_RE.sub(r"\1 \2", line) for line in lines]
+
+
+def test_timed_commit_logs(tmp_path, commit_at):
+    work_dir = str(tmp_path / "repo")
+    git(str(tmp_path), "init", "-q", "-b", "main", work_dir)
+    commit_at(work_dir, 10)
+    commit_at(work_dir, 50)
+    # a commit made with a clock behind its parent's
+    commit_at(work_dir, 30)
+
+    logs = get_timed_commit_logs(work_dir, 10)
+    assert [(time - START, log.split(" ", 1)[1]) for time, log in logs] == [
+        (50, "at 50"),
+        (30, "at 30"),
+        (10, "at 10"),
+    ]
+    assert len(get_timed_commit_logs(work_dir, 2)) == 2
+
+
+@pytest.mark.parametrize(
+    "num_logs, shown",
+    [
+        (1, ["b at 80"]),
+        (4, ["b at 80", "a at 70", "a at 40", "b at 30"]),
+        # more than all the repositories have together
+        (10, ["b at 80", "a at 70", "a at 40", "b at 30", "b at 20", "a at 10"]),
+    ],
+)
+def test_timeline_is_merged_newest_first(capsys, gits, num_logs, shown):
+    assert show_timeline(capsys, gits, num_logs) == (0, shown)
+
+
+@pytest.mark.parametrize(
+    "since, until, shown",
+    [
+        (START + 25, None, ["b at 80", "a at 70", "a at 40", "b at 30"]),
+        (None, START + 35, ["b at 30", "b at 20", "a at 10"]),
+        (START + 25, START + 75, ["a at 70", "a at 40", "b at 30"]),
+    ],
+)
+def test_timeline_between_dates(capsys, gits, since, until, shown):
+    since = since and f"@{since}"
+    until = until and f"@{until}"
+    assert show_timeline(capsys, gits, 10, since, until) == (0, shown)
+    # -n still limits the total
+    assert show_timeline(capsys, gits, 2, since, until) == (0, shown[:2])
+
+
+def test_timeline_without_commits(capsys, gits):
+    exit_code = report_timeline(gits, 10, f"@{START + 100}", jobs=2)
+    assert exit_code == 1
+    assert "No commits found." in capsys.readouterr().out
+
+
+def test_timeline_records(capsys, gits):
+    assert report_timeline(gits, 2, output_format="ndjson") == 0
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [(record["name"], record["time"]) for record in records] == [
+        ("b", START + 80),
+        ("a", START + 70),
+    ]
+    assert records[0]["subject"] == "at 80"
+    assert records[0]["hash"] == git(gits[1][1], "rev-parse", "--short", "HEAD")
+
+
+def test_log_of_each_repo(capsys, gits):
+    name, work_dir = gits[0]
+    assert report_log(work_dir, name, 2) == 0
+    lines = ANSI_RE.sub("", capsys.readouterr().out).splitlines()
+    assert lines[0].endswith(": a<main>")
+    assert [LOG_RE.sub(r"\1", line) for line in lines[1:]] == ["at 70", "at 40"]
+
+    assert report_log(work_dir, name, 10, f"@{START + 25}", f"@{START + 55}") == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert [LOG_RE.sub(r"\1", line) for line in lines[1:]] == ["at 40"]
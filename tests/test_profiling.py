@@ -0,0 +1,111 @@
+import json
+import subprocess
+
+import pytest
+
+from src import profiling
+from src.profiling import GitCall, get_operation, write_trace
+
+from .helpers import make_repo
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    """Profiles the git commands of the test, restoring `subprocess.Popen` after."""
+    monkeypatch.setattr(subprocess, "Popen", subprocess.Popen)
+    monkeypatch.setattr(profiling, "calls", [])
+    monkeypatch.setattr(profiling, "trace2_run_dir", None)
+    profiling.enable_profiling()
+    return profiling.calls
+
+
+@pytest.mark.parametrize(
+    "command, operation",
+    [
+        (["git", "status", "--porcelain=v2"], "git status"),
+        (["git", "-c", "core.quotepath=off", "status"], "git status"),
+        (["git", "-C", "/repo", "rev-list", "--count", "HEAD"], "git rev-list"),
+        (["git", "--no-pager", "log", "-n", "1"], "git log"),
+        (["git", "--version"], "git"),
+    ],
+)
+def test_get_operation(command, operation):
+    assert get_operation(command) == operation
+
+
+def test_records_communicate_and_wait(tmp_path, profiled):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    profiled.clear()
+
+    status = subprocess.Popen(
+        ["git", "status", "--porcelain"],
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    status.communicate()
+    assert (
+        subprocess.call(
+            ["git", "rev-parse", "missing-ref"],
+            cwd=work_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        != 0
+    )
+    subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=work_dir)
+
+    assert [get_operation(call.command) for call in profiled] == [
+        "git status",
+        "git rev-parse",
+        "git rev-parse",
+    ]
+    assert all(call.repo == work_dir for call in profiled)
+    assert profiled[0].exit_code == 0 and profiled[1].exit_code != 0
+    assert all(call.duration > 0 for call in profiled)
+    # recorded once, when it is waited for
+    status.wait()
+    assert len(profiled) == 3
+
+
+def test_write_trace(tmp_path):
+    calls = [
+        GitCall(["git", "status"], "/repo", 0.5, 0.25, 0, 10, 7),
+        GitCall(["git", "-c", "a=b", "fetch", "origin"], "/other", 1.0, 2.0, 1, 0, 8),
+    ]
+    path = tmp_path / "trace.json"
+    write_trace(str(path), calls)
+
+    trace = json.loads(path.read_text())
+    first, second = trace["traceEvents"]
+    assert first["name"] == "git status" and first["ph"] == "X"
+    assert (first["ts"], first["dur"], first["tid"]) == (500000.0, 250000.0, 7)
+    assert first["args"] == {
+        "command": "git status",
+        "repo": "/repo",
+        "exit_code": 0,
+        "output_bytes": 10,
+    }
+    assert second["name"] == "git fetch"
+    assert second["args"]["exit_code"] == 1
+
+
+def test_report_profile(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(
+        profiling,
+        "calls",
+        [
+            GitCall(["git", "status"], "/fast", 0.0, 0.1, 0, 0, 1),
+            GitCall(["git", "fetch"], "/slow", 0.1, 3.0, 0, 0, 2),
+            GitCall(["git", "status"], "/slow", 0.2, 0.5, 0, 0, 2),
+        ],
+    )
+    path = tmp_path / "trace.json"
+    profiling.report_profile(str(path))
+
+    output = capsys.readouterr().out
+    assert f"3 git calls traced to {path}." in output
+    assert "/slow: 3.500s in 2 git calls" in output
+    assert output.index("/slow: 3.500s") < output.index("/fast: 0.100s")
+    assert output.index("3.000s git fetch") < output.index("0.500s git status")
+    assert len(json.loads(path.read_text())["traceEvents"]) == 3
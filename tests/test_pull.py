@@ -0,0 +1,258 @@
+import os
+
+import pytest
+
+from src.pull import report_pull
+from src.utils import (
+    PullStatus,
+    call_pull,
+    get_integrate_command,
+    handle_pull_output,
+)
+
+from .helpers import git, make_repo
+
+
+def write_file(work_dir: str, name: str, content: str) -> None:
+    with open(os.path.join(work_dir, name), "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def commit_file(work_dir: str, name: str, content: str) -> None:
+    write_file(work_dir, name, content)
+    git(work_dir, "add", name)
+    git(work_dir, "commit", "-q", "-m", f"update {name}")
+
+
+class Remote:
+    """A bare remote with a clone that pushes to it as the other side of the pulls."""
+
+    def __init__(self, path):
+        self.path = path
+        self.seed = make_repo(str(path / "seed"), {"a.txt": "a\n", "b.txt": "b\n"})
+        self.bare = str(path / "remote.git")
+        git(str(path), "clone", "-q", "--bare", self.seed, self.bare)
+        git(self.seed, "remote", "add", "origin", self.bare)
+        git(self.seed, "fetch", "-q")
+        git(self.seed, "branch", "-q", "-u", "origin/main")
+
+    def clone(self, name: str = "local") -> str:
+        work_dir = str(self.path / name)
+        git(str(self.path), "clone", "-q", self.bare, work_dir)
+        return work_dir
+
+    def push(self, name: str, content: str) -> None:
+        commit_file(self.seed, name, content)
+        git(self.seed, "push", "-q")
+
+
+@pytest.fixture
+def remote(tmp_path) -> Remote:
+    return Remote(tmp_path)
+
+
+def pull(work_dir: str, fast_forward: bool):
+    git(work_dir, "fetch", "-q")
+    return call_pull(work_dir, "main", fast_forward)
+
+
+def get_parents(work_dir: str) -> list[str]:
+    return git(work_dir, "log", "-1", "--format=%P").split()
+
+
+def test_fast_forward(remote):
+    work_dir = remote.clone()
+    remote.push("a.txt", "a\nmore\nlines\n")
+    remote.push("new.txt", "new\n")
+
+    result = pull(work_dir, True)
+    assert result.status == PullStatus.MERGED
+    assert result.changes == [("2", "0", "a.txt"), ("1", "0", "new.txt")]
+    assert result.merged == result.conflicts == []
+    assert git(work_dir, "rev-parse", "HEAD") == git(remote.seed, "rev-parse", "HEAD")
+
+    successful, pulled, merged, failed, summary = handle_pull_output(result)
+    assert successful and not merged and not failed
+    assert pulled == [" a.txt | 2 ++", " new.txt | 1 +"]
+    assert "2 files changed, 3 insertions" in summary
+
+
+def test_clean_merge(remote):
+    work_dir = remote.clone()
+    commit_file(work_dir, "a.txt", "local\na\n")
+    remote.push("a.txt", "a\nremote\n")
+    remote.push("c.txt", "c\n")
+
+    result = pull(work_dir, False)
+    assert result.status == PullStatus.MERGED
+    assert result.merged == ["a.txt"]
+    assert sorted(path for _, _, path in result.changes) == ["a.txt", "c.txt"]
+    assert len(get_parents(work_dir)) == 2
+    with open(os.path.join(work_dir, "a.txt"), encoding="utf-8") as file:
+        assert file.read() == "local\na\nremote\n"
+
+
+def test_conflict(remote):
+    work_dir = remote.clone()
+    commit_file(work_dir, "a.txt", "local\n")
+    commit_file(work_dir, "b.txt", "b\nlocal\n")
+    remote.push("a.txt", "remote\n")
+    remote.push("b.txt", "remote\nb\n")
+
+    result = pull(work_dir, False)
+    assert result.status == PullStatus.CONFLICT
+    assert result.conflicts == ["a.txt"]
+    assert result.merged == ["b.txt"]
+
+    successful, _, merged, failed, _ = handle_pull_output(result)
+    assert successful
+    assert [line.endswith(": b.txt") for line in merged] == [True]
+    assert [line.endswith(": a.txt") for line in failed] == [True]
+
+    # the merge is left for the user to resolve
+    result = call_pull(work_dir, "main", False)
+    assert result.status == PullStatus.UNRESOLVED
+    assert not handle_pull_output(result)[0]
+
+
+def test_dirty_tree_that_would_be_overwritten(remote):
+    work_dir = remote.clone()
+    write_file(work_dir, "a.txt", "edited\n")
+    write_file(work_dir, "new.txt", "untracked\n")
+    write_file(work_dir, "b.txt", "edited too\n")
+    remote.push("a.txt", "remote\n")
+    remote.push("new.txt", "new\n")
+    head = git(work_dir, "rev-parse", "HEAD")
+
+    result = pull(work_dir, True)
+    assert result.status == PullStatus.OVERWRITTEN
+    assert result.conflicts == ["a.txt", "new.txt"]
+    assert git(work_dir, "rev-parse", "HEAD") == head
+    successful, files, _, _, summary = handle_pull_output(result)
+    assert not successful and files == ["a.txt", "new.txt"]
+    assert "would be overwritten" in summary
+
+
+def test_dirty_tree_that_is_not_touched(remote):
+    work_dir = remote.clone()
+    write_file(work_dir, "b.txt", "edited\n")
+    remote.push("a.txt", "remote\n")
+
+    assert pull(work_dir, True).status == PullStatus.MERGED
+    with open(os.path.join(work_dir, "b.txt"), encoding="utf-8") as file:
+        assert file.read() == "edited\n"
+
+
+def test_existing_merge_head(remote):
+    work_dir = remote.clone()
+    remote.push("a.txt", "remote\n")
+    git(work_dir, "fetch", "-q")
+    head = git(work_dir, "rev-parse", "HEAD")
+    with open(
+        os.path.join(work_dir, ".git", "MERGE_HEAD"), "w", encoding="utf-8"
+    ) as file:
+        file.write(head + "\n")
+
+    result = call_pull(work_dir, "main", True)
+    assert result.status == PullStatus.UNRESOLVED
+    assert git(work_dir, "rev-parse", "HEAD") == head
+
+
+@pytest.mark.parametrize(
+    "config, fast_forward, command",
+    [
+        ({}, False, ["git", "merge", "--no-edit", "origin/main"]),
+        ({}, True, ["git", "merge", "--no-edit", "origin/main"]),
+        ({"pull.rebase": "false"}, False, ["git", "merge", "--no-edit", "origin/main"]),
+        ({"pull.rebase": "true"}, False, ["git", "rebase", "origin/main"]),
+        ({"pull.rebase": "true"}, True, ["git", "merge", "--ff-only", "origin/main"]),
+        (
+            {"pull.rebase": "merges"},
+            False,
+            ["git", "rebase", "--rebase-merges", "origin/main"],
+        ),
+        ({"pull.rebase": "interactive"}, False, ["git", "rebase", "origin/main"]),
+        (
+            {"pull.rebase": "true", "branch.main.rebase": "false"},
+            False,
+            ["git", "merge", "--no-edit", "origin/main"],
+        ),
+        ({"branch.main.rebase": "yes"}, False, ["git", "rebase", "origin/main"]),
+        (
+            {"branch.other.rebase": "true"},
+            False,
+            ["git", "merge", "--no-edit", "origin/main"],
+        ),
+        ({"pull.ff": "only"}, False, ["git", "merge", "--ff-only", "origin/main"]),
+        (
+            {"pull.ff": "only", "pull.rebase": "true"},
+            False,
+            ["git", "merge", "--ff-only", "origin/main"],
+        ),
+        (
+            {"pull.ff": "false"},
+            True,
+            ["git", "merge", "--no-edit", "--no-ff", "origin/main"],
+        ),
+    ],
+)
+def test_integrate_command(tmp_path, config, fast_forward, command):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    for key, value in config.items():
+        git(work_dir, "config", key, value)
+    assert get_integrate_command(work_dir, "main", fast_forward) == command
+
+
+def test_rebase(remote):
+    work_dir = remote.clone()
+    git(work_dir, "config", "pull.rebase", "true")
+    commit_file(work_dir, "local.txt", "local\n")
+    remote.push("a.txt", "remote\n")
+
+    result = pull(work_dir, False)
+    assert result.status == PullStatus.MERGED
+    assert result.changes == [("1", "1", "a.txt")]
+    # no merge commit, the local commit is on top of the remote one
+    assert len(get_parents(work_dir)) == 1
+    assert get_parents(work_dir) == [git(remote.seed, "rev-parse", "HEAD")]
+
+
+def test_rebase_conflict(remote):
+    work_dir = remote.clone()
+    git(work_dir, "config", "branch.main.rebase", "true")
+    commit_file(work_dir, "a.txt", "local\n")
+    remote.push("a.txt", "remote\n")
+
+    result = pull(work_dir, False)
+    assert result.status == PullStatus.CONFLICT
+    assert result.conflicts == ["a.txt"]
+    assert call_pull(work_dir, "main", False).status == PullStatus.UNRESOLVED
+
+
+def test_fast_forward_only(remote):
+    work_dir = remote.clone()
+    git(work_dir, "config", "pull.ff", "only")
+    commit_file(work_dir, "local.txt", "local\n")
+    remote.push("a.txt", "remote\n")
+    head = git(work_dir, "rev-parse", "HEAD")
+
+    result = pull(work_dir, False)
+    assert result.status == PullStatus.FAILED
+    assert "fast-forward" in result.error
+    assert git(work_dir, "rev-parse", "HEAD") == head
+
+    git(work_dir, "reset", "-q", "--hard", "HEAD~")
+    assert pull(work_dir, True).status == PullStatus.MERGED
+    assert git(work_dir, "rev-parse", "HEAD") == git(remote.seed, "rev-parse", "HEAD")
+
+
+def test_report_pull(remote, capsys):
+    work_dir = remote.clone()
+    remote.push("a.txt", "remote\n")
+
+    assert report_pull(work_dir, "local", silent=False, verbose=False) == 0
+    output = capsys.readouterr().out
+    assert "local" in output and "1 file changed" in output
+    assert "a.txt | 2" in output
+    assert report_pull(work_dir, "local", silent=False, verbose=False) == 0
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,157 @@
+import os
+import re
+
+import pytest
+
+from src.push import PushPlan, plan_push, report_push, report_push_plan
+
+from .helpers import git, make_repo
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+
+
+class Remote:
+    """A bare remote and the clones that push to it."""
+
+    def __init__(self, path):
+        self.path = path
+        seed = make_repo(str(path / "seed"))
+        self.bare = str(path / "remote.git")
+        git(str(path), "clone", "-q", "--bare", seed, self.bare)
+
+    def clone(self, name: str = "local") -> str:
+        work_dir = str(self.path / name)
+        git(str(self.path), "clone", "-q", self.bare, work_dir)
+        return work_dir
+
+    def read_ref(self, branch: str) -> str:
+        return git(self.bare, "rev-parse", f"refs/heads/{branch}")
+
+
+@pytest.fixture
+def remote(tmp_path) -> Remote:
+    return Remote(tmp_path)
+
+
+def commit(work_dir: str, message: str = "local") -> None:
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", message)
+
+
+def push(work_dir: str, plan: PushPlan | None, capsys) -> tuple[int, str]:
+    exit_code = report_push(work_dir, "local", False, True, False, "", plan)
+    return exit_code, ANSI_RE.sub("", capsys.readouterr().out)
+
+
+def show_plan(work_dir: str, plan: PushPlan | None, capsys) -> str:
+    assert report_push_plan(work_dir, "local", True, False, plan) == 0
+    return ANSI_RE.sub("", capsys.readouterr().out)
+
+
+@pytest.mark.parametrize(
+    "num_ahead, has_upstream, has_commits, needs_push",
+    [
+        (0, True, True, False),
+        (2, True, True, True),
+        # origin/<branch> exists but is not the upstream yet
+        (0, False, True, True),
+        # a new branch that is not on the origin yet
+        (-1, False, True, True),
+        # an upstream that was deleted from the origin is not pushed again
+        (-1, True, True, False),
+        # no commits or no origin to push them to
+        (-1, False, False, False),
+    ],
+)
+def test_needs_push(num_ahead, has_upstream, has_commits, needs_push):
+    plan = PushPlan("main", [], num_ahead, has_upstream, has_commits)
+    assert plan.needs_push == needs_push
+
+
+def test_up_to_date(remote, capsys):
+    work_dir = remote.clone()
+    plan = plan_push(work_dir)
+    assert plan == PushPlan("main", [], 0, True, True)
+    assert not plan.needs_push
+    assert show_plan(work_dir, plan, capsys).endswith(": local<main>\n")
+    assert push(work_dir, plan, capsys) == (0, f"{work_dir}: local<main>\n")
+
+
+def test_ahead(remote, capsys):
+    work_dir = remote.clone()
+    commit(work_dir, "first")
+    plan = plan_push(work_dir)
+    assert plan == PushPlan("main", [], 1, True, True)
+    assert show_plan(work_dir, plan, capsys).endswith("-> Push 1 commit\n")
+
+    commit(work_dir, "second")
+    plan = plan_push(work_dir)
+    assert plan.num_ahead == 2 and plan.needs_push
+    assert show_plan(work_dir, plan, capsys).endswith("-> Push 2 commits\n")
+
+    assert push(work_dir, plan, capsys)[0] == 0
+    assert remote.read_ref("main") == git(work_dir, "rev-parse", "HEAD")
+    assert not plan_push(work_dir).needs_push
+
+
+def test_branch_without_upstream(remote, capsys):
+    work_dir = remote.clone()
+    git(work_dir, "checkout", "-q", "-b", "feature")
+    commit(work_dir)
+
+    plan = plan_push(work_dir)
+    assert plan == PushPlan("feature", [], -1, False, True)
+    assert plan.needs_push
+    assert show_plan(work_dir, plan, capsys).endswith(
+        "-> Push the branch, Set upstream origin/feature\n"
+    )
+
+    # pushed with -u even though there is nothing to commit
+    assert push(work_dir, plan, capsys)[0] == 0
+    assert remote.read_ref("feature") == git(work_dir, "rev-parse", "HEAD")
+    assert git(work_dir, "rev-parse", "--abbrev-ref", "@{upstream}") == "origin/feature"
+    assert plan_push(work_dir) == PushPlan("feature", [], 0, True, True)
+
+
+def test_repo_without_origin(tmp_path, capsys):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    plan = plan_push(work_dir)
+    assert plan == PushPlan("main", [], -1, False, False)
+    assert not plan.needs_push
+    assert push(work_dir, plan, capsys) == (0, f"{work_dir}: local<main>\n")
+
+
+def test_unborn_branch(remote):
+    work_dir = remote.clone()
+    git(work_dir, "checkout", "-q", "--orphan", "empty")
+    git(work_dir, "rm", "-q", "-r", "--cached", ".")
+    plan = plan_push(work_dir)
+    assert plan.branch == "empty" and not plan.has_commits
+    assert not plan.needs_push
+
+
+def test_detached_head(remote):
+    work_dir = remote.clone()
+    git(work_dir, "checkout", "-q", "--detach")
+    assert plan_push(work_dir) is None
+
+
+def test_files_are_committed_and_pushed(remote, capsys):
+    work_dir = remote.clone()
+    with open(os.path.join(work_dir, "a.txt"), "a", encoding="utf-8") as file:
+        file.write("more\n")
+    with open(os.path.join(work_dir, "new.txt"), "w", encoding="utf-8") as file:
+        file.write("new\n")
+
+    plan = plan_push(work_dir)
+    assert plan.files == ["M a.txt", "?? new.txt"]
+    assert plan.num_ahead == 0 and not plan.needs_push
+    # untracked files are only committed with --all
+    assert show_plan(work_dir, plan, capsys).endswith(
+        "-> Commit 1 files, Push 1 commit\n  - M a.txt\n"
+    )
+
+    exit_code, output = push(work_dir, plan, capsys)
+    assert exit_code == 0
+    assert "  - M a.txt" in output and "new.txt" not in output
+    assert remote.read_ref("main") == git(work_dir, "rev-parse", "HEAD")
+    assert plan_push(work_dir).files == ["?? new.txt"]
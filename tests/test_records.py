@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+import pytest
+
+from src import records
+from src.executor import run_repos
+from src.list import report_list
+from src.records import collect_records, emit_record, start_repo
+
+from .helpers import git, make_repo
+
+
+@pytest.fixture(autouse=True)
+def repo_state(monkeypatch):
+    """Forgets the repository the previous tests started on this thread."""
+    monkeypatch.setattr(records, "repo_state", threading.local())
+
+
+def test_emit_record(capsys):
+    emit_record("/code/repo", "repo", status="up_to_date", ahead=0)
+    assert json.loads(capsys.readouterr().out) == {
+        "path": "/code/repo",
+        "name": "repo",
+        "status": "up_to_date",
+        "ahead": 0,
+    }
+
+    start_repo()
+    time.sleep(0.05)
+    emit_record("/code/repo", "repo")
+    record = json.loads(capsys.readouterr().out)
+    assert list(record) == ["path", "name", "seconds"]
+    assert 0.05 <= record["seconds"] < 5
+
+
+@pytest.mark.parametrize("output_format", ["text", "ndjson"])
+def test_other_formats_pass_through(capsys, output_format):
+    with collect_records(output_format):
+        print("as is")
+    assert capsys.readouterr().out == "as is\n"
+
+
+def test_json_collects_an_array(capsys):
+    with collect_records("json"):
+        emit_record("/a", "a", status="dirty")
+        emit_record("/b", "b", status="up_to_date")
+    assert json.loads(capsys.readouterr().out) == [
+        {"path": "/a", "name": "a", "status": "dirty"},
+        {"path": "/b", "name": "b", "status": "up_to_date"},
+    ]
+
+
+def test_json_is_printed_when_the_run_fails(capsys):
+    with pytest.raises(KeyError):
+        with collect_records("json"):
+            emit_record("/a", "a")
+            raise KeyError("a")
+    assert json.loads(capsys.readouterr().out) == [{"path": "/a", "name": "a"}]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_records_of_parallel_repos(tmp_path, capsys, jobs):
+    gits = []
+    for name in "abc":
+        work_dir = make_repo(str(tmp_path / name))
+        git(work_dir, "checkout", "-q", "-b", f"branch-{name}")
+        gits.append((name, work_dir))
+
+    def report(git_dir: str, git_name: str) -> int:
+        return report_list(git_dir, git_name, git_name == "b", "json")
+
+    with collect_records("json"):
+        assert run_repos(report, gits, jobs=jobs, output_format="json") == 0
+    found = json.loads(capsys.readouterr().out)
+
+    assert [(record["name"], record["path"]) for record in found] == gits
+    assert [record["branch"] for record in found] == [
+        "branch-a",
+        "branch-b",
+        "branch-c",
+    ]
+    assert [record["excluded"] for record in found] == [False, True, False]
+    assert all(record["seconds"] >= 0 for record in found)
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+
+from src.refs import (
+    get_common_dir,
+    read_head_branch,
+    read_head_ref,
+    read_ref_oid,
+    resolve_git_dir,
+)
+
+from .helpers import git, make_repo
+
+
+def write_file(path: str, content: str) -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def assert_same_as_git(work_dir: str) -> None:
+    assert read_head_branch(work_dir) == git(work_dir, "branch", "--show-current")
+    assert read_ref_oid(work_dir) == git(work_dir, "rev-parse", "HEAD")
+
+
+def test_branch(tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    assert resolve_git_dir(work_dir) == os.path.join(work_dir, ".git")
+    assert get_common_dir(os.path.join(work_dir, ".git")) == os.path.join(
+        work_dir, ".git"
+    )
+    assert read_head_ref(work_dir) == "refs/heads/main"
+    assert_same_as_git(work_dir)
+
+    git(work_dir, "checkout", "-q", "-b", "feature/nested")
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "feature")
+    assert read_head_branch(work_dir) == "feature/nested"
+    assert_same_as_git(work_dir)
+
+
+def test_packed_refs(tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    head = git(work_dir, "rev-parse", "HEAD")
+    git(work_dir, "update-ref", "refs/remotes/origin/main", head)
+    git(work_dir, "pack-refs", "--all")
+    assert not os.path.exists(os.path.join(work_dir, ".git", "refs", "heads", "main"))
+
+    assert read_head_branch(work_dir) == "main"
+    assert read_ref_oid(work_dir) == head
+    assert read_ref_oid(work_dir, "refs/remotes/origin/main") == head
+    assert read_ref_oid(work_dir, "refs/remotes/origin/gone") is None
+
+    # a loose ref written after packing wins over the packed one
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "more")
+    assert_same_as_git(work_dir)
+
+
+def test_detached_head(tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    git(work_dir, "checkout", "-q", "--detach")
+    assert read_head_ref(work_dir) == ""
+    assert read_head_branch(work_dir) == ""
+    assert_same_as_git(work_dir)
+
+
+def test_unborn_branch(tmp_path):
+    work_dir = str(tmp_path / "repo")
+    git(str(tmp_path), "init", "-q", "-b", "trunk", work_dir)
+    assert read_head_ref(work_dir) == "refs/heads/trunk"
+    assert read_head_branch(work_dir) == "trunk"
+    assert read_ref_oid(work_dir) is None
+
+
+def test_symbolic_refs(tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    git(work_dir, "symbolic-ref", "refs/heads/alias", "refs/heads/main")
+    git(work_dir, "symbolic-ref", "HEAD", "refs/heads/alias")
+    assert read_head_ref(work_dir) == "refs/heads/main"
+    assert read_ref_oid(work_dir) == git(work_dir, "rev-parse", "HEAD")
+
+    # a loop is given up on like git does
+    refs = os.path.join(work_dir, ".git", "refs", "heads")
+    write_file(os.path.join(refs, "main"), "ref: refs/heads/alias\n")
+    assert read_head_ref(work_dir) is None
+    assert read_ref_oid(work_dir) is None
+
+
+@pytest.mark.parametrize(
+    "head",
+    [
+        "ref: refs/heads/.invalid\n",  # reftable repositories
+        "not an object id\n",
+    ],
+)
+def test_layouts_that_are_not_understood(tmp_path, head):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    write_file(os.path.join(work_dir, ".git", "HEAD"), head)
+    assert read_head_branch(work_dir) is None
+
+
+def test_worktree(tmp_path):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    worktree = str(tmp_path / "worktree")
+    git(work_dir, "worktree", "add", "-q", "-b", "feature", worktree)
+    git(worktree, "commit", "-q", "--allow-empty", "-m", "feature")
+
+    git_dir = resolve_git_dir(worktree)
+    assert git_dir == os.path.join(work_dir, ".git", "worktrees", "worktree")
+    assert get_common_dir(git_dir) == os.path.join(work_dir, ".git")
+    # HEAD is per worktree, the branches are shared
+    assert read_head_branch(worktree) == "feature"
+    assert read_head_branch(work_dir) == "main"
+    assert_same_as_git(worktree)
+    assert read_ref_oid(work_dir, "refs/heads/feature") == read_ref_oid(worktree)
+
+    git(worktree, "checkout", "-q", "--detach")
+    assert read_head_branch(worktree) == ""
+    assert read_head_branch(work_dir) == "main"
+
+
+def test_gitdir_files(tmp_path):
+    git_dir = str(tmp_path / "separate.git")
+    work_dir = str(tmp_path / "repo")
+    git(str(tmp_path), "init", "-q", f"--separate-git-dir={git_dir}", work_dir)
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "initial")
+    assert resolve_git_dir(work_dir) == git_dir
+    assert_same_as_git(work_dir)
+
+    # relative like in submodules
+    write_file(os.path.join(work_dir, ".git"), "gitdir: ../separate.git\n")
+    assert resolve_git_dir(work_dir) == git_dir
+    assert_same_as_git(work_dir)
+
+
+@pytest.mark.parametrize(
+    "content", [b"gitdir: ../missing.git\n", b"not a gitdir line\n", b"\xff\xfe\n"]
+)
+def test_unusable_gitdir_files(tmp_path, content):
+    work_dir = str(tmp_path / "repo")
+    os.makedirs(work_dir)
+    with open(os.path.join(work_dir, ".git"), "wb") as file:
+        file.write(content)
+    assert resolve_git_dir(work_dir) is None
+    assert read_head_branch(work_dir) is None
+    assert read_ref_oid(work_dir) is None
+
+
+def test_not_a_repository(tmp_path):
+    assert resolve_git_dir(str(tmp_path)) is None
+    assert read_head_ref(str(tmp_path)) is None
@@ -0,0 +1,153 @@
+import os
+import subprocess
+
+import pytest
+
+from src.utils import RepoStatus, parse_porcelain_v2, quote_path
+
+from .helpers import git, make_repo
+
+OID = "0123456789abcdef0123456789abcdef01234567"
+HEADERS = f"# branch.oid {OID}\n# branch.head main\n"
+MODES = "100644 100644 100644"
+
+
+@pytest.mark.parametrize(
+    "entry, file",
+    [
+        (f"1 .M N... {MODES} {OID} {OID} a.txt", "M a.txt"),
+        (f"1 M. N... {MODES} {OID} {OID} a.txt", "M  a.txt"),
+        (f"1 MM N... {MODES} {OID} {OID} a.txt", "MM a.txt"),
+        (f"1 A. N... 000000 100644 100644 {OID} {OID} new.txt", "A  new.txt"),
+        (f"1 .D N... 100644 100644 000000 {OID} {OID} gone.txt", "D gone.txt"),
+        (f"1 .M N... {MODES} {OID} {OID} with space.txt", 'M "with space.txt"'),
+        (f'1 .M N... {MODES} {OID} {OID} "tab\\there.txt"', 'M "tab\\there.txt"'),
+        (f"1 .M S.M. 160000 160000 160000 {OID} {OID} sub", "M sub"),
+        (
+            f"2 R. N... {MODES} {OID} {OID} R100 new.txt\told.txt",
+            "R  old.txt -> new.txt",
+        ),
+        (
+            f"2 RM N... {MODES} {OID} {OID} R87 new name.txt\told name.txt",
+            'RM "old name.txt" -> "new name.txt"',
+        ),
+        (
+            f"2 C. N... {MODES} {OID} {OID} C100 copy.txt\ta.txt",
+            "C  a.txt -> copy.txt",
+        ),
+        (
+            f"u UU N... 100644 100644 100644 100644 {OID} {OID} {OID} both.txt",
+            "UU both.txt",
+        ),
+        (
+            f"u AA N... 000000 100644 100644 100644 {OID} {OID} {OID} a b.txt",
+            'AA "a b.txt"',
+        ),
+        ("? untracked.txt", "?? untracked.txt"),
+        ("? new dir/", '?? "new dir/"'),
+    ],
+)
+def test_entries(entry, file):
+    assert parse_porcelain_v2(f"{HEADERS}{entry}\n").files == [file]
+
+
+def test_ignored_entries_are_left_out():
+    assert parse_porcelain_v2(f"{HEADERS}! build/\n! a.pyc\n").files == []
+
+
+@pytest.mark.parametrize(
+    "headers, branch, upstream, commit_diffs",
+    [
+        ("# branch.head main\n", "main", None, None),
+        ("# branch.head (detached)\n", "", None, None),
+        (
+            "# branch.head main\n# branch.upstream origin/main\n# branch.ab +0 -0\n",
+            "main",
+            "origin/main",
+            (0, 0),
+        ),
+        (
+            "# branch.head feature\n# branch.upstream origin/feature\n# branch.ab +2 -13\n",
+            "feature",
+            "origin/feature",
+            (2, 13),
+        ),
+        # the upstream is gone
+        (
+            "# branch.head main\n# branch.upstream origin/main\n",
+            "main",
+            "origin/main",
+            None,
+        ),
+        ("# branch.oid (initial)\n# branch.head main\n", "main", None, None),
+    ],
+)
+def test_headers(headers, branch, upstream, commit_diffs):
+    assert parse_porcelain_v2(headers) == RepoStatus(branch, upstream, commit_diffs, [])
+
+
+def test_quote_path():
+    assert quote_path("a.txt") == "a.txt"
+    assert quote_path("a b.txt") == '"a b.txt"'
+    assert quote_path('"a\\tb.txt"') == '"a\\tb.txt"'
+
+
+def write_file(work_dir: str, name: str, content: str) -> None:
+    with open(os.path.join(work_dir, name), "w", encoding="utf-8") as file:
+        file.write(content)
+
+
+def test_same_files_as_porcelain_v1(tmp_path):
+    files = {
+        "modified.txt": "a\n",
+        "staged.txt": "b\n",
+        "deleted.txt": "c\n",
+        "renamed.txt": "some\nlines\nto\nfind\nthe\nrename\n",
+        "with space.txt": "d\n",
+        "conflict.txt": "base\n",
+    }
+    work_dir = make_repo(str(tmp_path / "repo"), files)
+    git(work_dir, "checkout", "-q", "-b", "other")
+    write_file(work_dir, "conflict.txt", "other\n")
+    git(work_dir, "commit", "-q", "-am", "other")
+    git(work_dir, "checkout", "-q", "main")
+    write_file(work_dir, "conflict.txt", "main\n")
+    git(work_dir, "commit", "-q", "-am", "main")
+    with pytest.raises(subprocess.CalledProcessError):
+        git(work_dir, "merge", "-q", "other")
+
+    write_file(work_dir, "modified.txt", "changed\n")
+    write_file(work_dir, "staged.txt", "changed\n")
+    git(work_dir, "add", "staged.txt")
+    os.remove(os.path.join(work_dir, "deleted.txt"))
+    git(work_dir, "mv", "renamed.txt", "moved.txt")
+    write_file(work_dir, "with space.txt", "changed\n")
+    write_file(work_dir, "untracked file.txt", "new\n")
+    write_file(work_dir, "tab\there.txt", "new\n")
+    write_file(work_dir, "ignored.log", "ignored\n")
+    write_file(work_dir, ".gitignore", "*.log\n")
+
+    v1 = git(work_dir, "status", "--porcelain").split("\n")
+    v2 = git(work_dir, "status", "--porcelain=v2", "--branch", "--ignored=matching")
+    status = parse_porcelain_v2(v2)
+    assert status.branch == "main" and status.upstream is None
+    assert sorted(status.files) == sorted(line.strip() for line in v1)
+    assert "UU conflict.txt" in status.files
+    assert "R  renamed.txt -> moved.txt" in status.files
+
+
+def test_upstream_of_a_real_repo(tmp_path):
+    remote = make_repo(str(tmp_path / "remote"))
+    work_dir = str(tmp_path / "clone")
+    git(str(tmp_path), "clone", "-q", remote, work_dir)
+    git(remote, "commit", "-q", "--allow-empty", "-m", "remote")
+    git(work_dir, "fetch", "-q")
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "local 1")
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "local 2")
+
+    output = git(work_dir, "status", "--porcelain=v2", "--branch")
+    assert parse_porcelain_v2(output) == RepoStatus("main", "origin/main", (2, 1), [])
+
+    git(work_dir, "checkout", "-q", "--detach")
+    output = git(work_dir, "status", "--porcelain=v2", "--branch")
+    assert parse_porcelain_v2(output) == RepoStatus("", None, None, [])
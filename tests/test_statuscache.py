@@ -0,0 +1,131 @@
+import json
+import os
+import subprocess
+
+import pytest
+
+from src import statuscache, utils
+from src.statuscache import StatusCache, get_status_cache_path
+
+from .helpers import age_working_tree, git, make_repo
+
+
+def make_settled_repo(path: str) -> str:
+    """Creates a repository with an untracked file whose files are not racy, with an index
+    `git status` has already refreshed."""
+    work_dir = make_repo(path, {"a.txt": "a\n", "sub/b.txt": "b\n"})
+    with open(os.path.join(work_dir, "new.txt"), "w", encoding="utf-8") as file:
+        file.write("new\n")
+    age_working_tree(work_dir)
+    git(work_dir, "status")
+    return work_dir
+
+
+def put(cache: StatusCache, work_dir: str, status: list | None = None) -> None:
+    fingerprint = cache.get_fingerprint(work_dir)
+    assert fingerprint is not None
+    cache.put(
+        work_dir,
+        fingerprint,
+        status or ["main", None, None, ["?? new.txt"]],
+        set(),
+        os.path.join(os.environ["HOME"], ".config", "git", "ignore"),
+    )
+
+
+@pytest.fixture
+def work_dir(tmp_path) -> str:
+    return make_settled_repo(str(tmp_path / "repo"))
+
+
+def test_hit(work_dir):
+    cache = StatusCache()
+    assert cache.get(work_dir) is None
+    put(cache, work_dir)
+    assert cache.get(work_dir) == ["main", None, None, ["?? new.txt"]]
+
+
+def test_modified_file(work_dir):
+    cache = StatusCache()
+    put(cache, work_dir)
+    with open(os.path.join(work_dir, "a.txt"), "a", encoding="utf-8") as file:
+        file.write("more\n")
+    assert cache.get(work_dir) is None
+    # and the file is too recent to be trusted until it is older
+    assert cache.get_fingerprint(work_dir) is None
+
+
+def test_new_untracked_file(work_dir):
+    cache = StatusCache()
+    put(cache, work_dir)
+    with open(os.path.join(work_dir, "sub", "c.txt"), "w", encoding="utf-8") as file:
+        file.write("c\n")
+    assert cache.get(work_dir) is None
+
+
+def test_commit_and_checkout(work_dir):
+    cache = StatusCache()
+    put(cache, work_dir)
+    git(work_dir, "commit", "-q", "--allow-empty", "-m", "empty")
+    assert cache.get(work_dir) is None
+
+    put(cache, work_dir)
+    git(work_dir, "checkout", "-q", "-b", "feature")
+    assert cache.get(work_dir) is None
+
+
+def test_ignore_files(work_dir):
+    cache = StatusCache()
+    put(cache, work_dir)
+    with open(
+        os.path.join(work_dir, ".git", "info", "exclude"), "a", encoding="utf-8"
+    ) as file:
+        file.write("new.txt\n")
+    assert cache.get(work_dir) is None
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    first, second, third = (
+        make_settled_repo(str(tmp_path / name)) for name in ("a", "b", "c")
+    )
+    cache = StatusCache(max_entries=2)
+    put(cache, first)
+    put(cache, second)
+    assert cache.get(first) is not None  # now more recently used than `second`
+    put(cache, third)
+    assert cache.get(second) is None
+    assert cache.get(first) is not None
+    assert cache.get(third) is not None
+
+
+def test_save_and_load(work_dir):
+    cache = StatusCache()
+    put(cache, work_dir)
+    cache.save()
+    assert StatusCache().get(work_dir) == ["main", None, None, ["?? new.txt"]]
+
+    path = get_status_cache_path()
+    with open(path, encoding="utf-8") as file:
+        saved = json.load(file)
+    saved["version"] = statuscache.STATUS_CACHE_VERSION - 1
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(saved, file)
+    assert StatusCache().get(work_dir) is None
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("{")
+    assert StatusCache().get(work_dir) is None
+
+
+def test_repo_status_uses_the_cache(work_dir, monkeypatch):
+    first = utils.get_repo_status(work_dir)
+    assert first.branch == "main" and first.files
+
+    def no_git(*args, **kwargs):
+        raise AssertionError("git ran")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(subprocess, "Popen", no_git)
+        assert utils.get_repo_status(work_dir) == first
+
+    assert utils.get_repo_status(work_dir, use_cache=False) == first
@@ -0,0 +1,91 @@
+import json
+import os
+import subprocess
+
+from src.trace2 import (
+    aggregate_trace2,
+    get_trace2_target,
+    make_run_dir,
+    read_events,
+    report_trace2,
+)
+
+from .helpers import make_repo
+
+
+def write_events(path, events: list[dict], tail: str = "") -> None:
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(json.dumps(event) + "\n" for event in events)
+        file.write(tail)
+
+
+def test_run_dirs_and_targets(tmp_path):
+    first = make_run_dir(str(tmp_path / "traces"))
+    second = make_run_dir(str(tmp_path / "traces"))
+    assert first != second
+
+    target = get_trace2_target(first, "/home/user/code/repo")
+    assert target == os.path.join(first, "home_user_code_repo")
+    assert os.path.isdir(target)
+    assert get_trace2_target(first, "/") == os.path.join(first, "_")
+
+
+def test_read_events_skips_cut_lines(tmp_path):
+    path = tmp_path / "trace"
+    write_events(path, [{"event": "start"}, {"event": "exit"}], '{"event": "reg')
+    assert [event["event"] for event in read_events(str(path))] == ["start", "exit"]
+
+
+def test_aggregate(tmp_path):
+    for repo, seconds in (("repo_a", 0.5), ("repo_b", 0.25)):
+        os.makedirs(tmp_path / repo)
+        write_events(
+            tmp_path / repo / "status",
+            [
+                {"event": "cmd_name", "name": "status"},
+                {"event": "region_leave", "category": "index", "label": "refresh"},
+                {
+                    "event": "region_leave",
+                    "category": "status",
+                    "label": "untracked",
+                    "t_rel": seconds,
+                },
+                {"event": "exit", "t_abs": 2 * seconds},
+            ],
+        )
+    write_events(
+        tmp_path / "repo_a" / "fetch",
+        [
+            {"event": "cmd_name", "name": "fetch"},
+            {"event": "region_leave", "category": "fetch", "label": "x", "t_rel": 1},
+        ],
+    )
+
+    regions, commands = aggregate_trace2(str(tmp_path))
+    assert regions == {
+        ("status", "status", "untracked"): (0.75, {"repo_a", "repo_b"}),
+        ("fetch", "fetch", "x"): (1, {"repo_a"}),
+    }
+    assert commands == {"status": 1.5}
+
+
+def test_traces_of_git(tmp_path, capsys):
+    work_dir = make_repo(str(tmp_path / "repo"))
+    run_dir = make_run_dir(str(tmp_path / "traces"))
+    subprocess.run(
+        ["git", "status"],
+        cwd=work_dir,
+        env={**os.environ, "GIT_TRACE2_EVENT": get_trace2_target(run_dir, work_dir)},
+        capture_output=True,
+        check=True,
+    )
+
+    regions, commands = aggregate_trace2(run_dir)
+    assert "status" in commands
+    assert any(command == "status" for command, _, _ in regions)
+
+    report_trace2(run_dir)
+    output = capsys.readouterr().out
+    assert f"git trace2 events of 1 repos are in {run_dir}." in output
+    assert "Time in git regions:" in output
+    assert "of git status) in 1 repos" in output